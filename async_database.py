@@ -0,0 +1,223 @@
+import asyncio, copy, threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from database import DB
+
+
+class AsyncDB:
+    """Asyncio front end for the DB class.
+
+    Every method is a coroutine with the same name, arguments and return value as its DB counterpart. The
+    blocking database work runs on a dedicated thread pool sized to the DB's connection pool
+    (pool_size + pool_max_overflow threads), so the event loop is never blocked on database I/O and there are
+    never more calls in flight than there are connections to serve them.
+
+    Args:
+        db (DB, optional): An existing DB instance to wrap. If omitted, one is created from the remaining
+            arguments, which are passed straight to DB().
+        max_workers (int, optional): Override the number of worker threads.
+
+    Example:
+        db = AsyncDB("127.0.0.1", "foodpix_db", "test_user", "test_password")
+        restaurant, dishes = await asyncio.gather(db.get_restaurant(restaurant_id),
+                                                  db.get_dishes_from_restaurant(restaurant_id))
+        await db.close()
+    """
+    def __init__(self, *args, db=None, max_workers=None, **kwargs):
+        self.db = db if db is not None else DB(*args, **kwargs)
+        if max_workers is None:
+            max_workers = self.db.pool.size + self.db.pool.max_overflow
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="foodpix-db")
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def _stream(self, make_iterator, batch_size):
+        # Run a blocking DB generator from start to close on one worker thread, so it keeps the connection it
+        # borrowed (SQLite's pool hands each thread its own). Batches come back through a queue that holds at
+        # most two, so the generator doesn't read far ahead of the consumer.
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=2)
+        stop = threading.Event()
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def produce():
+            iterator = None
+            try:
+                iterator = make_iterator()
+                while not stop.is_set():
+                    batch = list(islice(iterator, batch_size))
+                    put(batch)
+                    if not batch:
+                        return
+            except Exception as e:
+                put(e)
+            finally:
+                if iterator is not None:
+                    iterator.close()
+
+        producer = loop.run_in_executor(self._executor, produce)
+        try:
+            while True:
+                batch = await queue.get()
+                if isinstance(batch, Exception):
+                    raise batch
+                if not batch:
+                    return
+                for item in batch:
+                    yield item
+        finally:
+            # The consumer stopped early: make room for a batch the producer may be waiting to hand over, so it
+            # sees the flag and closes the generator
+            stop.set()
+            while not queue.empty():
+                queue.get_nowait()
+            await producer
+
+    @staticmethod
+    def _materialize(updates):
+        # A generator of updates is consumed here rather than on a worker thread
+        return updates if hasattr(updates, "items") else list(updates)
+
+    async def close(self):
+        """Close the DB's pooled connections and stop the worker threads."""
+        await self._run(self.db.close)
+        self._executor.shutdown(wait=True)
+
+    # Reads
+
+    async def get_all_restaurants(self, include_dishes=False):
+        return await self._run(self.db.get_all_restaurants, include_dishes=include_dishes)
+
+    async def get_all_dishes(self, order="name_asc"):
+        return await self._run(self.db.get_all_dishes, order)
+
+    async def get_dish(self, dish_id):
+        return await self._run(self.db.get_dish, dish_id)
+
+    async def get_restaurant(self, restaurant_id):
+        return await self._run(self.db.get_restaurant, restaurant_id)
+
+    async def get_dishes_from_restaurant(self, restaurant_id):
+        return await self._run(self.db.get_dishes_from_restaurant, restaurant_id)
+
+    async def get_restaurant_with_dishes(self, restaurant_id):
+        """Fetch a restaurant and its dishes concurrently, on two pooled connections.
+
+        Returns:
+            Restaurant: The restaurant with its 'dishes' attribute set.
+        """
+        restaurant, dishes = await asyncio.gather(self.get_restaurant(restaurant_id),
+                                                  self.get_dishes_from_restaurant(restaurant_id))
+        # The restaurant may be shared through the read-through cache, don't mutate it
+        restaurant = copy.copy(restaurant)
+        restaurant.dishes = dishes
+        return restaurant
+
+    async def get_dishes_page(self, order="name_asc", limit=50, cursor=None):
+        return await self._run(self.db.get_dishes_page, order, limit, cursor)
+
+    async def get_dishes_between(self, start=None, end=None, restaurant_id=None, limit=None, order="date_asc"):
+        return await self._run(self.db.get_dishes_between, start, end, restaurant_id, limit, order)
+
+    async def get_dish_timeline(self, period="day", restaurant_id=None, start=None, end=None):
+        return await self._run(self.db.get_dish_timeline, period, restaurant_id, start, end)
+
+    def iter_dishes(self, order="name_asc", batch_size=1000):
+        """Async counterpart of DB.iter_dishes, use with 'async for'."""
+        return self._stream(partial(self.db.iter_dishes, order, batch_size), batch_size)
+
+    async def custom_query(self, table_name, conditions, order_by=None, parameters=None):
+        return await self._run(self.db.custom_query, table_name, conditions, order_by, parameters)
+
+    def iter_query(self, table_name, conditions, order_by=None, parameters=None, batch_size=1000):
+        """Async counterpart of DB.iter_query, use with 'async for'."""
+        make_iterator = partial(self.db.iter_query, table_name, conditions, order_by, parameters, batch_size)
+        return self._stream(make_iterator, batch_size)
+
+    async def find_dishes(self, dietary_restrictions=None, min_stars=None, max_stars=None):
+        return await self._run(self.db.find_dishes, dietary_restrictions, min_stars, max_stars)
+
+    async def search(self, text, limit=20, filters=None):
+        return await self._run(self.db.search, text, limit, filters)
+
+    async def nearest_restaurants(self, lat, lon, k=10, max_km=None, cuisine=None):
+        return await self._run(self.db.nearest_restaurants, lat, lon, k, max_km, cuisine)
+
+    async def restaurants_within(self, lat, lon, radius_km):
+        return await self._run(self.db.restaurants_within, lat, lon, radius_km)
+
+    async def restaurants_in_viewport(self, south, west, north, east):
+        return await self._run(self.db.restaurants_in_viewport, south, west, north, east)
+
+    async def get_restaurant_stats(self, restaurant_ids):
+        return await self._run(self.db.get_restaurant_stats, restaurant_ids)
+
+    async def verify_restaurant_stats(self, repair=False):
+        return await self._run(self.db.verify_restaurant_stats, repair)
+
+    async def top_dishes_near(self, lat, lon, k=10, radius_km=5, dietary=None, weights=None, half_life_days=30,
+                              today=None, batch_size=64):
+        return await self._run(self.db.top_dishes_near, lat, lon, k, radius_km, dietary, weights, half_life_days,
+                               today, batch_size)
+
+    # Writes
+
+    async def add_restaurant(self, restaurant):
+        return await self._run(self.db.add_restaurant, restaurant)
+
+    async def add_dish(self, dish):
+        return await self._run(self.db.add_dish, dish)
+
+    async def add_restaurants(self, restaurants, chunk_size=1000):
+        return await self._run(self.db.add_restaurants, list(restaurants), chunk_size)
+
+    async def add_dishes(self, dishes, chunk_size=1000):
+        return await self._run(self.db.add_dishes, list(dishes), chunk_size)
+
+    async def update_dish(self, dish_id, **kwargs):
+        return await self._run(self.db.update_dish, dish_id, **kwargs)
+
+    async def update_restaurant(self, restaurant_id, **kwargs):
+        return await self._run(self.db.update_restaurant, restaurant_id, **kwargs)
+
+    async def update_dishes(self, updates, chunk_size=1000):
+        return await self._run(self.db.update_dishes, self._materialize(updates), chunk_size)
+
+    async def update_restaurants(self, updates, chunk_size=1000):
+        return await self._run(self.db.update_restaurants, self._materialize(updates), chunk_size)
+
+    async def delete_dish(self, dish_id):
+        return await self._run(self.db.delete_dish, dish_id)
+
+    async def delete_dishes(self, dish_ids, chunk_size=1000):
+        return await self._run(self.db.delete_dishes, list(dish_ids), chunk_size)
+
+    async def delete_restaurant(self, restaurant_id):
+        return await self._run(self.db.delete_restaurant, restaurant_id)
+
+    # Schema
+
+    async def migrate(self, target_version=None):
+        return await self._run(self.db.migrate, target_version)
+
+    async def schema_version(self):
+        return await self._run(self.db.schema_version)
+
+    # Change feed
+
+    async def poll_changes(self, limit=1000):
+        return await self._run(self.db.poll_changes, limit)
+
+    def change_feed_stats(self):
+        return self.db.change_feed_stats()
+
+    def pool_stats(self):
+        return self.db.pool_stats()
+
+    def cache_stats(self):
+        return self.db.cache_stats()
@@ -1,61 +1,117 @@
-
 from database_errors import UserError
-import mysql.connector, uuid
-from werkzeug.security import generate_password_hash, check_password_hash
+import uuid, asyncio, threading
+from utils.password_hasher import PasswordHasher
+
+# Shared by every call that isn't given its own hasher, started on first use
+_default_hasher = None
+_default_hasher_lock = threading.Lock()
+
+
+def default_hasher():
+    """Return the process-wide PasswordHasher used when no 'hasher' is passed."""
+    global _default_hasher
+    with _default_hasher_lock:
+        if _default_hasher is None:
+            _default_hasher = PasswordHasher()
+        return _default_hasher
+
+
+def _insert_user(db, user_id, username, password_hash):
+    # Borrow a connection from the database's pool
+    with db.connection() as conn:
+        cursor = conn.cursor()
+
+        # Insert the new user into the 'users' table. Users only exist as rows here, logins are checked
+        # against the stored hash over the shared pool, so no MySQL account or GRANT is needed per signup.
+        cursor.execute('''
+            INSERT INTO users (id, username, password)
+            VALUES (%s, %s, %s)
+        ''', (user_id, username, password_hash))
+        cursor.close()
 
 
-def create_user(self, db, username, password):
+def _find_user(db, username):
+    # Look the user up over the database's shared pool rather than opening a
+    # new connection with the end user's credentials for every login
+    with db.connection() as conn:
+        cursor = conn.cursor(buffered=True)
+        cursor.execute('SELECT id, password FROM users WHERE username = %s', (username,))
+        user_data = cursor.fetchone()
+        cursor.close()
+    return user_data
+
+
+def create_user(self, db, username, password, hasher=None):
+    """Create a user, hashing the password on the hasher's worker processes.
+
+    Returns:
+        str: The new user's ID.
+    """
+    user_id = None
     try:
-        password_hash = generate_password_hash(password)
+        password_hash = (hasher or default_hasher()).hash(password)
         user_id = str(uuid.uuid4())  # Generate a UUID for the user ID
-        with mysql.connector.connect(
-            host=db.host,
-            user=db.user,  # Use the higher-privileged user
-            password=db.password,
-            database=db.name
-        ) as conn:
-            cursor = conn.cursor()
-
-            # Insert the new user into the 'users' table
-            cursor.execute('''
-                INSERT INTO users (id, username, password)
-                VALUES (%s, %s, %s)
-            ''', (user_id, username, password_hash))
-
-            # Grant necessary privileges to the new user
-            cursor.execute(f"GRANT ALL PRIVILEGES ON {db.name}.* TO '{username}'@'localhost'")
-            cursor.execute("FLUSH PRIVILEGES")
-
-        # Update the current database object with the new user's credentials
-        db.user = username
-        db.password = password
+        _insert_user(db, user_id, username, password_hash)
+        return user_id
+    except Exception as e:
+        raise UserError("create", user_id, username, password, str(e))
+
+def authenticate_user(self, db, username, password, hasher=None, sessions=None):
+    """Check a username and password, verifying the hash on the hasher's worker processes.
+
+    Args:
+        sessions (SessionTokens, optional): If given, a session token is issued on success.
 
+    Returns:
+        str: The user's ID, or (user ID, session token) when 'sessions' is given. None if authentication failed.
+    """
+    user_id = None
+    try:
+        user_data = _find_user(db, username)
+
+        if user_data:
+            user_id, hashed_password = user_data
+            if (hasher or default_hasher()).verify(hashed_password, password):
+                return (user_id, sessions.issue(user_id)) if sessions is not None else user_id
+
+        return None  # Authentication failed
+
+    except Exception as e:
+        raise UserError("authenticate", user_id, username, password, str(e))
+
+def authenticate_session(sessions, token):
+    """Authenticate a request that already holds a session token, without hashing or touching the database.
+
+    Revocation is only seen by the SessionTokens instance revoke_user() was called on, see SessionTokens.
+
+    Returns:
+        str: The user's ID, or None if the token is invalid, expired or revoked.
+    """
+    return sessions.verify(token)
+
+async def create_user_async(db, username, password, hasher=None):
+    """Coroutine version of create_user(), for use from an event loop."""
+    user_id = None
+    try:
+        password_hash = await (hasher or default_hasher()).hash_async(password)
+        user_id = str(uuid.uuid4())
+        await asyncio.to_thread(_insert_user, db, user_id, username, password_hash)
         return user_id
     except Exception as e:
-        raise UserError("create", username, password, user_id, str(e))
-    
-def authenticate_user(self, db, username, password):
+        raise UserError("create", user_id, username, password, str(e))
+
+async def authenticate_user_async(db, username, password, hasher=None, sessions=None):
+    """Coroutine version of authenticate_user(), for use from an event loop."""
+    user_id = None
     try:
-        with mysql.connector.connect(
-            host=db.host,
-            user=username,
-            password=password,
-            database=db.name
-        ) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT id, password FROM users WHERE username = %s', (username,))
-            user_data = cursor.fetchone()
-
-            if user_data:
-                user_id, hashed_password = user_data
-                if check_password_hash(hashed_password, password):
-                    return user_id
-
-            db.user = username
-            db.password = password
-            
-            return None  # Authentication failed
+        user_data = await asyncio.to_thread(_find_user, db, username)
+
+        if user_data:
+            user_id, hashed_password = user_data
+            if await (hasher or default_hasher()).verify_async(hashed_password, password):
+                return (user_id, sessions.issue(user_id)) if sessions is not None else user_id
+
+        return None  # Authentication failed
 
     except Exception as e:
         raise UserError("authenticate", user_id, username, password, str(e))
-    
\ No newline at end of file
@@ -1,40 +1,699 @@
-import mysql.connector
-import json, uuid
+import json, uuid, time, base64, datetime, heapq, threading
+from contextlib import contextmanager
+from itertools import islice
 from models import Restaurant
 from models import Dish
 from database_errors import RestaurantNotFoundError, DishNotFoundError, DuplicateDishError, DuplicateRestaurantError, DatabaseQueryError
 from utils.utility import listify, stringify
+from utils.backends import MySQLBackend, SQLiteBackend
+from utils.entity_index import EntityIndex
+from utils.bulk_result import BulkResult
+from utils.geo_index import LocationIndex, GridIndex, bounding_box
+from utils.entity_cache import EntityCache, MISSING
+from utils.utility import haversine_distance
+from utils.dietary import DietaryRegistry, DishFilterIndex, parse_dietary_restrictions
+from utils.search_index import SearchIndex
+from utils.restaurant_stats import RestaurantStats
+from utils.instrumentation import instrumented, InstrumentedConnection
+from utils.statement_cache import StatementCache
+from utils.migrations import migrate, schema_version
+from utils.change_feed import ChangeFeedPosition
+
+# Explicit column lists selected for Restaurant and Dish objects, in the positional order their from_row() expects
+RESTAURANT_COLUMNS = ", ".join(Restaurant.COLUMNS)
+DISH_COLUMNS = ", ".join(Dish.COLUMNS)
+
+# Fields update_dishes and update_restaurants accept, every column of the model except its ID
+DISH_UPDATE_FIELDS = frozenset(Dish.COLUMNS) - {"id"}
+RESTAURANT_UPDATE_FIELDS = frozenset(Restaurant.COLUMNS) - {"id"}
+
+# Database backends the DB class can run on: a MySQL server or an embedded SQLite file
+BACKENDS = ("mysql", "sqlite")
+
+# Backends accepted by search(): the in-process BM25 index or MySQL FULLTEXT indexes
+SEARCH_BACKENDS = ("memory", "mysql")
+
+# Default weights of the components of top_dishes_near()'s score, each of which lies between 0 and 1
+TOP_DISH_WEIGHTS = {"stars": 0.6, "recency": 0.2, "distance": 0.2}
+
+# The highest star rating a dish can have, used to scale stars into top_dishes_near()'s score
+MAX_STARS = 5
+
+# Bucket sizes accepted by get_dish_timeline(), each bucket labelled by its first day ("week" starts on Monday)
+TIMELINE_PERIODS = ("day", "week", "month")
+
+# Appends one entry to the change feed, inside the transaction of the write it records, see poll_changes()
+CHANGE_INSERT = "INSERT INTO changes (table_name, record_id, operation, origin) VALUES (%s, %s, %s, %s)"
+
+# Change feed entries re-checked when the indexes are loaded: a transaction can hold a sequence number below
+# the highest visible one and commit later. A poll finding more numbers than this missing in a row fell
+# behind entries pruned by prune_changes(), and reloads the indexes instead.
+CHANGE_FEED_OVERLAP = 1000
+
+# Sort orders accepted by get_all_dishes, iter_dishes and get_dishes_page, as (column, direction).
+# Ties are broken by 'id' in the same direction so every order is total and can be paged with a keyset.
+DISH_ORDERS = {
+    "date_asc": ("date", "ASC"),
+    "date_desc": ("date", "DESC"),
+    "stars_asc": ("stars", "ASC"),
+    "stars_desc": ("stars", "DESC"),
+    "name_asc": ("dish_name", "ASC"),
+    "name_desc": ("dish_name", "DESC"),
+}
 
 
 class DB:
     """Database handler for managing restaurant and dish data.
 
-    This class provides methods to interact with an SQLite database containing restaurant and dish information.
-    It allows for CRUD (Create, Read, Update, Delete) operations on the database.
+    This class provides methods to interact with a MySQL or SQLite database containing restaurant and dish
+    information. It allows for CRUD (Create, Read, Update, Delete) operations on the database.
+
+    Every method borrows its connection from a shared connection pool owned by the instance, so the TCP and
+    authentication handshakes are paid once per pooled connection instead of once per call. With the "sqlite"
+    backend each thread instead keeps its own connection to the database file, which runs in WAL mode.
 
     Args:
-        name (str): The name of the SQLite database.
+        host (str): The MySQL server's host name. Unused by the "sqlite" backend.
+        name (str): The name of the MySQL database, or the path of the SQLite database file.
+        user (str, optional): The MySQL user to connect as.
+        password (str, optional): The MySQL user's password.
+        pool_size (int): The number of connections kept open in the pool. Default is 5.
+        pool_max_overflow (int): The number of extra connections opened when every pooled connection is busy.
+            Default is 10.
+        pool_idle_timeout (float, optional): Seconds after which an idle pooled connection is closed
+            instead of reused. None keeps them forever. Default is 300.
+        pool_pre_ping (bool): Check each pooled connection is alive before handing it out. Default is True.
+        pool_warm (bool): Open 'pool_size' connections when the instance is created. Default is True.
+        spatial_index (bool): Load the in-process grid index used by radius and viewport queries when the
+            instance is created. When False, those queries are answered by the database until
+            warm_spatial_index() is called. Default is True.
+        cache_size (int): The maximum number of dishes and restaurants kept in the read-through cache used by
+            get_dish and get_restaurant. 0 disables the cache. Default is 0.
+        cache_ttl (float, optional): Seconds a cached dish or restaurant stays valid. Default is 300.
+        cache_max_bytes (int, optional): Approximate memory bound for the cache. Default is None (no bound).
+        cache_negative (bool): Also cache "not found" results, so repeated lookups of a missing ID don't reach
+            the database. Default is False.
+        lazy_dietary_restrictions (bool): Keep each loaded dish's dietary restrictions as the stored JSON text and
+            only parse them when 'dietary_restrictions' is first read, which speeds up large listings that
+            never look at them. Default is False.
+        search_backend (str): Where search() runs. "memory" keeps a BM25 inverted index in process, loaded
+            with the other indexes. "mysql" creates FULLTEXT indexes and queries them with MATCH ... AGAINST.
+            Default is "memory". "mysql" requires the MySQL backend.
+        backend (str): The database to run on, "mysql" or "sqlite". Default is "mysql".
+        backend_options (dict, optional): Extra keyword arguments for the backend, e.g. the 'synchronous',
+            'cache_size' and 'mmap_size' settings of SQLiteBackend.
+        instrumentation (Instrumentation, optional): Receives the timing, statements, rows and connection use
+            of every public method call. Default is None (not measured).
+        statement_cache_size (int): The number of hot statements (the lookups by ID, the single-row INSERTs and
+            UPDATEs and custom_query's SELECTs) each connection keeps prepared, least recently used evicted
+            first. MySQL skips parsing and planning them again; on SQLite this sizes the connection's own
+            compiled statement cache. 0 disables it. Default is 32.
+        change_feed_interval (float, optional): Seconds between polls of the change feed by a background thread,
+            which applies the writes of other processes to this instance's indexes and cache. Default is None
+            (no thread, call poll_changes() or follow_changes() to catch up).
+        change_feed_gap_timeout (float): Seconds the change feed waits for a skipped sequence number, see
+            ChangeFeedPosition. Default is 5.
 
     Attributes:
-        name (str): The name of the SQLite database.
+        name (str): The name of the MySQL database, or the path of the SQLite database file.
+        backend (MySQLBackend or SQLiteBackend): Opens connections and handles the SQL dialect differences.
+        pool (ConnectionPool or ThreadLocalPool): The connection pool shared by every method of this instance.
+        instrumentation (Instrumentation): The instrumentation measuring this instance, or None. It can be
+            attached or removed at any time.
+        index (EntityIndex): In-memory index of every restaurant and dish ID, loaded from the database
+            when the instance is created and kept current by every write made through this instance.
+        locations (LocationIndex): Restaurant coordinates and cuisines in NumPy arrays, used by
+            nearest_restaurants() and kept current the same way as 'index'.
+        grid (GridIndex): Restaurants bucketed by latitude/longitude cell, used by restaurants_within()
+            and restaurants_in_viewport() once warm.
+        cache (EntityCache): The read-through cache, or None if it is disabled.
+        dietary (DietaryRegistry): The dietary tag -> bit mapping stored in the 'dietary_tags' table.
+        dish_filters (DishFilterIndex): Per-tag and per-star-rating bitmaps over every dish, used by find_dishes().
+        restaurant_stats (RestaurantStats): Each restaurant's dish count, star histogram and latest dish date,
+            used by get_restaurant_stats() and kept current the same way as 'index'.
+        search_index (SearchIndex): The in-process full-text index used by search(), or None when
+            'search_backend' is "mysql".
         all_restaurants (dict): A dictionary with restaurant IDs as keys and sets of dish IDs as values.
+        instance_id (str): Identifies this instance's entries in the change feed, which its own polls skip.
+        change_feed (ChangeFeedPosition): How far into the change feed this instance's indexes are.
 
     Example:
-        db = DB("restaurant_app.db")
+        db = DB("127.0.0.1", "foodpix_db", "test_user", "test_password")
+        db = DB(None, "restaurant_app.db", backend="sqlite")
     """ 
-    def __init__(self, host, name, user=None, password=None):
+    def __init__(self, host, name, user=None, password=None, pool_size=5, pool_max_overflow=10,
+                 pool_idle_timeout=300, pool_pre_ping=True, pool_warm=True, spatial_index=True,
+                 cache_size=0, cache_ttl=300, cache_max_bytes=None, cache_negative=False, search_backend="memory",
+                 lazy_dietary_restrictions=False, backend="mysql", backend_options=None, instrumentation=None,
+                 statement_cache_size=32, change_feed_interval=None, change_feed_gap_timeout=5.0):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported backend: {backend}. Must be one of {', '.join(BACKENDS)}")
+        if search_backend not in SEARCH_BACKENDS:
+            raise ValueError(f"Unsupported search backend: {search_backend}. Must be one of {', '.join(SEARCH_BACKENDS)}")
+        if backend == "sqlite":
+            self.backend = SQLiteBackend(name, **{"cached_statements": statement_cache_size, **(backend_options or {})})
+        else:
+            self.backend = MySQLBackend(host, name, user, password, **(backend_options or {}))
+        if search_backend == "mysql" and not self.backend.supports_fulltext:
+            raise ValueError(f"The 'mysql' search backend needs FULLTEXT indexes, which the {backend} backend lacks")
         self.host = host
         self.user = user
         self.password = password
         self.name = name
+        self.search_backend = search_backend
+        self.lazy_dietary_restrictions = lazy_dietary_restrictions
+        self.instrumentation = instrumentation
+        self.statement_cache_size = statement_cache_size
+        self.pool = self.backend.create_pool(self._connect, size=pool_size, max_overflow=pool_max_overflow,
+                                             idle_timeout=pool_idle_timeout, pre_ping=pool_pre_ping, warm=pool_warm)
         self.create_db()
-        self.all_restaurants = {}
+        self.index = EntityIndex()
+        self.locations = LocationIndex()
+        self.grid = GridIndex()
+        self.cache = EntityCache(cache_size, cache_ttl, cache_max_bytes) if cache_size > 0 else None
+        self.cache_negative = cache_negative
+        self.dietary = DietaryRegistry()
+        self.dish_filters = DishFilterIndex()
+        self.restaurant_stats = RestaurantStats()
+        self.search_index = SearchIndex() if search_backend == "memory" else None
+        self.all_restaurants = self.index.restaurant_dishes
+        self.instance_id = str(uuid.uuid4())
+        self.change_feed = ChangeFeedPosition(change_feed_gap_timeout)
+        self._change_feed_thread = None
+        self._change_feed_stop = threading.Event()
+        self.load_index(spatial_index=spatial_index)
+        if change_feed_interval is not None:
+            self.follow_changes(change_feed_interval)
+
+    def _connect(self):
+        # Every connection the pool opens goes through here, so instrumentation can count them
+        if self.instrumentation is None:
+            return self.backend.connect()
+        start = time.perf_counter()
+        conn = self.backend.connect()
+        self.instrumentation.connection_opened(time.perf_counter() - start)
+        return conn
+
+    def connection(self):
+        """Borrow a connection from the pool for the duration of a 'with' block.
+
+        Example:
+            with db.connection() as conn:
+                cursor = conn.cursor()
+        """
+        if self.instrumentation is None:
+            return self.pool.connection()
+        return self._instrumented_connection()
+
+    @contextmanager
+    def _instrumented_connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            # Same as the pool's own context manager: roll back, and discard the connection if that fails
+            try:
+                conn.rollback()
+            except Exception:
+                self._release(conn, discard=True)
+                raise
+            self._release(conn)
+            raise
+        self._release(conn)
+
+    def _acquire(self):
+        # Check a connection out of the pool, wrapped so its statements are measured when instrumented
+        if self.instrumentation is None:
+            return self.pool.acquire()
+        start = time.perf_counter()
+        conn = self.pool.acquire()
+        self.instrumentation.connection_acquired(time.perf_counter() - start)
+        return self.instrumentation.wrap(conn)
+
+    def _release(self, conn, discard=False):
+        if isinstance(conn, InstrumentedConnection):
+            conn = conn.finish()
+        self.pool.release(conn, discard=discard)
+
+    def _statement(self, conn, query):
+        # A cursor for one of the hot statements and the query string to execute it with. On MySQL it is a
+        # prepared statement cached on the connection itself, so the cache lives and dies with the connection.
+        # Returns (cursor, query, whether the caller must close the cursor).
+        if not self.statement_cache_size or not self.backend.supports_prepared_statements:
+            return conn.cursor(), query, True
+        raw = conn.raw_connection if isinstance(conn, InstrumentedConnection) else conn
+        cache = getattr(raw, "foodpix_statement_cache", None)
+        if cache is None:
+            cache = raw.foodpix_statement_cache = StatementCache(self.statement_cache_size)
+        cursor, query = cache.cursor(raw, query)
+        if raw is not conn:
+            cursor = conn.track(cursor)
+        return cursor, query, False
+
+    def _fetch_all(self, conn, query, parameters=None):
+        # Run a hot SELECT through the statement cache and read every row, which a prepared cursor needs
+        # before the connection can run anything else
+        cursor, query, owned = self._statement(conn, query)
+        try:
+            cursor.execute(query, parameters)
+            return cursor.fetchall()
+        finally:
+            if owned:
+                cursor.close()
+
+    def _execute(self, conn, query, parameters):
+        # Run a hot INSERT or UPDATE through the statement cache, returning the number of affected rows
+        cursor, query, owned = self._statement(conn, query)
+        try:
+            cursor.execute(query, parameters)
+            return cursor.rowcount
+        finally:
+            if owned:
+                cursor.close()
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a pooled connection and run the 'with' block inside a single transaction.
+
+        The transaction is committed when the block exits normally and rolled back if it raises.
+
+        Example:
+            with db.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM dishes WHERE restaurant_id = %s", (restaurant_id,))
+                cursor.execute("DELETE FROM restaurants WHERE id = %s", (restaurant_id,))
+        """
+        with self.connection() as conn:
+            conn.start_transaction()
+            yield conn
+            conn.commit()
+
+    def pool_stats(self):
+        """Return a snapshot of the connection pool's statistics, useful when sizing the pool.
+
+        Returns:
+            dict: See ConnectionPool.stats() or ThreadLocalPool.stats() for the keys.
+        """
+        return self.pool.stats()
+
+    def close(self):
+        """Stop following the change feed and close every pooled connection. The instance cannot be used afterwards."""
+        self.stop_following_changes()
+        self.pool.close()
+
+    def cache_stats(self):
+        """Return the read-through cache's hit, miss, negative-hit, eviction, expiration and invalidation counters.
+
+        Returns:
+            dict: See EntityCache.stats() for the keys, or None if the cache is disabled.
+        """
+        return self.cache.stats() if self.cache is not None else None
+
+    def _invalidate(self, dish_ids=(), restaurant_ids=()):
+        # Drop cached entries touched by a write, restaurants are included whenever their dish IDs change
+        if self.cache is not None:
+            self.cache.invalidate(*[('dishes', dish_id) for dish_id in dish_ids],
+                                  *[('restaurants', restaurant_id) for restaurant_id in restaurant_ids])
+
+    @instrumented
+    def load_index(self, batch_size=10000, spatial_index=True):
+        """(Re)build the in-memory restaurant, dish, location, dietary filter and rating indexes from the database.
+
+        Restaurant IDs and locations and (dish ID, restaurant ID, stars, dietary mask) rows are streamed from
+        the database over a single pooled connection in batches of 'batch_size' rows, so no Restaurant or Dish
+        objects are built. The full-text index is loaded from the same pass when 'search_backend' is "memory".
+        The per-restaurant rating stats are aggregated by the database with a single GROUP BY.
+        Dishes written before the 'dietary_mask' column existed get their mask backfilled
+        first. This is automatically invoked when creating a new instance of the DB class, and by
+        poll_changes() when the instance fell too far behind the change feed.
+
+        Args:
+            batch_size (int): The number of rows fetched per round trip. Default is 10000.
+            spatial_index (bool): Also (re)build the grid index used by radius and viewport queries.
+                Default is True.
+
+        Raises:
+            DatabaseQueryError: If there is an issue while reading the tables.
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                # Note the change feed's position before reading the tables, so writes committed during the
+                # load are applied again by the next poll, which is harmless, rather than missed
+                self._reset_change_feed(cursor)
+                cursor.execute("SELECT bit, tag FROM dietary_tags")
+                self.dietary.load(cursor.fetchall())
+                self._backfill_dietary_masks(conn)
+
+                cursor.execute("SELECT id, cuisine, latitude, longitude, restaurant_name, address FROM restaurants")
+                restaurant_rows = list(self._iter_rows(cursor, batch_size))
+                location_rows = [row[:4] for row in restaurant_rows]
+
+                # One pass over the dishes feeds the entity index, the filter index and the full-text index
+                filter_rows = []
+                search_documents = [(('restaurants', row[0]), self._restaurant_search_text(row[4], row[5], row[1]))
+                                    for row in restaurant_rows]
+                def dish_pairs():
+                    for dish_id, restaurant_id, stars, dietary_mask, dish_name in self._iter_rows(cursor, batch_size):
+                        filter_rows.append((dish_id, stars, dietary_mask))
+                        search_documents.append((('dishes', dish_id), dish_name))
+                        yield dish_id, restaurant_id
+
+                cursor.execute("SELECT id, restaurant_id, stars, dietary_mask, dish_name FROM dishes")
+                self.index.load((row[0] for row in restaurant_rows), dish_pairs())
+                stats_rows = self._restaurant_stats_rows(cursor)
+                cursor.close()
+
+            self.dish_filters.load(filter_rows)
+            self.restaurant_stats.load(stats_rows)
+            if self.search_index is not None:
+                self.search_index.load(search_documents)
+            self.locations.load(location_rows)
+            if spatial_index:
+                self.grid.load(location_rows)
+        except Exception as e:
+            raise DatabaseQueryError("Load restaurant and dish index from database", str(e))
+
+    def _backfill_dietary_masks(self, conn):
+        # Compute 'dietary_mask' for rows written before the column existed, or by code that doesn't set it
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, dietary_restrictions FROM dishes
+            WHERE dietary_mask = 0 AND dietary_restrictions IS NOT NULL AND dietary_restrictions NOT IN ('', '[]', 'null')
+        """)
+        rows = cursor.fetchall()
+        updates = [(self._dietary_mask(restrictions), dish_id) for dish_id, restrictions in rows]
+        updates = [update for update in updates if update[0]]
+        if updates:
+            cursor.executemany("UPDATE dishes SET dietary_mask = %s WHERE id = %s", updates)
+        cursor.close()
+
+    def _dietary_mask(self, dietary_restrictions):
+        # Bitmask of a dish's dietary restrictions, registering tags seen for the first time
+        tags = parse_dietary_restrictions(dietary_restrictions)
+        new_tags = self.dietary.unregistered(tags)
+        if new_tags:
+            self._register_dietary_tags(new_tags)
+        return self.dietary.mask_of(tags)
+
+    def _register_dietary_tags(self, tags):
+        # Claim the next free bit for each tag. If another process claimed the same bit or tag first, the
+        # insert fails on the primary or unique key, so reload the registry and try again.
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            for tag in tags:
+                while self.dietary.bit_of(tag) is None:
+                    bit = self.dietary.next_bit()
+                    try:
+                        cursor.execute("INSERT INTO dietary_tags (bit, tag) VALUES (%s, %s)", (bit, tag))
+                        self.dietary.register(bit, tag)
+                    except self.backend.IntegrityError:
+                        cursor.execute("SELECT bit, tag FROM dietary_tags")
+                        self.dietary.load(cursor.fetchall())
+            cursor.close()
+
+    def dietary_mask(self, dietary_restrictions):
+        """Return the 'dietary_mask' bits for a list of dietary restrictions, for bit tests in custom_query.
+
+        Tags are matched case-insensitively, and hyphens, underscores and spaces are interchangeable.
+
+        Args:
+            dietary_restrictions (list[str]): The dietary restrictions, e.g. ["Vegan", "gluten-free"].
+
+        Returns:
+            int: The bitmask, or None if one of the restrictions has never been stored on any dish.
+
+        Example:
+            mask = db.dietary_mask(["vegan", "gluten free"])
+            dishes = db.custom_query('dishes', ["(dietary_mask & %s) = %s"], parameters=(mask, mask))
+        """
+        return self.dietary.mask_of(parse_dietary_restrictions(dietary_restrictions))
+
+    @staticmethod
+    def _restaurant_search_text(name, address, cuisine):
+        # The text a restaurant is found by in the in-process full-text index
+        return " ".join(value for value in (name, address, cuisine) if value)
+
+    @staticmethod
+    def _restaurant_stats_rows(cursor):
+        # (restaurant_id, stars, dish count, latest date) rows, the input of RestaurantStats.load()
+        cursor.execute("SELECT restaurant_id, stars, COUNT(*), MAX(date) FROM dishes GROUP BY restaurant_id, stars")
+        return cursor.fetchall()
+
+    def _refresh_latest_dates(self, restaurant_ids):
+        # Look up the latest dish date of restaurants whose latest dish was just deleted, moved or re-dated
+        restaurant_ids = list(restaurant_ids)
+        if not restaurant_ids:
+            return
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                placeholders = ", ".join(["%s"] * len(restaurant_ids))
+                cursor.execute(f"SELECT restaurant_id, MAX(date) FROM dishes WHERE restaurant_id IN ({placeholders}) GROUP BY restaurant_id",
+                               restaurant_ids)
+                latest = dict(cursor.fetchall())
+                cursor.close()
+        except Exception as e:
+            raise DatabaseQueryError(f"Look up the latest dish date of {len(restaurant_ids)} restaurants", str(e))
+        for restaurant_id in restaurant_ids:
+            self.restaurant_stats.set_latest_date(restaurant_id, latest.get(restaurant_id))
+
+    def _update_restaurant_stats(self, old_rows, changes):
+        # Move each changed dish's contribution from its old (restaurant_id, stars, date) to its new values
+        stale = set()
+        for dish_id, restaurant_id, stars, date in old_rows:
+            fields = changes[dish_id]
+            if self.restaurant_stats.remove(restaurant_id, stars, date):
+                stale.add(restaurant_id)
+            self.restaurant_stats.add(fields.get('restaurant_id', restaurant_id), fields.get('stars', stars), fields.get('date', date))
+        self._refresh_latest_dates(stale)
+
+    @staticmethod
+    def _iter_rows(cursor, batch_size):
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
     
+    def _log_changes(self, conn, table_name, operation, record_ids):
+        # Append the write to the change feed on the caller's connection, so it commits or rolls back with it
+        rows = [(table_name, record_id, operation, self.instance_id) for record_id in record_ids]
+        if len(rows) == 1:
+            self._execute(conn, CHANGE_INSERT, rows[0])
+        elif rows:
+            cursor = conn.cursor()
+            cursor.executemany(CHANGE_INSERT, rows)
+            cursor.close()
+
+    def _reset_change_feed(self, cursor):
+        # Start from the end of the feed, minus the entries a still-open transaction could commit below it
+        cursor.execute("SELECT MAX(seq) FROM changes")
+        start = max(0, (cursor.fetchone()[0] or 0) - CHANGE_FEED_OVERLAP)
+        cursor.execute("SELECT seq FROM changes WHERE seq > %s", (start,))
+        self.change_feed.reset(start, [row[0] for row in cursor.fetchall()])
+
+    @instrumented
+    def poll_changes(self, limit=1000):
+        """Apply the writes other processes made since the last poll to this instance's indexes and cache.
+
+        Every write logs the IDs it touched in the 'changes' table, in the same transaction. A poll reads the
+        entries past this instance's position, skips its own, and re-reads the current rows of the dishes and
+        restaurants they name with one query per table, so it costs in proportion to the number of changes,
+        not the size of the tables. Each restaurant that gained or lost a changed dish has its stats
+        re-aggregated from its dishes. Reading the current row rather than replaying each write makes
+        applying an entry twice, or out of order, harmless.
+
+        Args:
+            limit (int, optional): The most entries applied by this call. Default is 1000.
+
+        Returns:
+            int: The number of entries from other instances applied. A full reload counts as 0.
+
+        Raises:
+            DatabaseQueryError: If there is an issue while reading the feed or the changed rows.
+
+        Example:
+            # In a worker that doesn't run the background thread, e.g. before serving each batch of requests
+            db.poll_changes()
+        """
+        return self._poll_changes(limit)[0]
+
+    def _poll_changes(self, limit):
+        # Returns (entries from other instances applied, whether the batch was full and more may be waiting)
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT seq, table_name, record_id, origin FROM changes WHERE seq > %s ORDER BY seq LIMIT %s",
+                               (self.change_feed.position, limit))
+                rows = cursor.fetchall()
+                cursor.close()
+        except Exception as e:
+            raise DatabaseQueryError("Read the change feed", str(e))
+
+        if rows and rows[0][0] - self.change_feed.position > CHANGE_FEED_OVERLAP:
+            # The entries in between were pruned before this instance applied them
+            self.load_index(spatial_index=self.grid.ready)
+            self.change_feed.record_poll(0, reloaded=True)
+            return 0, False
+
+        new_rows = [row for row in rows if self.change_feed.is_new(row[0])]
+        foreign_rows = [row for row in new_rows if row[3] != self.instance_id]
+        if foreign_rows:
+            self._apply_changes(foreign_rows)
+        self.change_feed.advance(row[0] for row in new_rows)
+        self.change_feed.record_poll(len(foreign_rows))
+        return len(foreign_rows), len(rows) >= limit and bool(new_rows)
+
+    def _apply_changes(self, rows):
+        # Bring the indexes, stats and cache in line with the current rows of the records named by the entries
+        dish_ids = {row[2] for row in rows if row[1] == 'dishes'}
+        restaurant_ids = {row[2] for row in rows if row[1] == 'restaurants'}
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                restaurant_rows = []
+                if restaurant_ids:
+                    placeholders = ", ".join(["%s"] * len(restaurant_ids))
+                    cursor.execute(f"SELECT id, cuisine, latitude, longitude, restaurant_name, address FROM restaurants WHERE id IN ({placeholders})",
+                                   list(restaurant_ids))
+                    restaurant_rows = cursor.fetchall()
+                dish_rows = []
+                if dish_ids:
+                    placeholders = ", ".join(["%s"] * len(dish_ids))
+                    cursor.execute(f"SELECT id, restaurant_id, stars, dietary_mask, dish_name FROM dishes WHERE id IN ({placeholders})",
+                                   list(dish_ids))
+                    dish_rows = cursor.fetchall()
+
+                # The restaurants the changed dishes were in or are in now
+                stats_ids = {self.index.restaurant_of(dish_id) for dish_id in dish_ids} | {row[1] for row in dish_rows}
+                stats_ids.discard(None)
+                stats_rows = []
+                if stats_ids:
+                    placeholders = ", ".join(["%s"] * len(stats_ids))
+                    cursor.execute(f"SELECT restaurant_id, stars, COUNT(*), MAX(date) FROM dishes WHERE restaurant_id IN ({placeholders}) "
+                                   "GROUP BY restaurant_id, stars", list(stats_ids))
+                    stats_rows = cursor.fetchall()
+
+                # Another process registered a dietary tag this one hasn't seen
+                if not all(self.dietary.covers(row[3]) for row in dish_rows):
+                    cursor.execute("SELECT bit, tag FROM dietary_tags")
+                    self.dietary.load(cursor.fetchall())
+                cursor.close()
+        except Exception as e:
+            raise DatabaseQueryError(f"Apply {len(rows)} changes from the change feed", str(e))
+
+        # Restaurants that still exist are (re)indexed, the others are dropped along with their dishes
+        for restaurant_id, cuisine, latitude, longitude, _, _ in restaurant_rows:
+            self.index.add_restaurant(restaurant_id)
+            self.locations.set(restaurant_id, latitude, longitude, cuisine)
+            self.grid.set(restaurant_id, latitude, longitude)
+        deleted_restaurants = restaurant_ids - {row[0] for row in restaurant_rows}
+        deleted_dishes = dish_ids - {row[0] for row in dish_rows}
+        for restaurant_id in deleted_restaurants:
+            deleted_dishes |= self.index.remove_restaurant(restaurant_id)
+            self.restaurant_stats.remove_restaurant(restaurant_id)
+            self.locations.remove(restaurant_id)
+            self.grid.remove(restaurant_id)
+
+        # move_dishes() also adds dishes the index doesn't know yet
+        self.index.move_dishes((row[0], row[1]) for row in dish_rows)
+        self.index.remove_dishes(deleted_dishes)
+        self.dish_filters.add_many([(row[0], row[2], row[3]) for row in dish_rows])
+        self.dish_filters.remove_many(deleted_dishes)
+        self.restaurant_stats.replace(stats_ids - deleted_restaurants, stats_rows)
+        if self.search_index is not None:
+            self.search_index.add_many([(('restaurants', row[0]), self._restaurant_search_text(row[4], row[5], row[1]))
+                                        for row in restaurant_rows] +
+                                       [(('dishes', row[0]), row[4]) for row in dish_rows])
+            self.search_index.remove_many([('restaurants', restaurant_id) for restaurant_id in deleted_restaurants] +
+                                          [('dishes', dish_id) for dish_id in deleted_dishes])
+        self._invalidate(dish_ids=dish_ids | deleted_dishes, restaurant_ids=restaurant_ids | stats_ids)
+
+    def follow_changes(self, interval=1.0, limit=1000):
+        """Poll the change feed on a background thread until close() or stop_following_changes() is called.
+
+        Other processes' writes show up in this instance within about 'interval' seconds. A poll that
+        reads a full batch is followed by another straight away, so a burst of writes is caught up with
+        without waiting 'interval' between batches. A failed poll is retried at the next interval, the
+        error is kept in 'change_feed_error'.
+
+        Args:
+            interval (float, optional): Seconds between polls. Default is 1.
+            limit (int, optional): The most entries applied per poll. Default is 1000.
+        """
+        if self._change_feed_thread is not None:
+            return
+        self._change_feed_stop.clear()
+        self.change_feed_error = None
+
+        def follow():
+            while not self._change_feed_stop.is_set():
+                try:
+                    while self._poll_changes(limit)[1] and not self._change_feed_stop.is_set():
+                        pass
+                    self.change_feed_error = None
+                except Exception as e:
+                    self.change_feed_error = e
+                self._change_feed_stop.wait(interval)
+
+        self._change_feed_thread = threading.Thread(target=follow, name="foodpix-change-feed", daemon=True)
+        self._change_feed_thread.start()
+
+    def stop_following_changes(self):
+        """Stop the thread started by follow_changes(), waiting for its current poll to finish."""
+        thread = self._change_feed_thread
+        if thread is None:
+            return
+        self._change_feed_stop.set()
+        thread.join()
+        self._change_feed_thread = None
+
+    def change_feed_stats(self):
+        """Return this instance's position in the change feed and its poll counters.
+
+        Returns:
+            dict: See ChangeFeedPosition.stats() for the keys.
+        """
+        return self.change_feed.stats()
+
+    @instrumented
+    def prune_changes(self, keep=100000):
+        """Delete all but the newest 'keep' entries of the change feed.
+
+        An instance whose position is older than the entries kept catches up with a full load_index() on
+        its next poll instead, so 'keep' should cover the writes made during the longest pause of any
+        instance, e.g. a restart.
+
+        Args:
+            keep (int, optional): The number of newest entries to keep. Default is 100000.
+
+        Returns:
+            int: The number of entries deleted.
+
+        Raises:
+            DatabaseQueryError: If there is an issue while deleting the entries.
+        """
+        try:
+            # Borrow a connection from the pool
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT MAX(seq) FROM changes")
+                top = cursor.fetchone()[0] or 0
+                cursor.execute("DELETE FROM changes WHERE seq <= %s", (top - keep,))
+                deleted = cursor.rowcount
+                cursor.close()
+            return deleted
+        except Exception as e:
+            raise DatabaseQueryError("Prune change feed", str(e))
+
+    @instrumented
     def create_db(self):
         """Create the necessary tables in the database if they don't already exist.
 
-        This method automatically creates the 'restaurants', 'dishes' and 'users' tables in the MySQL database
-        if they are not already present. 
+        This method automatically creates the 'restaurants', 'dishes' and 'users' tables in the database
+        if they are not already present, by applying the schema migrations the database hasn't had yet.
+        The steps applied are kept in 'applied_migrations', empty when the schema was already current.
 
         Args:
             None
@@ -51,54 +710,67 @@ class DB:
             
         """
         try:
-            # Create a connection to the MySQL database
-            conn = mysql.connector.connect(host=self.host, user=self.user, password=self.password, database=self.name)
-            cursor = conn.cursor()
+            # Borrow a connection from the pool
+            with self.connection() as conn:
+                cursor = conn.cursor()
 
-            # Create the "users" table if it doesn't exist
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id CHAR(36) PRIMARY KEY,
-                    username VARCHAR(255) NOT NULL,
-                    password VARCHAR(255) NOT NULL
-                )
-            ''')
-
-            # Create the "restaurants" table if it doesn't exist
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS restaurants (
-                    id CHAR(36) PRIMARY KEY,
-                    restaurant_name VARCHAR(255) NOT NULL,
-                    address VARCHAR(255) NOT NULL,
-                    cuisine VARCHAR(255) NOT NULL,
-                    latitude FLOAT,
-                    longitude FLOAT,
-                    user_id CHAR(36),
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            ''')
-
-            # Create the "dishes" table if it doesn't exist
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS dishes (
-                    id CHAR(36) PRIMARY KEY,
-                    restaurant_id CHAR(36) NOT NULL,
-                    dish_name VARCHAR(255) NOT NULL,
-                    image_url VARCHAR(255),
-                    date DATE,
-                    stars INT,
-                    dietary_restrictions TEXT,
-                    FOREIGN KEY (restaurant_id) REFERENCES restaurants (id)
-                )
-            ''')
-
-            # Commit the changes and close the connection
-            conn.commit()
-            conn.close()
+                # Bring the schema up to date: the tables, the columns later releases added and the secondary
+                # indexes the hot queries rely on, see utils/migrations.py
+                self.applied_migrations = migrate(cursor, self.backend)
+
+                # FULLTEXT indexes backing search() when it runs in MySQL
+                if self.search_backend == "mysql":
+                    self._create_index(cursor, "ft_dishes_dish_name", "dishes", "dish_name", "FULLTEXT")
+                    self._create_index(cursor, "ft_restaurants_text", "restaurants", "restaurant_name, address, cuisine", "FULLTEXT")
+                cursor.close()
 
         except Exception as e:
             raise DatabaseQueryError("Create tables in database", str(e))
-                
+
+    def _create_index(self, cursor, index_name, table_name, columns, index_type=""):
+        # Ignores an index that already exists, each backend checks for it its own way
+        self.backend.create_index(cursor, index_name, table_name, columns, index_type)
+
+    @instrumented
+    def migrate(self, target_version=None):
+        """Apply the schema migrations the database hasn't had yet, up to 'target_version'.
+
+        create_db() already migrates to the latest version when the DB class is instantiated, this is for
+        stepping a database through the versions explicitly, e.g. from a deployment script.
+
+        Args:
+            target_version (int, optional): The version to stop at. Default is None (the latest).
+
+        Returns:
+            list[tuple]: (version, description, seconds) of each step applied, empty if the schema was current.
+
+        Raises:
+            DatabaseQueryError: If a migration step fails. The steps before it stay applied and recorded.
+        """
+        try:
+            # Borrow a connection from the pool
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                applied = migrate(cursor, self.backend, target_version)
+                cursor.close()
+            return applied
+        except Exception as e:
+            raise DatabaseQueryError("Migrate schema", str(e))
+
+    @instrumented
+    def schema_version(self):
+        """Return the version the database's schema has been migrated to, 0 if it never was."""
+        try:
+            # Borrow a connection from the pool
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                version = schema_version(cursor)
+                cursor.close()
+            return version
+        except Exception as e:
+            raise DatabaseQueryError("Get schema version", str(e))
+
+    @instrumented
     def clear_db(self):
         """Delete the database file.
 
@@ -113,30 +785,43 @@ class DB:
             None
         """
         try:
-            # Create a connection to the MySQL database
-            conn = mysql.connector.connect(host=self.host, user=self.user, password=self.password, database=self.name)
-            cursor = conn.cursor()
+            # Borrow a connection from the pool
+            with self.connection() as conn:
+                cursor = conn.cursor()
 
-            # Drop the "dishes" table if it exists
-            cursor.execute("DROP TABLE IF EXISTS dishes")
+                # Drop the "dishes" table if it exists
+                cursor.execute("DROP TABLE IF EXISTS dishes")
 
-            # Drop the "restaurants" table if it exists
-            cursor.execute("DROP TABLE IF EXISTS restaurants")
-            
-            # Drop the "users" table if it exists
-            cursor.execute("DROP TABLE IF EXISTS users")
+                # Drop the "restaurants" table if it exists
+                cursor.execute("DROP TABLE IF EXISTS restaurants")
 
-            # Commit the changes and close the connection
-            conn.commit()
-            conn.close()
+                # Drop the "dietary_tags" table if it exists
+                cursor.execute("DROP TABLE IF EXISTS dietary_tags")
+                
+                # Drop the "users" table if it exists
+                cursor.execute("DROP TABLE IF EXISTS users")
+
+                # Drop the change feed and the migration history with the tables, so create_db() rebuilds
+                # them from the first step
+                cursor.execute("DROP TABLE IF EXISTS changes")
+                cursor.execute("DROP TABLE IF EXISTS schema_version")
+                cursor.close()
         except Exception as e:
             raise DatabaseQueryError("Clear tables in database", str(e))
 
-    def get_all_restaurants(self):
+    @instrumented
+    def get_all_restaurants(self, include_dishes=False):
         """Retrieve a list of all restaurants stored in the database.
 
         This method retrieves and returns a list of all restaurant objects present in the 'restaurants' table
         of the database. Each restaurant object is represented as an instance of the 'Restaurant' class.
+        Restaurants are built straight from a single SELECT, and when 'include_dishes' is set every dish is
+        pulled by one more SELECT on the same connection, so the listing costs a constant number of round
+        trips no matter how many restaurants there are.
+
+        Args:
+            include_dishes (bool, optional): Also load each restaurant's dishes into its 'dishes' attribute.
+                Default is False.
 
         Returns:
             list[Restaurant]: A list of all restaurant objects in the database.
@@ -145,28 +830,40 @@ class DB:
             DatabaseQueryError: If there is an issue while retrieving the restaurants from the database.
         """
         try:
-            with mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.name
-            ) as conn:
-                query = "SELECT * FROM restaurants"
-                with conn.cursor(dictionary=True) as cursor:
+            # Borrow a connection from the pool
+            with self.connection() as conn:
+                query = f"SELECT {RESTAURANT_COLUMNS} FROM restaurants"
+                with conn.cursor() as cursor:
                     cursor.execute(query)
-                    restaurants = cursor.fetchall()
+                    restaurant_objects = [self._restaurant_from_row(row) for row in cursor.fetchall()]
+
+                if include_dishes:
+                    restaurants_by_id = {restaurant.id: restaurant for restaurant in restaurant_objects}
+                    for restaurant in restaurant_objects:
+                        restaurant.dishes = []
 
-                restaurant_objects = []
-                for restaurant_data in restaurants:
-                    restaurant_id = restaurant_data['id']
-                    restaurant_object = self.get_restaurant(restaurant_id)
-                    restaurant_objects.append(restaurant_object)
+                    with conn.cursor() as cursor:
+                        cursor.execute(f"SELECT {DISH_COLUMNS} FROM dishes")
+                        for row in cursor.fetchall():
+                            restaurant = restaurants_by_id.get(row[1])
+                            if restaurant is not None:
+                                restaurant.dishes.append(self._dish_from_row(row))
 
                 return restaurant_objects
         except Exception as e:
             raise DatabaseQueryError("Retrieve all restaurants from database", str(e))
 
+    def _restaurant_from_row(self, row):
+        # Build a Restaurant from a positional row of RESTAURANT_COLUMNS, the dish IDs come
+        # from the in-memory index rather than the denormalized 'dish_ids' column
+        return Restaurant.from_row(row, list(self.index.dishes_of(row[0])))
+
+    def _dish_from_row(self, row):
+        # Build a Dish from a positional row of DISH_COLUMNS
+        return Dish.from_row(row, self.lazy_dietary_restrictions)
+
     
+    @instrumented
     def get_all_dishes(self, order="name_asc"):
         """Retrieve a list of all dishes stored in the database.
 
@@ -175,8 +872,8 @@ class DB:
 
         Args:
             order (str, optional): Specifies the sorting order of retrieved dishes.
-                Possible values: "date_asc", "date_desc", "stars_asc", "stars_desc", "name_asc", "name_desc.
-                Default value is "default".
+                Possible values: "date_asc", "date_desc", "stars_asc", "stars_desc", "name_asc", "name_desc".
+                Default value is "name_asc".
 
         Returns:
             list[Dish]: A list of all dish objects in the database.
@@ -185,38 +882,163 @@ class DB:
             ValueError: If the 'order' parameter value is not one of the allowed values.
             DatabaseQueryError: If there is an issue while retrieving the dishes from the database.
         """
+        query = f"SELECT {DISH_COLUMNS} FROM dishes {self._dish_order_clause(order)}"
         try:
-            with mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.name
-            ) as conn:
-                query = "SELECT * FROM dishes"
-
-                if order.lower() == "date_asc":
-                    query += " ORDER BY date ASC"
-                elif order.lower() == "date_desc":
-                    query += " ORDER BY date DESC"
-                elif order.lower() == "stars_desc":
-                    query += " ORDER BY stars DESC"
-                elif order.lower() == "stars_asc":
-                    query += " ORDER BY stars ASC"
-                elif order.lower() == "name_asc":
-                    query += " ORDER BY name ASC"
-                elif order.lower() == "name_desc":
-                    query += " ORDER BY name DESC"
-                
-                # Fetch each row as a dictionary
-                with conn.cursor(dictionary=True) as cursor:
+            # Borrow a connection from the pool
+            with self.connection() as conn:
+                # Fetch positional rows of DISH_COLUMNS, cheaper than a dictionary per row
+                with conn.cursor() as cursor:
                     cursor.execute(query)
                     dishes = cursor.fetchall()
 
-                dishes_list = [Dish(**dish) for dish in dishes]
+                dishes_list = [self._dish_from_row(dish) for dish in dishes]
                 return dishes_list
         except Exception as e:
             raise DatabaseQueryError("Retrieve all dishes from database", str(e))
+
+    @instrumented
+    def iter_dishes(self, order="name_asc", batch_size=1000):
+        """Stream every dish in the database without loading them all into memory.
+
+        Rows are read from an unbuffered, server-side cursor 'batch_size' at a time, so memory use stays flat
+        however many dishes there are and the first dish is available as soon as the first batch arrives.
+        The generator holds a pooled connection until it is exhausted or closed.
+
+        Args:
+            order (str, optional): Same values as get_all_dishes. Default is "name_asc".
+            batch_size (int, optional): The number of rows fetched per round trip. Default is 1000.
+
+        Yields:
+            Dish: Each dish in the requested order.
+
+        Raises:
+            ValueError: If the 'order' parameter value is not one of the allowed values.
+            DatabaseQueryError: If there is an issue while retrieving the dishes from the database.
+
+        Example:
+            for dish in db.iter_dishes("stars_desc"):
+                print(dish.dish_name, dish.stars)
+        """
+        query = f"SELECT {DISH_COLUMNS} FROM dishes {self._dish_order_clause(order)}"
+        return self._stream_rows(query, None, self._dish_from_row, batch_size, "Stream all dishes from database")
+
+    @instrumented
+    def get_dishes_page(self, order="name_asc", limit=50, cursor=None):
+        """Retrieve one page of dishes using keyset (seek) pagination.
+
+        Instead of an OFFSET, which makes the database walk past every earlier row, each page starts right after
+        the (order column, id) of the last dish of the previous page, so every page costs the same no matter how
+        deep into the listing it is.
+
+        Args:
+            order (str, optional): Same values as get_all_dishes. Default is "name_asc".
+            limit (int, optional): The maximum number of dishes on the page. Default is 50.
+            cursor (str, optional): The 'next_cursor' returned with the previous page, or None for the first page.
+
+        Returns:
+            tuple: (list[Dish], next_cursor). 'next_cursor' is an opaque string to pass back for the
+                following page, or None if this was the last page.
+
+        Raises:
+            ValueError: If 'order' is not an allowed value or 'cursor' was not produced for this order.
+            DatabaseQueryError: If there is an issue while retrieving the dishes from the database.
+
+        Example:
+            dishes, next_cursor = db.get_dishes_page("date_desc", limit=20)
+            while next_cursor:
+                dishes, next_cursor = db.get_dishes_page("date_desc", limit=20, cursor=next_cursor)
+        """
+        order_clause = self._dish_order_clause(order)
+        column, direction = DISH_ORDERS[order.lower()]
+
+        conditions = []
+        parameters = []
+        if cursor is not None:
+            last_value, last_id = self._decode_page_cursor(cursor, order.lower())
+            # NULLs sort first ascending and last descending, both in MySQL and SQLite
+            if direction == "ASC":
+                if last_value is None:
+                    conditions.append(f"(({column} IS NULL AND id > %s) OR {column} IS NOT NULL)")
+                    parameters.append(last_id)
+                else:
+                    conditions.append(f"({column} > %s OR ({column} = %s AND id > %s))")
+                    parameters.extend([last_value, last_value, last_id])
+            else:
+                if last_value is None:
+                    conditions.append(f"({column} IS NULL AND id < %s)")
+                    parameters.append(last_id)
+                else:
+                    conditions.append(f"({column} < %s OR ({column} = %s AND id < %s) OR {column} IS NULL)")
+                    parameters.extend([last_value, last_value, last_id])
+
+        query = f"SELECT {DISH_COLUMNS} FROM dishes"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        # Fetch one extra row to find out whether there is a next page
+        query += f" {order_clause} LIMIT {int(limit) + 1}"
+
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query, parameters)
+                    rows = cur.fetchall()
+        except Exception as e:
+            raise DatabaseQueryError(f"Retrieve page of dishes ordered by {order}", str(e))
+
+        dishes = [self._dish_from_row(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = self._encode_page_cursor(order.lower(), getattr(dishes[-1], column), dishes[-1].id)
+        return dishes, next_cursor
+
+    @staticmethod
+    def _dish_order_clause(order):
+        try:
+            column, direction = DISH_ORDERS[order.lower()]
+        except KeyError:
+            raise ValueError(f"Unsupported order: {order}. Must be one of {', '.join(DISH_ORDERS)}")
+        return f"ORDER BY {column} {direction}, id {direction}"
+
+    @staticmethod
+    def _encode_page_cursor(order, last_value, last_id):
+        if isinstance(last_value, (datetime.date, datetime.datetime)):
+            last_value = last_value.isoformat()
+        token = json.dumps([order, last_value, last_id], separators=(",", ":"))
+        return base64.urlsafe_b64encode(token.encode()).decode()
+
+    @staticmethod
+    def _decode_page_cursor(cursor, order):
+        try:
+            cursor_order, last_value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except Exception:
+            raise ValueError("Invalid page cursor")
+        if cursor_order != order:
+            raise ValueError(f"Page cursor was created for order {cursor_order}, not {order}")
+        return last_value, last_id
+
+    def _stream_rows(self, query, parameters, row_to_object, batch_size, description):
+        # Generator behind the iter_* methods: holds one pooled connection for its lifetime and reads the
+        # result set from an unbuffered cursor 'batch_size' rows at a time
+        conn = self._acquire()
+        exhausted = False
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, parameters)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield row_to_object(row)
+            cursor.close()
+            exhausted = True
+        except Exception as e:
+            raise DatabaseQueryError(description, str(e))
+        finally:
+            # A result set abandoned halfway leaves unread rows on the connection, don't reuse it
+            self._release(conn, discard=not exhausted)
         
+    @instrumented
     def get_dish(self, dish_id):
         """Retrieve a specific dish from the database by its unique ID.
 
@@ -227,7 +1049,8 @@ class DB:
             dish_id (str): The unique identifier of the dish to retrieve.
 
         Returns:
-            Dish: The dish object representing the retrieved dish.
+            Dish: The dish object representing the retrieved dish. When the read-through cache is enabled the
+                same object may be returned to several callers, so treat it as read-only.
 
         Raises:
             DishNotFoundError: If the specified dish ID does not exist in the database.
@@ -237,26 +1060,33 @@ class DB:
             # Make sure the dish is in the database
             if not self.util_dish_in_db(dish_id):
                 raise DishNotFoundError(dish_id)
+
+            # Serve repeated lookups from the read-through cache when it is enabled
+            if self.cache is not None:
+                cached = self.cache.get(('dishes', dish_id))
+                if cached is MISSING:
+                    raise DishNotFoundError(dish_id)
+                if cached is not None:
+                    return cached
             
-            # Establish a connection to the database
-            with mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.name
-            ) as conn:
-                query = "SELECT * FROM dishes WHERE id = %s"
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute(query, (dish_id,))
-                dish_in_db = cursor.fetchone()
+            # Borrow a connection from the pool
+            with self.connection() as conn:
+                rows = self._fetch_all(conn, f"SELECT {DISH_COLUMNS} FROM dishes WHERE id = %s", (dish_id,))
+                dish_in_db = rows[0] if rows else None
                 
                 if not dish_in_db:
+                    if self.cache is not None and self.cache_negative:
+                        self.cache.put(('dishes', dish_id), MISSING)
                     raise DishNotFoundError(dish_id)
                 
-                return Dish(**dish_in_db)
+                dish = self._dish_from_row(dish_in_db)
+                if self.cache is not None:
+                    self.cache.put(('dishes', dish_id), dish)
+                return dish
         except Exception as e:
             raise DatabaseQueryError(f"Retrieve dish with ID {dish_id} from database", str(e))
 
+    @instrumented
     def get_restaurant(self, restaurant_id):
         """Retrieve a specific restaurant from the database by its ID.
 
@@ -267,32 +1097,40 @@ class DB:
             restaurant_id (str): The unique identifier of the restaurant to retrieve.
 
         Returns:
-            Restaurant: The restaurant object representing the retrieved restaurant.
+            Restaurant: The restaurant object representing the retrieved restaurant. When the read-through cache
+                is enabled the same object may be returned to several callers, so treat it as read-only.
 
         Raises:
             RestaurantNotFoundError: If the specified restaurant ID does not exist in the database.
             DatabaseQueryError: If there is an issue while retrieving the restaurant from the database.
         """
         try:
-            # Establish a connection to the database
-            with mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.name
-            ) as conn:
-                query = "SELECT * FROM restaurants WHERE id = %s"
-                cursor = conn.cursor()
-                cursor.execute(query, (restaurant_id,))
-                restaurant_in_db = cursor.fetchone()
+            # Serve repeated lookups from the read-through cache when it is enabled
+            if self.cache is not None:
+                cached = self.cache.get(('restaurants', restaurant_id))
+                if cached is MISSING:
+                    raise RestaurantNotFoundError(restaurant_id)
+                if cached is not None:
+                    return cached
+
+            # Borrow a connection from the pool
+            with self.connection() as conn:
+                rows = self._fetch_all(conn, f"SELECT {RESTAURANT_COLUMNS} FROM restaurants WHERE id = %s", (restaurant_id,))
+                restaurant_in_db = rows[0] if rows else None
 
                 if not restaurant_in_db:
+                    if self.cache is not None and self.cache_negative:
+                        self.cache.put(('restaurants', restaurant_id), MISSING)
                     raise RestaurantNotFoundError(restaurant_id)
 
-                return Restaurant(*restaurant_in_db)
+                restaurant = self._restaurant_from_row(restaurant_in_db)
+                if self.cache is not None:
+                    self.cache.put(('restaurants', restaurant_id), restaurant)
+                return restaurant
         except Exception as e:
             raise DatabaseQueryError(f"Retrieve restaurant {restaurant_id} from database", str(e))
         
+    @instrumented
     def get_dishes_from_restaurant(self, restaurant_id):
         """Retrieve all dishes associated with a specific restaurant from the database.
 
@@ -314,23 +1152,170 @@ class DB:
             if not self.util_restaurant_in_db(restaurant_id):
                 raise RestaurantNotFoundError(restaurant_id)
             
-            # Establish a connection to the database
-            with mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.name
-            ) as conn:
-                query = "SELECT * FROM dishes WHERE restaurant_id = %s"
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute(query, (restaurant_id,))
-                dishes_in_db = cursor.fetchall()
+            # Borrow a connection from the pool
+            with self.connection() as conn:
+                dishes_in_db = self._fetch_all(conn, f"SELECT {DISH_COLUMNS} FROM dishes WHERE restaurant_id = %s", (restaurant_id,))
                 
-                dish_list = [Dish(**dish) for dish in dishes_in_db]
+                dish_list = [self._dish_from_row(dish) for dish in dishes_in_db]
                 return dish_list
         except Exception as e:
             raise DatabaseQueryError(f"Retrieve dishes from restaurant {restaurant_id} in database", str(e))
     
+    @instrumented
+    def get_dishes_between(self, start=None, end=None, restaurant_id=None, limit=None, order="date_asc"):
+        """
+        Retrieve the dishes dated between two days, inclusive, optionally for a single restaurant.
+
+        The range is read from the (date, id) index, or the (restaurant_id, date) index when a restaurant is
+        given, so only the matching rows are visited and, with a limit, only the first ones in date order.
+
+        Args:
+            start (str or datetime.date, optional): The first day, "YYYY-MM-DD". Default is None (no lower bound).
+            end (str or datetime.date, optional): The last day, "YYYY-MM-DD". Default is None (no upper bound).
+            restaurant_id (str, optional): Only return this restaurant's dishes. Default is None.
+            limit (int, optional): The maximum number of dishes to return. Default is None (all of them).
+            order (str, optional): "date_asc" or "date_desc". Default is "date_asc".
+
+        Returns:
+            list[Dish]: The matching dishes in date order, ties broken by ID.
+
+        Raises:
+            ValueError: If the 'order' parameter value is not "date_asc" or "date_desc".
+            DatabaseQueryError: If there is an issue while retrieving the dishes from the database.
+
+        Example:
+            # The 20 newest dishes added in July 2023
+            dishes = get_dishes_between("2023-07-01", "2023-07-31", limit=20, order="date_desc")
+        """
+        if order.lower() not in ("date_asc", "date_desc"):
+            raise ValueError(f"Unsupported order: {order}. Must be one of date_asc, date_desc")
+        conditions, parameters = self._date_range_conditions(start, end, restaurant_id)
+        query = f"SELECT {DISH_COLUMNS} FROM dishes WHERE {' AND '.join(conditions)} {self._dish_order_clause(order)}"
+        if limit is not None:
+            query += " LIMIT %s"
+            parameters.append(int(limit))
+        try:
+            # Borrow a connection from the pool
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, parameters)
+                    return [self._dish_from_row(row) for row in cursor.fetchall()]
+        except Exception as e:
+            raise DatabaseQueryError(f"Retrieve dishes dated between {start} and {end} from database", str(e))
+
+    @instrumented
+    def get_dish_timeline(self, period="day", restaurant_id=None, start=None, end=None):
+        """
+        Count the dishes added and average their stars per day, week or month.
+
+        The rollup is computed by the database with a single GROUP BY over the date range, reading the
+        (restaurant_id, date) index when a restaurant is given. No Dish objects are built. Days without
+        dishes are left out, and so are dishes without a date.
+
+        Args:
+            period (str, optional): "day", "week" or "month". Default is "day".
+            restaurant_id (str, optional): Only count this restaurant's dishes. Default is None (every restaurant).
+            start (str or datetime.date, optional): The first day counted. Default is None.
+            end (str or datetime.date, optional): The last day counted. Default is None.
+
+        Returns:
+            list[dict]: One dict per bucket, oldest first, with the keys 'period' (the bucket's first day,
+                "YYYY-MM-DD", or "YYYY-MM" for months), 'dish_count', 'rated_dishes' and 'average_stars'
+                (None when no dish in the bucket has a rating).
+
+        Raises:
+            ValueError: If the 'period' parameter value is not one of TIMELINE_PERIODS.
+            DatabaseQueryError: If there is an issue while aggregating the dishes.
+
+        Example:
+            # Dishes added per week at one restaurant during 2023
+            for bucket in get_dish_timeline("week", restaurant_id, "2023-01-01", "2023-12-31"):
+                print(bucket["period"], bucket["dish_count"], bucket["average_stars"])
+        """
+        if period not in TIMELINE_PERIODS:
+            raise ValueError(f"Unsupported period: {period}. Must be one of {', '.join(TIMELINE_PERIODS)}")
+        conditions, parameters = self._date_range_conditions(start, end, restaurant_id)
+        bucket = self.backend.date_bucket("date", period)
+        query = (f"SELECT {bucket} AS bucket, COUNT(*), COUNT(stars), AVG(stars) FROM dishes "
+                 f"WHERE {' AND '.join(conditions)} GROUP BY bucket ORDER BY bucket")
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, parameters)
+                    rows = cursor.fetchall()
+        except Exception as e:
+            raise DatabaseQueryError(f"Roll up dishes per {period} from database", str(e))
+        return [{"period": label, "dish_count": dish_count, "rated_dishes": rated,
+                 "average_stars": float(average) if average is not None else None}
+                for label, dish_count, rated, average in rows]
+
+    @staticmethod
+    def _date_range_conditions(start, end, restaurant_id):
+        # WHERE conditions and parameters selecting dated dishes in [start, end], of one restaurant if given
+        conditions, parameters = ["date IS NOT NULL"], []
+        if restaurant_id is not None:
+            conditions.append("restaurant_id = %s")
+            parameters.append(restaurant_id)
+        for operator, day in ((">=", start), ("<=", end)):
+            if day is not None:
+                conditions.append(f"date {operator} %s")
+                parameters.append(day.isoformat()[:10] if hasattr(day, "isoformat") else str(day))
+        return conditions, parameters
+
+    @instrumented
+    def get_restaurant_stats(self, restaurant_ids):
+        """
+        Retrieve the dish count, star ratings and latest dish date of one or more restaurants.
+
+        The stats are kept in memory and updated by every dish write made through this instance, so this
+        never touches the database, however many dishes the restaurants have.
+
+        Args:
+            restaurant_ids (str or iterable[str]): The ID of a restaurant, or several IDs.
+
+        Returns:
+            dict: Restaurant IDs mapped to their stats, or to None if the restaurant doesn't exist. The stats
+                have the keys 'dish_count', 'rated_dishes', 'average_stars', 'star_histogram' and
+                'latest_date', see RestaurantStats.get().
+
+        Example:
+            stats = get_restaurant_stats([restaurant.id for restaurant in restaurants])
+            print(stats[restaurant_id]["average_stars"])
+        """
+        if isinstance(restaurant_ids, str):
+            restaurant_ids = [restaurant_ids]
+        return {restaurant_id: self.restaurant_stats.get(restaurant_id) if self.util_restaurant_in_db(restaurant_id) else None
+                for restaurant_id in restaurant_ids}
+
+    @instrumented
+    def verify_restaurant_stats(self, repair=False):
+        """
+        Compare the in-memory restaurant stats with the dishes table, e.g. after writes made by another process.
+
+        Args:
+            repair (bool, optional): Replace the in-memory stats with the freshly aggregated ones. Default is False.
+
+        Returns:
+            dict: Restaurant IDs whose stats had drifted, mapped to (in-memory stats, actual stats).
+                Empty if everything matched.
+
+        Raises:
+            DatabaseQueryError: If there is an issue while aggregating the dishes table.
+        """
+        try:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                rows = self._restaurant_stats_rows(cursor)
+                cursor.close()
+        except Exception as e:
+            raise DatabaseQueryError("Aggregate restaurant stats from database", str(e))
+
+        drift = self.restaurant_stats.diff(rows)
+        if repair:
+            self.restaurant_stats.load(rows)
+        return drift
+
+    @instrumented
     def update_record(self, record_id, table_name, **kwargs):
         """
         Update a record in the specified table. 
@@ -350,16 +1335,35 @@ class DB:
             This method is automatically invoked when calling the 'update' functions for Dish and Restaurant.
             There's typically no need to call this function directly.
         """
+        if table_name == 'dishes' and not self.util_dish_in_db(record_id):
+            raise DishNotFoundError(record_id)
+        if table_name == 'restaurants' and not self.util_restaurant_in_db(record_id):
+            raise RestaurantNotFoundError(record_id)
+
         try:
-            # ... (existing code)
+            if table_name == 'dishes':
+                kwargs = self._coerce_stars(kwargs)
+            dietary_mask = None
+            if table_name == 'dishes' and 'dietary_restrictions' in kwargs:
+                dietary_mask = self._dietary_mask(kwargs['dietary_restrictions'])
+
+            # The dish_ids of the restaurants a dish moves out of and into, rewritten as update_dishes() does
+            restaurant_dishes = {}
+            if table_name == 'dishes' and 'restaurant_id' in kwargs:
+                current = self.index.restaurant_of(record_id)
+                if kwargs['restaurant_id'] != current:
+                    restaurant_dishes[kwargs['restaurant_id']] = self.index.dishes_of(kwargs['restaurant_id']) | {record_id}
+                    if current is not None:
+                        restaurant_dishes[current] = self.index.dishes_of(current) - {record_id}
+
+            # Update the record and log the change in one transaction on one pooled connection
+            with self.transaction() as conn:
+                # The dish's current values, to move its contribution to the restaurant stats
+                old_rows = []
+                if table_name == 'dishes' and {'restaurant_id', 'stars', 'date'} & kwargs.keys():
+                    old_rows = [(record_id, *row) for row in
+                                self._fetch_all(conn, "SELECT restaurant_id, stars, date FROM dishes WHERE id = %s", (record_id,))]
 
-            with mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.name
-            ) as conn:
-                cursor = conn.cursor()
                 update_fields = []
                 params = []
                 for field, value in kwargs.items():
@@ -367,15 +1371,53 @@ class DB:
                         value = json.dumps(value)  # Serialize list to a JSON string
                     update_fields.append(f"{field} = %s")
                     params.append(value)
+                if dietary_mask is not None:
+                    # Keep the bitmask in step with the list it encodes
+                    update_fields.append("dietary_mask = %s")
+                    params.append(dietary_mask)
                 params.append(record_id)
                 update_query = ", ".join(update_fields)
+                # The statement text only depends on which fields are set, so it is prepared once per combination
                 query = f"UPDATE {table_name} SET {update_query} WHERE id = %s"
-                cursor.execute(query, params)
+                self._execute(conn, query, params)
+                for restaurant_id, dish_ids in restaurant_dishes.items():
+                    self._execute(conn, 'UPDATE restaurants SET dish_ids = %s WHERE id = %s', (", ".join(dish_ids), restaurant_id))
+                self._log_changes(conn, table_name, "update", [record_id])
+
+                # Re-read the restaurant's searchable text if part of it changed
+                restaurant_text = None
+                if (table_name == 'restaurants' and self.search_index is not None
+                        and {'restaurant_name', 'address', 'cuisine'} & kwargs.keys()):
+                    rows = self._fetch_all(conn, "SELECT restaurant_name, address, cuisine FROM restaurants WHERE id = %s", (record_id,))
+                    restaurant_text = self._restaurant_search_text(*rows[0])
+
+            # Keep the indexes current if the dish moved to a different restaurant or the restaurant moved
+            if table_name == 'dishes':
+                if 'restaurant_id' in kwargs:
+                    self._invalidate(restaurant_ids=[self.index.restaurant_of(record_id), kwargs['restaurant_id']])
+                    self.index.move_dish(record_id, kwargs['restaurant_id'])
+                if 'stars' in kwargs or dietary_mask is not None:
+                    # A field that wasn't set keeps its value, stars=None clears the rating
+                    filter_fields = {'stars': kwargs['stars']} if 'stars' in kwargs else {}
+                    if dietary_mask is not None:
+                        filter_fields['mask'] = dietary_mask
+                    self.dish_filters.update(record_id, **filter_fields)
+                if 'dish_name' in kwargs and self.search_index is not None:
+                    self.search_index.add(('dishes', record_id), kwargs['dish_name'])
+                self._update_restaurant_stats(old_rows, {record_id: kwargs})
+                self._invalidate(dish_ids=[record_id])
+            if table_name == 'restaurants':
+                self.locations.update(record_id, **kwargs)
+                self.grid.update(record_id, **kwargs)
+                if restaurant_text is not None:
+                    self.search_index.add(('restaurants', record_id), restaurant_text)
+                self._invalidate(restaurant_ids=[record_id])
         except Exception as e:
             kwargs_str = json.dumps(kwargs)
             class_name = "restaurant" if table_name == "restaurants" else "dish"
             raise DatabaseQueryError(f"Update {class_name} {record_id} in database with fields: {kwargs_str}", str(e))
    
+    @instrumented
     def update_dish(self, dish_id, **kwargs):
         """
         Update a dish record in the database with the specified dish ID.
@@ -404,6 +1446,7 @@ class DB:
             raise DatabaseQueryError(f"Update dish {dish_id} in database", str(e))
 
 
+    @instrumented
     def update_restaurant(self, restaurant_id, **kwargs):
         """
         Update a restaurant record in the database with the specified restaurant ID.
@@ -431,7 +1474,202 @@ class DB:
         except Exception as e:
             raise DatabaseQueryError(f"Update restaurant {restaurant_id} in database", str(e))
 
-    
+
+    @instrumented
+    def update_dishes(self, updates, chunk_size=1000):
+        """
+        Update many dish records at once, e.g. after a moderation or re-rating job.
+
+        Dishes are validated against the in-memory index, then written 'chunk_size' at a time, each chunk in
+        its own transaction. Within a chunk, dishes changing the same set of fields share one UPDATE statement
+        run with executemany. Dishes moving to another restaurant have both restaurants' dish_ids rewritten in
+        the same transaction. The in-memory indexes and the cache are refreshed once per committed chunk. If a
+        chunk fails, every dish in it is reported as failed and nothing from that chunk is written.
+
+        Args:
+            updates (dict or iterable[tuple]): Dish IDs mapped to a dict of the fields to change, or
+                (dish_id, fields) pairs. The fields are the keyword arguments update_dish() accepts.
+            chunk_size (int, optional): The number of dishes updated per transaction. Default is 1000.
+
+        Returns:
+            BulkResult: The outcome for each dish ID. Skipped dishes carry a DishNotFoundError,
+                RestaurantNotFoundError (moving to an unknown restaurant), KeyError (the ID or an unknown
+                field), ValueError (no fields, or stars that aren't a number) or DatabaseQueryError.
+
+        Example:
+            # Re-rate two dishes and rename one of them
+            result = update_dishes({'add3ac49-8b7a-4147-914f-3d3b9b103ed7': {'stars': 2},
+                                    '5ef5c49d-27de-4f28-a399-2b87bb324594': {'stars': 5, 'dish_name': 'New Name'}})
+        """
+        return self._update_records('dishes', updates, chunk_size)
+
+    @instrumented
+    def update_restaurants(self, updates, chunk_size=1000):
+        """
+        Update many restaurant records at once.
+
+        Works like update_dishes(): restaurants changing the same set of fields share one executemany per
+        chunk, each chunk is one transaction, and the location, grid and search indexes are refreshed once
+        per committed chunk.
+
+        Args:
+            updates (dict or iterable[tuple]): Restaurant IDs mapped to a dict of the fields to change, or
+                (restaurant_id, fields) pairs. The fields are the keyword arguments update_restaurant() accepts.
+            chunk_size (int, optional): The number of restaurants updated per transaction. Default is 1000.
+
+        Returns:
+            BulkResult: The outcome for each restaurant ID. Skipped restaurants carry a RestaurantNotFoundError,
+                KeyError, ValueError or DatabaseQueryError.
+
+        Example:
+            result = update_restaurants({'add3ac49-8b7a-4147-914f-3d3b9b103ed7': {'cuisine': 'Italian'}})
+        """
+        return self._update_records('restaurants', updates, chunk_size)
+
+    def _update_records(self, table_name, updates, chunk_size):
+        dishes = table_name == 'dishes'
+        result = BulkResult(f"update_{table_name}")
+        start = time.perf_counter()
+        seen = set()
+        items = updates.items() if hasattr(updates, "items") else updates
+        for chunk in self._chunks(items, chunk_size):
+            # Group the rows by the columns they set, each group is one statement
+            groups = {}
+            changes = {}
+            masks = {}
+            for record_id, fields in chunk:
+                if record_id in seen:
+                    # Repeated within this call, the first occurrence's outcome is reported
+                    continue
+                error = self._update_error(table_name, record_id, fields)
+                if error is not None:
+                    result.record(record_id, error)
+                    continue
+                seen.add(record_id)
+                if dishes:
+                    fields = self._coerce_stars(fields)
+                values = dict(fields)
+                if dishes and 'dietary_restrictions' in values:
+                    # Keep the bitmask in step with the list it encodes
+                    values['dietary_mask'] = masks[record_id] = self._dietary_mask(values['dietary_restrictions'])
+                    values['dietary_restrictions'] = json.dumps(values['dietary_restrictions'])
+                columns = tuple(sorted(values))
+                groups.setdefault(columns, []).append(tuple(values[column] for column in columns) + (record_id,))
+                changes[record_id] = fields
+            if not changes:
+                continue
+
+            # Rewrite the dish_ids of every restaurant a dish moves out of or into once for the whole chunk
+            moves = {}
+            restaurant_dishes = {}
+            if dishes:
+                for dish_id, fields in changes.items():
+                    current = self.index.restaurant_of(dish_id)
+                    if 'restaurant_id' in fields and fields['restaurant_id'] != current:
+                        moves[dish_id] = fields['restaurant_id']
+                        for restaurant_id in (current, fields['restaurant_id']):
+                            if restaurant_id not in restaurant_dishes:
+                                restaurant_dishes[restaurant_id] = self.index.dishes_of(restaurant_id)
+                        restaurant_dishes[current].discard(dish_id)
+                        restaurant_dishes[fields['restaurant_id']].add(dish_id)
+
+            # Restaurants whose searchable text changed are re-read in the same transaction
+            text_ids = [] if dishes or self.search_index is None else [
+                restaurant_id for restaurant_id, fields in changes.items()
+                if {'restaurant_name', 'address', 'cuisine'} & fields.keys()]
+
+            # Dishes whose rating, date or restaurant changes move their contribution to the restaurant stats
+            stats_ids = [dish_id for dish_id, fields in changes.items()
+                         if {'restaurant_id', 'stars', 'date'} & fields.keys()] if dishes else []
+
+            try:
+                with self.transaction() as conn:
+                    cursor = conn.cursor()
+                    old_rows = []
+                    if stats_ids:
+                        placeholders = ", ".join(["%s"] * len(stats_ids))
+                        cursor.execute(f"SELECT id, restaurant_id, stars, date FROM dishes WHERE id IN ({placeholders})", stats_ids)
+                        old_rows = cursor.fetchall()
+                    for columns, rows in groups.items():
+                        update_fields = ", ".join(f"{column} = %s" for column in columns)
+                        cursor.executemany(f"UPDATE {table_name} SET {update_fields} WHERE id = %s", rows)
+                    if restaurant_dishes:
+                        cursor.executemany('UPDATE restaurants SET dish_ids = %s WHERE id = %s',
+                                           [(", ".join(dish_ids), restaurant_id) for restaurant_id, dish_ids in restaurant_dishes.items()])
+                    self._log_changes(conn, table_name, "update", changes)
+                    restaurant_texts = []
+                    if text_ids:
+                        placeholders = ", ".join(["%s"] * len(text_ids))
+                        cursor.execute(f"SELECT id, restaurant_name, address, cuisine FROM restaurants WHERE id IN ({placeholders})", text_ids)
+                        restaurant_texts = cursor.fetchall()
+                    cursor.close()
+            except Exception as e:
+                error = DatabaseQueryError(f"Update chunk of {len(changes)} {table_name} in database", str(e))
+                for record_id in changes:
+                    result.record(record_id, error)
+                continue
+
+            # Refresh the in-memory indexes and the cache once the chunk has committed
+            if dishes:
+                self.index.move_dishes(moves.items())
+                # Fields that weren't set keep their value, stars=None clears the rating
+                keep = self.dish_filters.KEEP
+                self.dish_filters.update_many([(dish_id, fields['stars'] if 'stars' in fields else keep, masks.get(dish_id, keep))
+                                               for dish_id, fields in changes.items()
+                                               if 'stars' in fields or dish_id in masks])
+                if self.search_index is not None:
+                    self.search_index.add_many((('dishes', dish_id), fields['dish_name'])
+                                               for dish_id, fields in changes.items() if 'dish_name' in fields)
+                self._update_restaurant_stats(old_rows, changes)
+                self._invalidate(dish_ids=changes, restaurant_ids=restaurant_dishes)
+            else:
+                for restaurant_id, fields in changes.items():
+                    self.locations.update(restaurant_id, **fields)
+                    self.grid.update(restaurant_id, **fields)
+                if restaurant_texts:
+                    self.search_index.add_many((('restaurants', row[0]), self._restaurant_search_text(*row[1:]))
+                                               for row in restaurant_texts)
+                self._invalidate(restaurant_ids=changes)
+            for record_id in changes:
+                result.record(record_id)
+
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def _update_error(self, table_name, record_id, fields):
+        # Why a row of update_dishes or update_restaurants can't be applied, or None if it can
+        if table_name == 'dishes':
+            if not self.util_dish_in_db(record_id):
+                return DishNotFoundError(record_id)
+            allowed = DISH_UPDATE_FIELDS
+        else:
+            if not self.util_restaurant_in_db(record_id):
+                return RestaurantNotFoundError(record_id)
+            allowed = RESTAURANT_UPDATE_FIELDS
+        if not fields:
+            return ValueError(f"No fields to update for {record_id}")
+        if 'id' in fields:
+            return KeyError("The ID cannot be updated")
+        unknown = fields.keys() - allowed
+        if unknown:
+            return KeyError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        if table_name == 'dishes' and 'restaurant_id' in fields and not self.util_restaurant_in_db(fields['restaurant_id']):
+            return RestaurantNotFoundError(fields['restaurant_id'])
+        if table_name == 'dishes':
+            try:
+                self._coerce_stars(fields)
+            except (TypeError, ValueError):
+                return ValueError(f"Invalid star rating for {record_id}: {fields['stars']!r}")
+        return None
+
+    @staticmethod
+    def _coerce_stars(fields):
+        # Star ratings are stored and indexed as ints, the way Dish keeps them, so "4" becomes 4
+        if fields.get('stars') is None:
+            return fields
+        return {**fields, 'stars': int(fields['stars'])}
+
+    @instrumented
     def add_restaurant(self, restaurant):
         """
         Add a new restaurant to the database.
@@ -458,22 +1696,26 @@ class DB:
             raise DuplicateRestaurantError(restaurant.id)
 
         try:
-            with mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.name
-            ) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
+            # Insert the restaurant and log the change in one transaction on one pooled connection
+            with self.transaction() as conn:
+                self._execute(conn, '''
                     INSERT INTO restaurants (id, restaurant_name, address, cuisine, latitude, longitude, dish_ids)
                     VALUES (%s, %s, %s, %s, %s, %s, %s)
                 ''', (restaurant.id, restaurant.name, restaurant.address, restaurant.cuisine, restaurant.latitude, restaurant.longitude, ''))
-
+                self._log_changes(conn, "restaurants", "insert", [restaurant.id])
+
+            self.index.add_restaurant(restaurant.id)
+            self._invalidate(restaurant_ids=[restaurant.id])
+            self.locations.set(restaurant.id, restaurant.latitude, restaurant.longitude, restaurant.cuisine)
+            self.grid.set(restaurant.id, restaurant.latitude, restaurant.longitude)
+            if self.search_index is not None:
+                self.search_index.add(('restaurants', restaurant.id),
+                                      self._restaurant_search_text(restaurant.name, restaurant.address, restaurant.cuisine))
             return restaurant.id
         except Exception as e:
             raise DatabaseQueryError(f"Insert restaurant with ID {restaurant.id} into the database", str(e))
 
+    @instrumented
     def add_dish(self, dish):
         """
         Insert a new dish to the database and update the corresponding restaurant's dish_ids.
@@ -506,31 +1748,18 @@ class DB:
             raise RestaurantNotFoundError(dish.restaurant_id)
 
         try:
-            with mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.name
-            ) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO dishes (id, restaurant_id, image_url, dish_name, date, stars, dietary_restrictions)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ''', (dish.id, dish.restaurant_id, dish.image_url, dish.dish_name, dish.date, dish.stars, json.dumps(dish.dietary_restrictions)))
-        except Exception as e:
-            raise DatabaseQueryError(f"Insert dish with ID {dish.id} into the database", str(e))
-        
-        try:
-            with mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.name
-            ) as conn:
-                cursor = conn.cursor()
+            dietary_mask = self._dietary_mask(dish.dietary_restrictions)
+
+            # Insert the dish and update the restaurant's dish_ids in one transaction on one pooled connection
+            with self.transaction() as conn:
+                self._execute(conn, '''
+                    INSERT INTO dishes (id, restaurant_id, image_url, dish_name, date, stars, dietary_restrictions, dietary_mask)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ''', (dish.id, dish.restaurant_id, dish.image_url, dish.dish_name, dish.date, dish.stars,
+                      json.dumps(dish.dietary_restrictions), dietary_mask))
 
                 # Get the set of dish_ids for the restaurant
-                restaurant_dish_ids = self.all_restaurants.get(dish.restaurant_id, set())
+                restaurant_dish_ids = self.index.dishes_of(dish.restaurant_id)
                 
                 # Add the new dish_id to the set of dish_ids for this restaurant
                 restaurant_dish_ids.add(dish.id)
@@ -539,12 +1768,179 @@ class DB:
                 updated_dish_ids = ", ".join(restaurant_dish_ids)
 
                 # Update the 'dish_ids' of the restaurant
-                cursor.execute('UPDATE restaurants SET dish_ids = %s WHERE id = %s', (updated_dish_ids, dish.restaurant_id))
-
-                return dish.id
+                self._execute(conn, 'UPDATE restaurants SET dish_ids = %s WHERE id = %s', (updated_dish_ids, dish.restaurant_id))
+                self._log_changes(conn, "dishes", "insert", [dish.id])
+
+            # Only record the dish in the index once the transaction has committed
+            self.index.add_dish(dish.id, dish.restaurant_id)
+            self.dish_filters.add(dish.id, dish.stars, dietary_mask)
+            self.restaurant_stats.add(dish.restaurant_id, dish.stars, dish.date)
+            if self.search_index is not None:
+                self.search_index.add(('dishes', dish.id), dish.dish_name)
+            self._invalidate(dish_ids=[dish.id], restaurant_ids=[dish.restaurant_id])
+            return dish.id
         except Exception as e:
-            raise DatabaseQueryError(f"Update 'dish_ids' list for restaurant {dish.restaurant_id} by inserting dish id {dish.id}", str(e))
+            raise DatabaseQueryError(f"Insert dish with ID {dish.id} into the database and update 'dish_ids' of restaurant {dish.restaurant_id}", str(e))
+
+    @instrumented
+    def add_restaurants(self, restaurants, chunk_size=1000):
+        """
+        Add many restaurants to the database.
 
+        Restaurants are validated against the in-memory index, then inserted 'chunk_size' rows at a time with
+        a single executemany per chunk, each chunk in its own transaction. If a chunk fails, every restaurant
+        in it is reported as failed and nothing from that chunk is written.
+
+        Args:
+            restaurants (iterable[Restaurant]): The restaurant objects to be inserted.
+            chunk_size (int, optional): The number of restaurants inserted per transaction. Default is 1000.
+
+        Returns:
+            BulkResult: The outcome for each restaurant ID and the overall rows/sec.
+                Skipped rows carry a DuplicateRestaurantError or DatabaseQueryError.
+
+        Example:
+            result = add_restaurants(restaurants, chunk_size=5000)
+            print(result)
+        """
+        result = BulkResult("add_restaurants")
+        start = time.perf_counter()
+        seen = set()
+        for chunk in self._chunks(restaurants, chunk_size):
+            rows = []
+            for restaurant in chunk:
+                if restaurant.id in seen:
+                    # Repeated within this call, the first occurrence's outcome is reported
+                    continue
+                if self.util_restaurant_in_db(restaurant.id):
+                    result.record(restaurant.id, DuplicateRestaurantError(restaurant.id))
+                    continue
+                seen.add(restaurant.id)
+                rows.append((restaurant.id, restaurant.name, restaurant.address, restaurant.cuisine,
+                             restaurant.latitude, restaurant.longitude, ''))
+            if not rows:
+                continue
+
+            try:
+                with self.transaction() as conn:
+                    cursor = conn.cursor()
+                    cursor.executemany('''
+                        INSERT INTO restaurants (id, restaurant_name, address, cuisine, latitude, longitude, dish_ids)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ''', rows)
+                    self._log_changes(conn, "restaurants", "insert", [row[0] for row in rows])
+            except Exception as e:
+                error = DatabaseQueryError(f"Insert chunk of {len(rows)} restaurants into the database", str(e))
+                for row in rows:
+                    result.record(row[0], error)
+                continue
+
+            for row in rows:
+                self.index.add_restaurant(row[0])
+                self._invalidate(restaurant_ids=[row[0]])
+                self.locations.set(row[0], row[4], row[5], row[3])
+                self.grid.set(row[0], row[4], row[5])
+                result.record(row[0])
+            if self.search_index is not None:
+                self.search_index.add_many((('restaurants', row[0]), self._restaurant_search_text(row[1], row[2], row[3]))
+                                           for row in rows)
+
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    @instrumented
+    def add_dishes(self, dishes, chunk_size=1000):
+        """
+        Add many dishes to the database and update their restaurants' dish_ids.
+
+        Dishes are validated against the in-memory index, then inserted 'chunk_size' rows at a time with a
+        single executemany per chunk, each chunk in its own transaction. The 'dish_ids' of every restaurant
+        touched by the chunk are rewritten once per chunk rather than once per dish, and the in-memory index
+        is updated once the chunk has committed. If a chunk fails, every dish in it is reported as failed
+        and nothing from that chunk is written.
+
+        Args:
+            dishes (iterable[Dish]): The dish objects to be inserted.
+            chunk_size (int, optional): The number of dishes inserted per transaction. Default is 1000.
+
+        Returns:
+            BulkResult: The outcome for each dish ID and the overall rows/sec. Skipped rows carry a
+                DuplicateDishError, RestaurantNotFoundError or DatabaseQueryError.
+
+        Example:
+            result = add_dishes(dishes, chunk_size=5000)
+            print(result)
+        """
+        result = BulkResult("add_dishes")
+        start = time.perf_counter()
+        seen = set()
+        for chunk in self._chunks(dishes, chunk_size):
+            rows = []
+            new_dish_ids = {}
+            for dish in chunk:
+                if dish.id in seen:
+                    # Repeated within this call, the first occurrence's outcome is reported
+                    continue
+                if self.util_dish_in_db(dish.id):
+                    result.record(dish.id, DuplicateDishError(dish.id))
+                    continue
+                if not self.util_restaurant_in_db(dish.restaurant_id):
+                    result.record(dish.id, RestaurantNotFoundError(dish.restaurant_id))
+                    continue
+                seen.add(dish.id)
+                rows.append((dish.id, dish.restaurant_id, dish.image_url, dish.dish_name, dish.date, dish.stars,
+                             json.dumps(dish.dietary_restrictions), self._dietary_mask(dish.dietary_restrictions)))
+                new_dish_ids.setdefault(dish.restaurant_id, []).append(dish.id)
+            if not rows:
+                continue
+
+            # Rewrite each affected restaurant's 'dish_ids' once for the whole chunk
+            dish_id_updates = []
+            for restaurant_id, dish_ids in new_dish_ids.items():
+                restaurant_dish_ids = self.index.dishes_of(restaurant_id)
+                restaurant_dish_ids.update(dish_ids)
+                dish_id_updates.append((", ".join(restaurant_dish_ids), restaurant_id))
+
+            try:
+                with self.transaction() as conn:
+                    cursor = conn.cursor()
+                    cursor.executemany('''
+                        INSERT INTO dishes (id, restaurant_id, image_url, dish_name, date, stars, dietary_restrictions, dietary_mask)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    ''', rows)
+                    cursor.executemany('UPDATE restaurants SET dish_ids = %s WHERE id = %s', dish_id_updates)
+                    self._log_changes(conn, "dishes", "insert", [row[0] for row in rows])
+            except Exception as e:
+                error = DatabaseQueryError(f"Insert chunk of {len(rows)} dishes into the database", str(e))
+                for row in rows:
+                    result.record(row[0], error)
+                continue
+
+            self.index.add_dishes((row[0], row[1]) for row in rows)
+            self.dish_filters.add_many([(row[0], row[5], row[7]) for row in rows])
+            for row in rows:
+                self.restaurant_stats.add(row[1], row[5], row[4])
+            if self.search_index is not None:
+                self.search_index.add_many((('dishes', row[0]), row[3]) for row in rows)
+            self._invalidate(dish_ids=[row[0] for row in rows], restaurant_ids=new_dish_ids)
+            for row in rows:
+                result.record(row[0])
+
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def _chunks(iterable, chunk_size):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        iterator = iter(iterable)
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    @instrumented
     def delete_dish(self, dish_id):
         """
         Delete a dish record from the database and update the corresponding restaurant's dish_ids
@@ -563,68 +1959,549 @@ class DB:
         """
         if not self.util_dish_in_db(dish_id):
             raise DishNotFoundError(dish_id)
-        try:
-            # Retrieve the dish to be deleted
-            dish = self.get_dish(dish_id)
 
-            # Delete the dish from the 'dishes' table
-            with mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.name
-            ) as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM dishes WHERE id = %s", (dish_id,))
+        result = self.delete_dishes([dish_id])
+        error = result.failed.get(dish_id)
+        if error is not None:
+            raise DatabaseQueryError(f"Delete dish with ID {dish_id}", str(error))
 
-            # Update the 'dish_ids' of the corresponding restaurant
-            restaurant_dish_ids = self.all_restaurants[dish.restaurant_id]
-            restaurant_dish_ids.remove(dish_id)
-            updated_dish_ids_str = ", ".join(restaurant_dish_ids)
-            self.update_restaurant(restaurant_id=dish.restaurant_id, dish_ids=updated_dish_ids_str)
+    @instrumented
+    def delete_dishes(self, dish_ids, chunk_size=1000):
+        """
+        Delete many dish records from the database and update the corresponding restaurants' dish_ids.
 
-        except Exception as e:
-            raise DatabaseQueryError(f"Delete dish with ID {dish_id}", str(e))
+        Each chunk of 'chunk_size' dishes is removed with a single DELETE ... WHERE id IN (...), followed by one
+        executemany rewriting the 'dish_ids' of every restaurant that lost a dish, all in one transaction.
+        The in-memory index is updated once per committed chunk.
+
+        Args:
+            dish_ids (iterable[str]): The UUIDs of the dishes to be deleted.
+            chunk_size (int, optional): The number of dishes deleted per transaction. Default is 1000.
 
+        Returns:
+            BulkResult: The outcome for each dish ID. Skipped dishes carry a DishNotFoundError
+                or DatabaseQueryError.
 
+        Example:
+            # Delete two dishes
+            result = delete_dishes(['d39ad9a4-6a98-4c9b-83ad-63a69c24b3e7', '5ef5c49d-27de-4f28-a399-2b87bb324594'])
+        """
+        result = BulkResult("delete_dishes")
+        start = time.perf_counter()
+        for chunk in self._chunks(dish_ids, chunk_size):
+            # Group the chunk by restaurant, dropping unknown and repeated IDs
+            removed = {}
+            for dish_id in chunk:
+                restaurant_id = self.index.restaurant_of(dish_id)
+                if restaurant_id is None:
+                    result.record(dish_id, DishNotFoundError(dish_id))
+                    continue
+                removed.setdefault(restaurant_id, set()).add(dish_id)
+            if not removed:
+                continue
+
+            chunk_ids = [dish_id for ids in removed.values() for dish_id in ids]
+            dish_id_updates = [(", ".join(self.index.dishes_of(restaurant_id) - ids), restaurant_id)
+                               for restaurant_id, ids in removed.items()]
+
+            try:
+                with self.transaction() as conn:
+                    cursor = conn.cursor()
+                    placeholders = ", ".join(["%s"] * len(chunk_ids))
+                    # Read what the dishes contributed to their restaurants' stats before they go
+                    cursor.execute(f"SELECT restaurant_id, stars, date FROM dishes WHERE id IN ({placeholders})", chunk_ids)
+                    stats_rows = cursor.fetchall()
+                    cursor.execute(f"DELETE FROM dishes WHERE id IN ({placeholders})", chunk_ids)
+                    cursor.executemany('UPDATE restaurants SET dish_ids = %s WHERE id = %s', dish_id_updates)
+                    self._log_changes(conn, "dishes", "delete", chunk_ids)
+            except Exception as e:
+                error = DatabaseQueryError(f"Delete chunk of {len(chunk_ids)} dishes", str(e))
+                for dish_id in chunk_ids:
+                    result.record(dish_id, error)
+                continue
+
+            self.index.remove_dishes(chunk_ids)
+            self.dish_filters.remove_many(chunk_ids)
+            stale = set()
+            for restaurant_id, stars, date in stats_rows:
+                if self.restaurant_stats.remove(restaurant_id, stars, date):
+                    stale.add(restaurant_id)
+            self._refresh_latest_dates(stale)
+            if self.search_index is not None:
+                self.search_index.remove_many(('dishes', dish_id) for dish_id in chunk_ids)
+            self._invalidate(dish_ids=chunk_ids, restaurant_ids=removed)
+            for dish_id in chunk_ids:
+                result.record(dish_id)
+
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    @instrumented
     def delete_restaurant(self, restaurant_id):
         """
-        Delete a dish record from the database and delete the corresponding restaurant's dish_ids.
+        Delete a restaurant record from the database along with every dish that belongs to it.
         Essentially, delete the restaurant and everything connected to it.
 
+        The dishes and the restaurant are removed with two set-based DELETE statements in a single
+        transaction, however many dishes the restaurant has, and the in-memory index is updated once.
+
         Args:
-            dish_id (str): The UUID of the dish to be deleted.
+            restaurant_id (str): The UUID of the restaurant to be deleted.
 
         Raises:
-            DishNotFoundError: If the dish with the specified UUID is not found in the database.
-            DatabaseQueryError: If there is an issue while deleting the dish record or updating dish_ids for the restaurant.
+            RestaurantNotFoundError: If the restaurant with the specified UUID is not found in the database.
+            DatabaseQueryError: If there is an issue while deleting the restaurant or its dishes.
 
         Example:
-            # Delete a dish with UUID 'd39ad9a4-6a98-4c9b-83ad-63a69c24b3e7'
-            delete_dish('d39ad9a4-6a98-4c9b-83ad-63a69c24b3e7')
+            # Delete a restaurant with UUID 'd39ad9a4-6a98-4c9b-83ad-63a69c24b3e7'
+            delete_restaurant('d39ad9a4-6a98-4c9b-83ad-63a69c24b3e7')
         """
         try:
             if not self.util_restaurant_in_db(restaurant_id):
                 raise RestaurantNotFoundError(restaurant_id)
 
-            dish_ids_to_delete = set(self.all_restaurants[restaurant_id])
-            for dish_id in dish_ids_to_delete:
-                self.delete_dish(dish_id)
-
-            with mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.name
-            ) as conn:
+            with self.transaction() as conn:
                 cursor = conn.cursor()
+                cursor.execute("DELETE FROM dishes WHERE restaurant_id = %s", (restaurant_id,))
                 cursor.execute("DELETE FROM restaurants WHERE id = %s", (restaurant_id,))
-
-            del self.all_restaurants[restaurant_id]
+                # One entry covers the dishes too, other instances drop a deleted restaurant's dishes with it
+                self._log_changes(conn, "restaurants", "delete", [restaurant_id])
+
+            dish_ids = self.index.remove_restaurant(restaurant_id)
+            self.dish_filters.remove_many(dish_ids)
+            self.restaurant_stats.remove_restaurant(restaurant_id)
+            if self.search_index is not None:
+                self.search_index.remove_many([('restaurants', restaurant_id)] + [('dishes', dish_id) for dish_id in dish_ids])
+            self._invalidate(dish_ids=dish_ids, restaurant_ids=[restaurant_id])
+            self.locations.remove(restaurant_id)
+            self.grid.remove(restaurant_id)
         except Exception as e:
             raise DatabaseQueryError(f"Delete restaurant with ID {restaurant_id}", str(e))
 
-    
+    @instrumented
+    def find_dishes(self, dietary_restrictions=None, min_stars=None, max_stars=None):
+        """
+        Find the dishes having every one of the given dietary restrictions and a star rating in range.
+
+        The filter is answered by 'self.dish_filters' with bitwise ANDs over one bitmap per dietary tag and
+        star rating, without scanning the dishes table, and only the matching dishes are loaded from the
+        database.
+
+        Args:
+            dietary_restrictions (list[str], optional): Restrictions every dish must have, matched
+                case-insensitively, e.g. ["vegan", "gluten free"]. Default is None (no restriction filter).
+            min_stars (int, optional): Lowest star rating to include. Default is None.
+            max_stars (int, optional): Highest star rating to include. Default is None.
+
+        Returns:
+            list[Dish]: The matching dishes.
+
+        Raises:
+            DatabaseQueryError: If there is an issue while retrieving the dishes from the database.
+
+        Example:
+            # Vegan and gluten-free dishes rated 4 stars or more
+            for dish in find_dishes(["vegan", "gluten free"], min_stars=4):
+                print(dish.dish_name, dish.stars)
+        """
+        required_mask = self.dietary_mask(dietary_restrictions or [])
+        if required_mask is None:
+            # A restriction no dish has ever had
+            return []
+        dish_ids = self.dish_filters.query(required_mask, min_stars=min_stars, max_stars=max_stars)
+        return self._get_dishes_by_ids(dish_ids)
+
+    @instrumented
+    def search(self, text, limit=20, filters=None):
+        """
+        Full-text search over dish names and restaurant names, addresses and cuisines, ranked by relevance.
+
+        With the "memory" search backend, the query is scored with BM25 against the in-process inverted index,
+        which every add, update and delete made through this instance keeps current, and only the top results
+        are loaded from the database. With the "mysql" backend, each table is queried through its FULLTEXT
+        index with MATCH ... AGAINST in natural language mode and the two result lists are merged by score.
+
+        Args:
+            text (str): The search terms, e.g. "chicken wrap" or "main st".
+            limit (int, optional): The maximum number of results. Default is 20.
+            filters (dict, optional): Narrow the results. Supported keys:
+                - type (str): "dishes" or "restaurants".
+                - restaurant_id (str): Only dishes from this restaurant.
+                - min_stars (int) / max_stars (int): Only dishes rated in this range.
+                - dietary_restrictions (list[str]): Only dishes having every one of these restrictions.
+                Any key other than 'type' applies to dishes, so restaurants are left out when one is given.
+
+        Returns:
+            list[tuple]: (Dish or Restaurant, score) pairs, most relevant first.
+
+        Raises:
+            ValueError: If 'filters' has an unsupported key or type.
+            DatabaseQueryError: If there is an issue while retrieving the results from the database.
+
+        Example:
+            # The 10 best vegetarian matches for "avocado wrap"
+            for item, score in search("avocado wrap", limit=10, filters={"dietary_restrictions": ["vegetarian"]}):
+                print(type(item).__name__, round(score, 2), item.to_dict())
+        """
+        filters = dict(filters or {})
+        kind = filters.pop("type", None)
+        restaurant_id = filters.pop("restaurant_id", None)
+        min_stars = filters.pop("min_stars", None)
+        max_stars = filters.pop("max_stars", None)
+        dietary_restrictions = filters.pop("dietary_restrictions", None)
+        if filters:
+            raise ValueError(f"Unsupported search filters: {', '.join(filters)}")
+        if kind not in (None, "dishes", "restaurants"):
+            raise ValueError(f"Unsupported search type: {kind}. Must be 'dishes' or 'restaurants'")
+
+        dish_filtered = restaurant_id is not None or min_stars is not None or max_stars is not None or dietary_restrictions
+        if dish_filtered:
+            if kind == "restaurants":
+                return []
+            kind = "dishes"
+        required_mask = self.dietary_mask(dietary_restrictions or [])
+        if required_mask is None:
+            # A restriction no dish has ever had
+            return []
+
+        if self.search_backend == "mysql":
+            return self._search_fulltext(text, limit, kind, restaurant_id, min_stars, max_stars, required_mask)
+
+        accept = None
+        if dish_filtered:
+            def accept(key):
+                dish_id = key[1]
+                return ((restaurant_id is None or self.index.restaurant_of(dish_id) == restaurant_id)
+                        and self.dish_filters.matches(dish_id, required_mask, min_stars, max_stars))
+        matches = self.search_index.search(text, limit=limit, kind=kind, accept=accept)
+
+        dishes = {dish.id: dish for dish in self._get_dishes_by_ids([key[1] for key, _ in matches if key[0] == 'dishes'])}
+        restaurants = self._get_restaurants_by_ids([key[1] for key, _ in matches if key[0] == 'restaurants'])
+        results = []
+        for (table_name, record_id), score in matches:
+            record = dishes.get(record_id) if table_name == 'dishes' else restaurants.get(record_id)
+            if record is not None:
+                results.append((record, score))
+        return results
+
+    def _search_fulltext(self, text, limit, kind, restaurant_id, min_stars, max_stars, required_mask):
+        # search() through the FULLTEXT indexes, one MATCH ... AGAINST query per table
+        queries = []
+        if kind in (None, "dishes"):
+            conditions, parameters = ["MATCH (dish_name) AGAINST (%s IN NATURAL LANGUAGE MODE)"], [text, text]
+            if restaurant_id is not None:
+                conditions.append("restaurant_id = %s")
+                parameters.append(restaurant_id)
+            if min_stars is not None:
+                conditions.append("stars >= %s")
+                parameters.append(min_stars)
+            if max_stars is not None:
+                conditions.append("stars <= %s")
+                parameters.append(max_stars)
+            if required_mask:
+                conditions.append("(dietary_mask & %s) = %s")
+                parameters.extend([required_mask, required_mask])
+            queries.append(("dishes", DISH_COLUMNS, "dish_name", conditions, parameters))
+        if kind in (None, "restaurants"):
+            queries.append(("restaurants", RESTAURANT_COLUMNS, "restaurant_name, address, cuisine",
+                            ["MATCH (restaurant_name, address, cuisine) AGAINST (%s IN NATURAL LANGUAGE MODE)"], [text, text]))
+
+        results = []
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    for table_name, select_columns, columns, conditions, parameters in queries:
+                        cursor.execute(f"""
+                            SELECT {select_columns}, MATCH ({columns}) AGAINST (%s IN NATURAL LANGUAGE MODE) AS score
+                            FROM {table_name} WHERE {' AND '.join(conditions)}
+                            ORDER BY score DESC LIMIT {int(limit)}
+                        """, parameters)
+                        row_to_object = self._row_mapper(table_name)
+                        for row in cursor.fetchall():
+                            results.append((row_to_object(row[:-1]), float(row[-1])))
+        except Exception as e:
+            raise DatabaseQueryError(f"Full-text search for '{text}'", str(e))
+
+        results.sort(key=lambda pair: pair[1], reverse=True)
+        return results[:limit]
+
+    def _get_dishes_by_ids(self, dish_ids, chunk_size=1000):
+        # Load many dishes with one query per 'chunk_size' IDs
+        if not dish_ids:
+            return []
+        dishes = []
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    for chunk in self._chunks(dish_ids, chunk_size):
+                        placeholders = ", ".join(["%s"] * len(chunk))
+                        cursor.execute(f"SELECT {DISH_COLUMNS} FROM dishes WHERE id IN ({placeholders})", chunk)
+                        dishes.extend(self._dish_from_row(row) for row in cursor.fetchall())
+            return dishes
+        except Exception as e:
+            raise DatabaseQueryError(f"Retrieve {len(dish_ids)} dishes from database", str(e))
+
+    @instrumented
+    def nearest_restaurants(self, lat, lon, k=10, max_km=None, cuisine=None):
+        """
+        Find the restaurants closest to a location.
+
+        Distances are computed with the haversine formula over the restaurant coordinates held in memory by
+        'self.locations', in vectorized batches, and the k closest are selected with a partial sort. Only those
+        k restaurants are then loaded from the database, with a single query. Restaurants without coordinates
+        are never returned.
+
+        Args:
+            lat (float): Latitude of the location in degrees.
+            lon (float): Longitude of the location in degrees.
+            k (int, optional): The maximum number of restaurants to return. Default is 10.
+            max_km (float, optional): Only return restaurants within this many kilometers. Default is None.
+            cuisine (str, optional): Only return restaurants with this cuisine (case-insensitive). Default is None.
+
+        Returns:
+            list[tuple]: (Restaurant, distance in kilometers) pairs, closest first.
+
+        Raises:
+            DatabaseQueryError: If there is an issue while retrieving the restaurants from the database.
+
+        Example:
+            # The 5 closest Italian restaurants within 10km of downtown Detroit
+            for restaurant, distance in nearest_restaurants(42.33, -83.05, k=5, max_km=10, cuisine="Italian"):
+                print(restaurant.name, round(distance, 2))
+        """
+        nearest = self.locations.nearest(lat, lon, k=k, max_km=max_km, cuisine=cuisine)
+        restaurants = self._get_restaurants_by_ids([restaurant_id for restaurant_id, _ in nearest])
+        return [(restaurants[restaurant_id], distance) for restaurant_id, distance in nearest
+                if restaurant_id in restaurants]
+
+    @instrumented
+    def top_dishes_near(self, lat, lon, k=10, radius_km=5, dietary=None, weights=None, half_life_days=30,
+                        today=None, batch_size=64):
+        """
+        Find the best dishes near a location, ranked by a weighted mix of stars, recency and distance.
+
+        Each dish scores weights["stars"] * stars / 5 + weights["recency"] * 0.5 ** (age in days / half_life_days)
+        + weights["distance"] * (1 - distance / radius_km), where the age is counted from the dish's date and
+        the distance is its restaurant's. The restaurants within 'radius_km' are found the way restaurants_within()
+        finds them, so only the grid cells around the location are visited, then their dishes are streamed from
+        the database 'batch_size' restaurants at a time, closest first, with the dietary filter pushed into the
+        query. A bounded heap keeps the best k.
+        Restaurants whose highest star rating and latest date (from 'self.restaurant_stats') can't beat the
+        current k-th score are skipped, and the scan stops once no restaurant further out could.
+
+        Args:
+            lat (float): Latitude of the location in degrees.
+            lon (float): Longitude of the location in degrees.
+            k (int, optional): The maximum number of dishes to return. Default is 10.
+            radius_km (float, optional): Only consider restaurants within this many kilometers. Default is 5.
+            dietary (list[str], optional): Restrictions every dish must have, as in find_dishes(). Default is None.
+            weights (dict, optional): Weights of the "stars", "recency" and "distance" components. Missing
+                components default to TOP_DISH_WEIGHTS. Default is None.
+            half_life_days (float, optional): The age at which a dish's recency component halves. Default is 30.
+            today (datetime.date, optional): The date ages are counted from. Default is today.
+            batch_size (int, optional): The number of restaurants whose dishes are fetched per query. Default is 64.
+
+        Returns:
+            list[tuple]: (Dish, score, distance in kilometers) triples, best first.
+
+        Raises:
+            ValueError: If 'weights' has an unknown component or a negative weight.
+            DatabaseQueryError: If there is an issue while retrieving the dishes from the database.
+
+        Example:
+            # The 10 best vegan dishes within 3km of downtown Detroit, favoring the recent ones
+            for dish, score, distance in top_dishes_near(42.33, -83.05, k=10, radius_km=3, dietary=["vegan"],
+                                                         weights={"stars": 0.5, "recency": 0.4, "distance": 0.1}):
+                print(dish.dish_name, dish.stars, round(score, 3), round(distance, 2))
+        """
+        weights = {**TOP_DISH_WEIGHTS, **(weights or {})}
+        if weights.keys() != TOP_DISH_WEIGHTS.keys():
+            raise ValueError(f"Unknown score components: {', '.join(weights.keys() - TOP_DISH_WEIGHTS.keys())}")
+        if min(weights.values()) < 0:
+            raise ValueError("Score weights must not be negative")
+        if k <= 0 or radius_km <= 0:
+            return []
+        required_mask = self.dietary_mask(dietary or [])
+        if required_mask is None:
+            # A restriction no dish has ever had
+            return []
+        stars_weight = weights["stars"] / MAX_STARS
+        recency_weight, distance_weight = weights["recency"], weights["distance"]
+        today = (today or datetime.date.today()).toordinal()
+        recency_of = {}
+
+        def recency(date):
+            # Dates repeat a lot, so each distinct one is parsed once per call
+            value = recency_of.get(date)
+            if value is None:
+                try:
+                    age = max(today - datetime.date.fromisoformat(str(date)[:10]).toordinal(), 0)
+                    value = 0.5 ** (age / half_life_days)
+                except ValueError:
+                    value = 0.0
+                recency_of[date] = value
+            return value
+
+        query = "SELECT id, restaurant_id, stars, date FROM dishes WHERE restaurant_id IN ({})"
+        parameters = []
+        if required_mask:
+            query += " AND (dietary_mask & %s) = %s"
+            parameters = [required_mask, required_mask]
+
+        # (score, dish_id, distance), the worst of the current top k on top
+        heap = []
+        # Candidates come from the grid cells overlapping the circle, or a bounding-box query while the grid is cold
+        if self.grid.ready:
+            nearby = self.grid.within_radius(lat, lon, radius_km)
+        else:
+            nearby = [(restaurant.id, distance) for restaurant, distance in self.restaurants_within(lat, lon, radius_km)]
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    for start in range(0, len(nearby), batch_size):
+                        threshold = heap[0][0] if len(heap) == k else None
+                        # Restaurants are in distance order, so this bounds every remaining dish
+                        if (threshold is not None and
+                                weights["stars"] + recency_weight + distance_weight * (1 - nearby[start][1] / radius_km) <= threshold):
+                            break
+                        distances = {}
+                        for restaurant_id, distance in nearby[start:start + batch_size]:
+                            bounds = self.restaurant_stats.bounds(restaurant_id)
+                            if bounds is None:
+                                continue
+                            max_stars, latest_date = bounds
+                            best = ((max_stars or 0) * stars_weight + (recency(latest_date) if latest_date else 0) * recency_weight
+                                    + distance_weight * (1 - distance / radius_km))
+                            if threshold is None or best > threshold:
+                                distances[restaurant_id] = distance
+                        if not distances:
+                            continue
+
+                        cursor.execute(query.format(", ".join(["%s"] * len(distances))), [*distances, *parameters])
+                        for dish_id, restaurant_id, stars, date in cursor.fetchall():
+                            distance = distances[restaurant_id]
+                            score = ((stars or 0) * stars_weight + (recency(date) if date else 0) * recency_weight
+                                     + distance_weight * (1 - distance / radius_km))
+                            if len(heap) < k:
+                                heapq.heappush(heap, (score, dish_id, distance))
+                            elif score > heap[0][0]:
+                                heapq.heapreplace(heap, (score, dish_id, distance))
+        except Exception as e:
+            raise DatabaseQueryError(f"Rank dishes within {radius_km}km of ({lat}, {lon})", str(e))
+
+        ranked = sorted(heap, reverse=True)
+        dishes = {dish.id: dish for dish in self._get_dishes_by_ids([dish_id for _, dish_id, _ in ranked])}
+        return [(dishes[dish_id], score, distance) for score, dish_id, distance in ranked if dish_id in dishes]
+
+    @instrumented
+    def warm_spatial_index(self):
+        """Build the in-process grid index from the database so radius and viewport queries stop going to the database.
+
+        Raises:
+            DatabaseQueryError: If there is an issue while reading the restaurants.
+        """
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT id, cuisine, latitude, longitude FROM restaurants")
+                    self.grid.load(cursor.fetchall())
+        except Exception as e:
+            raise DatabaseQueryError("Load spatial index from database", str(e))
+
+    @instrumented
+    def restaurants_within(self, lat, lon, radius_km):
+        """
+        Find every restaurant within a radius of a location.
+
+        While the grid index is warm, only the grid cells overlapping the circle's bounding box are visited and the
+        restaurants found there are refined with haversine_distance, so the matches are hydrated with one query.
+        While it is cold, the bounding box is pushed into the database as a prefilter served by the
+        (latitude, longitude) index and the rows it returns are refined the same way.
+
+        Args:
+            lat (float): Latitude of the location in degrees.
+            lon (float): Longitude of the location in degrees.
+            radius_km (float): The search radius in kilometers.
+
+        Returns:
+            list[tuple]: (Restaurant, distance in kilometers) pairs, closest first.
+
+        Raises:
+            DatabaseQueryError: If there is an issue while retrieving the restaurants from the database.
+
+        Example:
+            # Every restaurant within 2km of downtown Detroit
+            for restaurant, distance in restaurants_within(42.33, -83.05, 2):
+                print(restaurant.name, round(distance, 2))
+        """
+        if self.grid.ready:
+            matches = self.grid.within_radius(lat, lon, radius_km)
+            restaurants = self._get_restaurants_by_ids([restaurant_id for restaurant_id, _ in matches])
+            return [(restaurants[restaurant_id], distance) for restaurant_id, distance in matches
+                    if restaurant_id in restaurants]
+
+        found = []
+        for restaurant in self._get_restaurants_in_box(*bounding_box(lat, lon, radius_km)):
+            distance = haversine_distance(lat, lon, restaurant.latitude, restaurant.longitude)
+            if distance <= radius_km:
+                found.append((restaurant, distance))
+        found.sort(key=lambda pair: pair[1])
+        return found
+
+    @instrumented
+    def restaurants_in_viewport(self, south, west, north, east):
+        """
+        Find every restaurant inside a map viewport.
+
+        Uses the grid index while it is warm and a bounding-box query against the database otherwise.
+
+        Args:
+            south (float): Latitude of the viewport's bottom edge in degrees.
+            west (float): Longitude of the viewport's left edge in degrees. Greater than 'east' if the
+                viewport crosses the antimeridian.
+            north (float): Latitude of the viewport's top edge in degrees.
+            east (float): Longitude of the viewport's right edge in degrees.
+
+        Returns:
+            list[Restaurant]: The restaurants inside the viewport.
+
+        Raises:
+            DatabaseQueryError: If there is an issue while retrieving the restaurants from the database.
+        """
+        if self.grid.ready:
+            return list(self._get_restaurants_by_ids(self.grid.in_viewport(south, west, north, east)).values())
+        return self._get_restaurants_in_box(south, west, north, east)
+
+    def _get_restaurants_in_box(self, south, west, north, east):
+        # Bounding-box prefilter served by idx_restaurants_lat_lon, split in two across the antimeridian
+        if west > east:
+            return self._get_restaurants_in_box(south, west, north, 180.0) + self._get_restaurants_in_box(south, -180.0, north, east)
+        query = f"SELECT {RESTAURANT_COLUMNS} FROM restaurants WHERE latitude BETWEEN %s AND %s AND longitude BETWEEN %s AND %s"
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, (south, north, west, east))
+                    return [self._restaurant_from_row(row) for row in cursor.fetchall()]
+        except Exception as e:
+            raise DatabaseQueryError(f"Query restaurants in box ({south}, {west}, {north}, {east})", str(e))
+
+    def _get_restaurants_by_ids(self, restaurant_ids, chunk_size=1000):
+        # Load many restaurants with one query per 'chunk_size' IDs, returned as a dict keyed by restaurant ID
+        if not restaurant_ids:
+            return {}
+        restaurants = {}
+        try:
+            with self.connection() as conn:
+                with conn.cursor() as cursor:
+                    for chunk in self._chunks(restaurant_ids, chunk_size):
+                        placeholders = ", ".join(["%s"] * len(chunk))
+                        cursor.execute(f"SELECT {RESTAURANT_COLUMNS} FROM restaurants WHERE id IN ({placeholders})", chunk)
+                        restaurants.update((row[0], self._restaurant_from_row(row)) for row in cursor.fetchall())
+            return restaurants
+        except Exception as e:
+            raise DatabaseQueryError(f"Retrieve {len(restaurant_ids)} restaurants from database", str(e))
+
+    @instrumented
     def custom_query(self, table_name, conditions, order_by=None, parameters=None):
         """
         Retrieve rows from the specified table based on the provided conditions and optional sorting.
@@ -655,6 +2532,7 @@ class DB:
                 print(dish.dish_name, dish.stars)
 
             # Retrieve dishes with 'Main St' in their address, sorted by dish name in ascending order
+            # (LIKE '%...%' can't use an index, search() is the ranked, indexed alternative)
             conditions = ["address LIKE ?"]
             parameters = ("%Main St%",)
             order_by = "dish_name ASC"
@@ -662,60 +2540,78 @@ class DB:
             for dish in result:
                 print(dish.dish_name, dish.address)
 
-            # Retrieve dishes with multiple dietary restrictions, i.e., vegetarian and gluten-free
-            conditions = ["dietary_restrictions LIKE ?", "dietary_restrictions LIKE ?"]
-            parameters = ("%vegetarian%", "%gluten-free%")
+            # Retrieve dishes with multiple dietary restrictions, i.e., vegetarian and gluten-free, with a bit test
+            # on 'dietary_mask' rather than LIKE over the JSON text (see also find_dishes)
+            mask = dietary_mask(["vegetarian", "gluten-free"])
+            conditions = ["(dietary_mask & %s) = %s"]
+            parameters = (mask, mask)
             result = custom_query('dishes', conditions, parameters=parameters)
             for dish in result:
                 print(dish.dish_name, dish.dietary_restrictions)
 
         """
-        query = f'''
-            SELECT *
-            FROM {table_name}
-            WHERE {' AND '.join(conditions)}
-        '''
-        if order_by:
-            query += f' ORDER BY {order_by}'
-
-        try:
-            with mysql.connector.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.name
-            ) as conn:
-                cursor = conn.cursor(dictionary=True)
-                cursor.execute(query, parameters)
-
-                result = []
-                for row in cursor.fetchall():
-                    if table_name == 'restaurants':
-                        result.append(Restaurant(**row))
-                    elif table_name == 'dishes':
-                        result.append(Dish(**row))
-                    else:
-                        raise ValueError(f"Unsupported table name: {table_name}")
+        query = self._build_query(table_name, conditions, order_by)
+        row_to_object = self._row_mapper(table_name)
+
+        try:
+            # Borrow a connection from the pool
+            with self.connection() as conn:
+                result = [row_to_object(row) for row in self._fetch_all(conn, query, parameters)]
 
             return result
         except Exception as e:
             raise DatabaseQueryError(f"Query table with query {query}", str(e))
+
+    @instrumented
+    def iter_query(self, table_name, conditions, order_by=None, parameters=None, batch_size=1000):
+        """
+        Stream the rows matched by a custom query without loading them all into memory.
+
+        Takes the same arguments as custom_query, but yields objects one at a time while reading the result set
+        'batch_size' rows per round trip from an unbuffered, server-side cursor. The generator holds a pooled
+        connection until it is exhausted or closed.
+
+        Args:
+            table_name (str): Name of the table to query. (MUST be either 'restaurants' or 'dishes')
+            conditions (list[str]): list of SQL WHERE clause conditions, e.g., ["stars >= %s"].
+            order_by (str, optional): Column to sort by and sorting direction, e.g., "stars DESC". Default is None.
+            parameters (tuple, optional): Values to replace placeholders in conditions, e.g., (4,).
+            batch_size (int, optional): The number of rows fetched per round trip. Default is 1000.
+
+        Yields:
+            object: A Restaurant or Dish for each matching row.
+
+        Example:
+            for dish in db.iter_query('dishes', ["stars >= %s"], parameters=(4,)):
+                print(dish.dish_name, dish.stars)
+        """
+        query = self._build_query(table_name, conditions, order_by)
+        return self._stream_rows(query, parameters, self._row_mapper(table_name), batch_size,
+                                 f"Stream table with query {query}")
+
+    @staticmethod
+    def _build_query(table_name, conditions, order_by):
+        columns = {'restaurants': RESTAURANT_COLUMNS, 'dishes': DISH_COLUMNS}.get(table_name)
+        if columns is None:
+            raise ValueError(f"Unsupported table name: {table_name}")
+        query = f"SELECT {columns} FROM {table_name}"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        return query
+
+    def _row_mapper(self, table_name):
+        if table_name == 'restaurants':
+            return self._restaurant_from_row
+        elif table_name == 'dishes':
+            return self._dish_from_row
+        raise ValueError(f"Unsupported table name: {table_name}")
         
     def util_restaurant_in_db(self, restaurant_id_in) -> bool:
-        # Iterate through each restaurant ID (key)
-        for restaurant_id in self.all_restaurants:
-            if restaurant_id == restaurant_id_in:
-                return True # The restaurant does exist in the database
-                
-        return False # The restaurant does NOT exist in the database
+        # O(1) lookup in the in-memory index
+        return self.index.has_restaurant(restaurant_id_in)
                     
     def util_dish_in_db(self, dish_id_in) -> bool:
-        # Iterate through each "row" of the dict-- each restaurant and its affiliate dish IDs
-        for restaurant_ids, dish_ids in self.all_restaurants.items():
-            # Iterate through each corresponding dish ID for this restaurant
-            if (dish_ids is not None):
-                for dish_id in dish_ids:
-                    if dish_id == dish_id_in:
-                        return True # The dish does exist in the database
-        return False # The dish does NOT exist in the database
-    
\ No newline at end of file
+        # O(1) lookup in the in-memory index
+        return self.index.has_dish(dish_id_in)
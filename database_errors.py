@@ -60,3 +60,17 @@ class UserError(Exception):
         self.password = password
         self.error = error
         super().__init__(f"Failed to {action} user with ID: {id}, username: {username}, password: {password} because {error}")
+
+class PoolExhaustedError(Exception):
+    """
+    Exception raised when a connection cannot be checked out of the connection pool.
+
+    Attributes:
+        action (str): The pool operation that failed.
+        reason (str): Why no connection could be handed out.
+    """
+
+    def __init__(self, action, reason):
+        self.action = action
+        self.reason = reason
+        super().__init__(f"Failed to {action} a pooled connection because {reason}")
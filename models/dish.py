@@ -1,7 +1,14 @@
 from typing import Optional, List
 import sqlite3, os, json, utils.utility as utility, uuid
 from uuid import UUID, uuid4
+from utils.dietary import parse_dietary_restrictions
 class Dish:
+    # Column order of the tuples accepted by from_row(), also the column list the DB class selects
+    COLUMNS = ("id", "restaurant_id", "dish_name", "image_url", "date", "stars", "dietary_restrictions")
+
+    # No per-instance __dict__: a few hundred thousand dishes cost far less memory and build faster
+    __slots__ = ("id", "restaurant_id", "dish_name", "image_url", "date", "stars", "_dietary_restrictions")
+
     def __init__(self, id: Optional[str] = None, restaurant_id: Optional[int] = None,
                  dish_name: Optional[str] = None, image_url: Optional[str] = None,
                  date: Optional[str] = None, stars: Optional[int] = None,
@@ -12,12 +19,42 @@ class Dish:
         self.image_url = image_url
         self.date = date
         self.stars = int(stars) if stars is not None else None
-        self.dietary_restrictions = utility.listify(dietary_restrictions)
-        
+        self.dietary_restrictions = dietary_restrictions
+
+    @classmethod
+    def from_row(cls, row, lazy_dietary_restrictions=False):
+        """
+        Build a Dish straight from a positional database row, skipping the keyword-argument constructor.
+
+        Args:
+            row (tuple): The values of Dish.COLUMNS, in that order.
+            lazy_dietary_restrictions (bool, optional): Keep the stored JSON text and only parse it the first time
+                'dietary_restrictions' is read. Default is False.
+
+        Returns:
+            Dish: The dish the row describes.
+        """
+        dish = object.__new__(cls)
+        dish.id, dish.restaurant_id, dish.dish_name, dish.image_url, dish.date, dish.stars, dietary_restrictions = row
+        dish._dietary_restrictions = (dietary_restrictions if lazy_dietary_restrictions
+                                      else parse_dietary_restrictions(dietary_restrictions))
+        return dish
+
+    @property
+    def dietary_restrictions(self):
+        # A lazily loaded dish holds the stored text until the list is first asked for
+        value = self._dietary_restrictions
+        if not isinstance(value, list):
+            value = self._dietary_restrictions = parse_dietary_restrictions(value)
+        return value
+
+    @dietary_restrictions.setter
+    def dietary_restrictions(self, value):
+        self._dietary_restrictions = parse_dietary_restrictions(value)
+
     def __str__(self):
-        dish_json = json.dumps(self.to_dict(), indent=4)
-        return dish_json
-    
+        return utility.dumps(self.to_dict())
+
     def to_dict(self):
         data = {
             "id": self.id,
@@ -29,4 +66,3 @@ class Dish:
             "dietary_restrictions": self.dietary_restrictions
         }
         return data
-
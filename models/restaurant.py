@@ -4,10 +4,16 @@ from .dish import Dish
 from typing import Optional, List
 import utils.utility as utility
 class Restaurant:
+    # Column order of the tuples accepted by from_row(), also the column list the DB class selects
+    COLUMNS = ("id", "restaurant_name", "address", "cuisine", "latitude", "longitude")
+
+    # No per-instance __dict__: large listings cost far less memory and build faster
+    __slots__ = ("id", "name", "address", "cuisine", "latitude", "longitude", "dish_ids", "dishes")
+
     def __init__(self, id: Optional[str] = None, name: Optional[str] = None,
                  address: Optional[str] = None, cuisine: Optional[str] = None,
                  latitude: Optional[float] = None, longitude: Optional[float] = None,
-                 dish_ids: Optional[List[str]] = None):
+                 dish_ids: Optional[List[str]] = None, dishes: Optional[List[Dish]] = None):
         self.id = id if id is not None else str(uuid4())  # Assign a new UUID if id is None
         self.name = name
         self.address = address
@@ -15,10 +21,29 @@ class Restaurant:
         self.latitude = latitude
         self.longitude = longitude
         self.dish_ids = utility.listify(dish_ids)
-    
+        self.dishes = dishes  # Only set when the restaurant was loaded together with its dishes
+
+    @classmethod
+    def from_row(cls, row, dish_ids=None):
+        """
+        Build a Restaurant straight from a positional database row, skipping the keyword-argument constructor.
+
+        Args:
+            row (tuple): The values of Restaurant.COLUMNS, in that order.
+            dish_ids (list[str], optional): The IDs of the restaurant's dishes. Default is an empty list.
+
+        Returns:
+            Restaurant: The restaurant the row describes.
+        """
+        restaurant = object.__new__(cls)
+        restaurant.id, restaurant.name, restaurant.address, restaurant.cuisine, restaurant.latitude, restaurant.longitude = row
+        restaurant.dish_ids = dish_ids if dish_ids is not None else []
+        restaurant.dishes = None
+        return restaurant
+
     def __str__(self):
-        return json.dumps(self.to_dict(), indent=4)
-        
+        return utility.dumps(self.to_dict())
+
     def to_dict(self):
         data = {
             "id": self.id,
@@ -29,5 +54,7 @@ class Restaurant:
             "longitude": self.longitude,
             "dish_ids": self.dish_ids
         }
+        if self.dishes is not None:
+            data["dishes"] = [dish.to_dict() for dish in self.dishes]
         return data
 
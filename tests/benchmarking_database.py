@@ -0,0 +1,985 @@
+from database import DB, TIMELINE_PERIODS
+from async_database import AsyncDB
+from models import Restaurant, Dish
+from concurrent.futures import ThreadPoolExecutor
+from utils.entity_index import EntityIndex
+from utils.geo_index import LocationIndex, GridIndex
+from utils.dietary import DishFilterIndex
+from utils.search_index import SearchIndex
+from utils.instrumentation import Instrumentation
+from utils.password_hasher import PasswordHasher
+from utils.session_tokens import SessionTokens
+from werkzeug.security import check_password_hash
+from testing_database import util_connect_db
+import authentication
+import utils.migrations as migrations
+import time, tracemalloc, uuid, random, statistics, asyncio, os, json, datetime, sys, subprocess
+import utils.utility as utility
+
+def benchmark_index_load(num_restaurants=20000, num_dishes=1000000):
+    """_summary_
+    Times bulk-loading the restaurant/dish existence index and reports the memory it holds
+    """
+    # Build the rows the database would stream back, each row with its own copy of the restaurant ID
+    restaurant_ids = [str(uuid.uuid4()) for _ in range(num_restaurants)]
+    dish_rows = [(str(uuid.uuid4()), restaurant_ids[i % num_restaurants].encode().decode()) for i in range(num_dishes)]
+
+    index = EntityIndex()
+    tracemalloc.start()
+    start = time.perf_counter()
+    index.load(restaurant_ids, iter(dish_rows))
+    elapsed = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"Index load: {num_restaurants} restaurants, {num_dishes} dishes")
+    print(f"  startup time: {elapsed:.2f} s")
+    print(f"  index memory (excluding ID strings): {memory / 2**20:.1f} MiB")
+
+    # Time the existence checks that replaced the linear scans
+    probe = [row[0] for row in dish_rows[::max(1, num_dishes // 100000)]]
+    start = time.perf_counter()
+    for dish_id in probe:
+        index.has_dish(dish_id)
+    per_lookup = (time.perf_counter() - start) / len(probe)
+    print(f"  has_dish: {per_lookup * 1e9:.0f} ns per lookup")
+
+def util_percentiles(samples):
+    # p50 and p99 of a list of latencies in seconds, returned in milliseconds
+    quantiles = statistics.quantiles(samples, n=100)
+    return quantiles[49] * 1000, quantiles[98] * 1000
+
+def benchmark_nearest_restaurants(num_restaurants=1000000, num_queries=200):
+    """_summary_
+    Measures nearest-restaurant query latency over the in-memory location arrays
+    """
+    rng = random.Random(42)
+    cuisines = ["American", "Italian", "Thai", "Mexican", "Japanese", "Indian"]
+    index = LocationIndex()
+    # Spread restaurants over a 4x4 degree box (roughly south-east Michigan)
+    index.load((str(i), rng.choice(cuisines), 41 + 4 * rng.random(), -85 + 4 * rng.random()) for i in range(num_restaurants))
+
+    for label, kwargs in (("k=10", {}), ("k=10, max_km=5", {"max_km": 5}), ("k=10, cuisine", {"cuisine": "Thai"})):
+        samples = []
+        for _ in range(num_queries):
+            lat, lon = 41 + 4 * rng.random(), -85 + 4 * rng.random()
+            start = time.perf_counter()
+            index.nearest(lat, lon, k=10, **kwargs)
+            samples.append(time.perf_counter() - start)
+        p50, p99 = util_percentiles(samples)
+        print(f"nearest ({num_restaurants} restaurants, {label}): p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+def benchmark_radius_queries(num_restaurants=1000000, num_queries=200):
+    """_summary_
+    Measures radius and viewport query latency over the in-process grid index
+    """
+    rng = random.Random(42)
+    grid = GridIndex()
+    grid.load((str(i), None, 41 + 4 * rng.random(), -85 + 4 * rng.random()) for i in range(num_restaurants))
+
+    for radius_km in (1, 5):
+        samples = []
+        for _ in range(num_queries):
+            lat, lon = 41 + 4 * rng.random(), -85 + 4 * rng.random()
+            start = time.perf_counter()
+            grid.within_radius(lat, lon, radius_km)
+            samples.append(time.perf_counter() - start)
+        p50, p99 = util_percentiles(samples)
+        print(f"within_radius ({num_restaurants} restaurants, {radius_km} km): p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+    samples = []
+    for _ in range(num_queries):
+        south, west = 41 + 3.9 * rng.random(), -85 + 3.9 * rng.random()
+        start = time.perf_counter()
+        grid.in_viewport(south, west, south + 0.1, west + 0.1)
+        samples.append(time.perf_counter() - start)
+    p50, p99 = util_percentiles(samples)
+    print(f"in_viewport ({num_restaurants} restaurants, 0.1 x 0.1 degrees): p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+def benchmark_async_db(num_restaurants=200, dishes_per_restaurant=10, num_requests=2000, concurrency=50):
+    """_summary_
+    Measures requests/sec and event-loop stalls of asyncio request handlers that call the blocking DB directly on
+    the loop, await AsyncDB one call at a time, and fan out with AsyncDB.get_restaurant_with_dishes
+    """
+    db = util_connect_db("restaurant_app.db", pool_size=concurrency // 5, pool_max_overflow=concurrency // 5)
+    db.clear_db()
+    db.create_db()
+    restaurants = [Restaurant(None, f"Restaurant {i}", f"{i} Humber St", "American", 42.3, -83.1) for i in range(num_restaurants)]
+    db.add_restaurants(restaurants)
+    db.add_dishes(Dish(None, restaurant.id, f"Dish {j}", "image.jpg", "2023-07-14", j % 6, [])
+                  for restaurant in restaurants for j in range(dishes_per_restaurant))
+    request_ids = [random.choice(restaurants).id for _ in range(num_requests)]
+    async_db = AsyncDB(db=db)
+
+    # Each request fetches a restaurant and its dishes
+    async def blocking_request(async_db, restaurant_id):
+        db.get_restaurant(restaurant_id)
+        db.get_dishes_from_restaurant(restaurant_id)
+
+    async def serial_request(async_db, restaurant_id):
+        await async_db.get_restaurant(restaurant_id)
+        await async_db.get_dishes_from_restaurant(restaurant_id)
+
+    async def fan_out_request(async_db, restaurant_id):
+        await async_db.get_restaurant_with_dishes(restaurant_id)
+
+    async def run(request):
+        semaphore = asyncio.Semaphore(concurrency)
+        done = False
+        max_stall = 0.0
+
+        # A task that wakes every millisecond, the longest it waits past that is the longest the loop was blocked
+        async def heartbeat():
+            nonlocal max_stall
+            while not done:
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                max_stall = max(max_stall, time.perf_counter() - start - 0.001)
+
+        async def limited(restaurant_id):
+            async with semaphore:
+                await request(async_db, restaurant_id)
+
+        monitor = asyncio.create_task(heartbeat())
+        start = time.perf_counter()
+        await asyncio.gather(*(limited(restaurant_id) for restaurant_id in request_ids))
+        elapsed = time.perf_counter() - start
+        done = True
+        await monitor
+        return num_requests / elapsed, max_stall * 1000
+
+    for label, request in (("blocking DB on the loop", blocking_request), ("AsyncDB, serial awaits", serial_request),
+                           ("AsyncDB, fan-out", fan_out_request)):
+        rate, stall = asyncio.run(run(request))
+        print(f"{label + ':':25} {rate:.0f} requests/s, longest event loop stall {stall:.1f} ms")
+    asyncio.run(async_db.close())
+
+def benchmark_restaurant_stats(num_dishes=100000, dishes_per_restaurant=50, num_cards=2000):
+    """_summary_
+    Compares building restaurant cards (dish count, average stars, latest date) by reducing
+    get_dishes_from_restaurant in Python against the incrementally maintained get_restaurant_stats
+    """
+    db = util_connect_db("restaurant_app.db")
+    db.clear_db()
+    db.create_db()
+    db.load_index()
+    restaurants, dishes = util_synthetic_dataset(num_dishes, dishes_per_restaurant)
+    db.add_restaurants(restaurants)
+    db.add_dishes(dishes)
+    rng = random.Random(42)
+    card_ids = [rng.choice(restaurants).id for _ in range(num_cards)]
+
+    start = time.perf_counter()
+    for restaurant_id in card_ids:
+        restaurant_dishes = db.get_dishes_from_restaurant(restaurant_id)
+        rated = [dish.stars for dish in restaurant_dishes if dish.stars is not None]
+        card = (len(restaurant_dishes), sum(rated) / len(rated) if rated else None,
+                max((dish.date for dish in restaurant_dishes if dish.date), default=None))
+    reduced = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for restaurant_id in card_ids:
+        db.get_restaurant_stats(restaurant_id)
+    incremental = time.perf_counter() - start
+
+    # The same cards as one batch call, as a listing page would ask for them
+    start = time.perf_counter()
+    db.get_restaurant_stats(card_ids)
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    drift = db.verify_restaurant_stats()
+    verify = time.perf_counter() - start
+
+    print(f"restaurant cards, {dishes_per_restaurant} dishes each:")
+    print(f"  reduce get_dishes_from_restaurant: {reduced / num_cards * 1e3:.3f} ms per card")
+    print(f"  get_restaurant_stats:              {incremental / num_cards * 1e3:.4f} ms per card")
+    print(f"  get_restaurant_stats, batch:       {batched / num_cards * 1e3:.4f} ms per card")
+    print(f"  verify_restaurant_stats:           {verify:.3f}s, {len(drift)} drifted")
+    db.close()
+
+def benchmark_top_dishes_near(num_dishes=1000000, num_queries=200, num_naive_queries=10, radius_km=5, k=10):
+    """_summary_
+    Measures top_dishes_near latency over seeded synthetic dishes, with and without a dietary filter, against
+    the naive feed: every restaurant in range through restaurants_within, then get_dishes_from_restaurant for each
+    """
+    db = util_connect_db("restaurant_app.db")
+    db.clear_db()
+    db.create_db()
+    db.load_index()
+    restaurants, dishes = util_synthetic_dataset(num_dishes)
+    db.add_restaurants(restaurants)
+    db.add_dishes(dishes)
+    rng = random.Random(42)
+    today = datetime.date(2025, 1, 1)
+    points = []
+    for _ in range(num_queries):
+        lat, lon = rng.choice(SYNTHETIC_CITIES)
+        points.append((rng.gauss(lat, 0.05), rng.gauss(lon, 0.05)))
+
+    def naive_feed(lat, lon):
+        scored = []
+        for restaurant, distance in db.restaurants_within(lat, lon, radius_km):
+            for dish in db.get_dishes_from_restaurant(restaurant.id):
+                age = max((today - datetime.date.fromisoformat(dish.date)).days, 0)
+                scored.append((0.6 * (dish.stars or 0) / 5 + 0.2 * 0.5 ** (age / 30) + 0.2 * (1 - distance / radius_km), dish.id))
+        return sorted(scored, reverse=True)[:k]
+
+    print(f"top {k} dishes within {radius_km}km, {num_dishes} dishes:")
+    for label, call, count in [
+        ("naive feed", lambda lat, lon: naive_feed(lat, lon), num_naive_queries),
+        ("top_dishes_near", lambda lat, lon: db.top_dishes_near(lat, lon, k=k, radius_km=radius_km, today=today), num_queries),
+        ("top_dishes_near, vegan", lambda lat, lon: db.top_dishes_near(lat, lon, k=k, radius_km=radius_km, dietary=["vegan"], today=today), num_queries),
+        ("top_dishes_near, recency-heavy", lambda lat, lon: db.top_dishes_near(lat, lon, k=k, radius_km=radius_km, today=today,
+                                                                              weights={"stars": 0.2, "recency": 0.7, "distance": 0.1}), num_queries),
+    ]:
+        samples = []
+        for lat, lon in points[:count]:
+            start = time.perf_counter()
+            call(lat, lon)
+            samples.append(time.perf_counter() - start)
+        p50, p99 = util_percentiles(samples)
+        print(f"  {label}: p50 {p50:.2f} ms, p99 {p99:.2f} ms ({count} queries)")
+    db.close()
+
+def benchmark_date_queries(num_dishes=1000000, num_queries=200):
+    """_summary_
+    Compares fetching the newest dishes by sorting every dish against a bounded date-range read, and times
+    the per-day, per-week and per-month rollups for one restaurant and for every restaurant
+    """
+    db = util_connect_db("restaurant_app.db")
+    db.clear_db()
+    db.create_db()
+    db.load_index()
+    restaurants, dishes = util_synthetic_dataset(num_dishes)
+    db.add_restaurants(restaurants)
+    db.add_dishes(dishes)
+    rng = random.Random(42)
+
+    def run(label, call, count):
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - start)
+        p50, p99 = util_percentiles(samples)
+        print(f"  {label}: p50 {p50:.2f} ms, p99 {p99:.2f} ms ({count} runs)")
+
+    print(f"date queries, {num_dishes} dishes:")
+    run("newest 50 via get_all_dishes(date_desc)", lambda: db.get_all_dishes("date_desc")[:50], 5)
+    run("newest 50 via get_dishes_between", lambda: db.get_dishes_between(limit=50, order="date_desc"), num_queries)
+    run("one month via get_dishes_between", lambda: db.get_dishes_between("2023-07-01", "2023-07-31"), 20)
+    run("one restaurant's year", lambda: db.get_dishes_between("2023-01-01", "2023-12-31", rng.choice(restaurants).id), num_queries)
+    for period in TIMELINE_PERIODS:
+        run(f"{period} timeline, one restaurant", lambda: db.get_dish_timeline(period, rng.choice(restaurants).id), num_queries)
+        run(f"{period} timeline, every restaurant", lambda: db.get_dish_timeline(period), 5)
+    db.close()
+
+def util_drop_index(db, cursor, index_name, table_name):
+    # Undo one of the migrations' index builds. MySQL refuses to drop the only index serving a foreign key,
+    # such an index stays and the report says so.
+    try:
+        if db.backend.name == "sqlite":
+            cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+        else:
+            cursor.execute(f"DROP INDEX {index_name} ON {table_name}")
+        return True
+    except db.backend.Error as e:
+        if getattr(e, "errno", None) == 1553:
+            return False
+        raise
+
+def benchmark_migrations(num_dishes=1000000, num_queries=200):
+    """_summary_
+    Times the index-building migrations on a populated database, the worst latency a concurrent reader sees
+    while they run, and the latency of the hot queries before and after
+    """
+    db = util_connect_db("restaurant_app.db")
+    db.clear_db()
+    db.create_db()
+    db.load_index()
+    restaurants, dishes = util_synthetic_dataset(num_dishes)
+    db.add_restaurants(restaurants)
+    db.add_dishes(dishes)
+    rng = random.Random(42)
+
+    # Roll the schema back to before the index migrations, as a database set up by an older release would be
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        for index_name, table_name, _, _ in migrations.INDEXES:
+            if not util_drop_index(db, cursor, index_name, table_name):
+                print(f"  {index_name} kept, a foreign key needs it")
+        cursor.execute("DELETE FROM schema_version WHERE version > 3")
+        cursor.close()
+
+    cuisines = sorted({restaurant.cuisine for restaurant in restaurants})
+    queries = [
+        ("one restaurant's dishes", lambda: db.custom_query("dishes", ["restaurant_id = %s"], parameters=(rng.choice(restaurants).id,))),
+        ("one restaurant's year", lambda: db.get_dishes_between("2023-01-01", "2023-12-31", rng.choice(restaurants).id)),
+        ("newest 50 dishes", lambda: db.get_dishes_between(limit=50, order="date_desc")),
+        ("first page by stars", lambda: db.get_dishes_page("stars_desc")),
+        ("restaurants of a cuisine", lambda: db.custom_query("restaurants", ["cuisine = %s"], parameters=(rng.choice(cuisines),))),
+        ("restaurants of a user", lambda: db.custom_query("restaurants", ["user_id = %s"], parameters=(str(uuid.uuid4()),))),
+    ]
+
+    def measure():
+        latencies = {}
+        for label, call in queries:
+            samples = []
+            started = time.perf_counter()
+            while len(samples) < num_queries and (len(samples) < 5 or time.perf_counter() - started < 5):
+                start = time.perf_counter()
+                call()
+                samples.append(time.perf_counter() - start)
+            latencies[label] = (statistics.median(samples) * 1000, len(samples))
+        return latencies
+
+    before = measure()
+
+    # A reader keeps fetching dishes by primary key while the indexes build, as live traffic would
+    stop = False
+    read_samples = []
+    def read_dishes():
+        while not stop:
+            start = time.perf_counter()
+            db.custom_query("dishes", ["id = %s"], parameters=(rng.choice(dishes).id,))
+            read_samples.append(time.perf_counter() - start)
+            time.sleep(0.001)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        reader = executor.submit(read_dishes)
+        applied = db.migrate()
+        stop = True
+        reader.result()
+    after = measure()
+
+    print(f"migrations, {num_dishes} dishes ({db.backend.name}):")
+    for version, description, seconds in applied:
+        print(f"  {version}: {description}: {seconds:.2f} s")
+    print(f"  concurrent reads during the migration: {len(read_samples)}, worst {max(read_samples, default=0) * 1000:.1f} ms")
+    print("  p50 latency before -> after:")
+    for label, _ in queries:
+        (before_ms, before_runs), (after_ms, after_runs) = before[label], after[label]
+        print(f"    {label}: {before_ms:.2f} ms -> {after_ms:.2f} ms ({before_runs} / {after_runs} runs)")
+    db.close()
+
+def benchmark_change_feed(num_dishes=1000000, batch_sizes=(10, 100, 1000, 10000), num_lag_samples=50, interval=0.1):
+    """_summary_
+    Compares catching a second instance up through the change feed with reloading its indexes, and measures
+    how long a write takes to reach an instance following the feed on its background thread
+    """
+    db = util_connect_db("restaurant_app.db")
+    db.clear_db()
+    db.create_db()
+    db.load_index()
+    restaurants, dishes = util_synthetic_dataset(num_dishes)
+    db.add_restaurants(restaurants)
+    db.add_dishes(dishes)
+    # A second instance on the same database, as another worker process would have
+    other = util_connect_db("restaurant_app.db")
+    rng = random.Random(42)
+
+    print(f"change feed, {num_dishes} dishes:")
+    start = time.perf_counter()
+    other.load_index()
+    print(f"  full reload: {(time.perf_counter() - start) * 1000:.0f} ms")
+    for batch_size in batch_sizes:
+        db.update_dishes({dish.id: {"stars": rng.randint(1, 5)} for dish in rng.sample(dishes, batch_size)})
+        start = time.perf_counter()
+        applied = 0
+        while True:
+            count = other.poll_changes()
+            applied += count
+            if not count:
+                break
+        elapsed = time.perf_counter() - start
+        print(f"  poll_changes after {batch_size} updates: {elapsed * 1000:.1f} ms ({elapsed / applied * 1e6:.0f} us per change)")
+
+    # Write, then wait until the following instance sees the new rating
+    other.follow_changes(interval)
+    lags = []
+    for i in range(num_lag_samples):
+        dish = rng.choice(dishes)
+        stars = 1 + i % 5
+        start = time.perf_counter()
+        db.update_dish(dish.id, stars=stars)
+        while not other.dish_filters.matches(dish.id, min_stars=stars, max_stars=stars):
+            time.sleep(0.001)
+        lags.append(time.perf_counter() - start)
+    p50, p99 = util_percentiles(lags)
+    print(f"  write-to-visible lag, polling every {interval * 1000:.0f} ms: p50 {p50:.1f} ms, p99 {p99:.1f} ms ({num_lag_samples} writes)")
+    other.close()
+    db.close()
+
+def benchmark_logins(num_users=50, num_logins=400, concurrency=32, method=None, max_workers=None):
+    """_summary_
+    Compares login throughput with the password hash checked on the request threads against the PasswordHasher
+    process pool driven from asyncio, and against requests that already hold a session token. The hash cost is
+    set with 'method' or FOODPIX_BENCH_HASH_METHOD, e.g. "pbkdf2:sha256:600000" or "scrypt:32768:8:1"
+    """
+    method = method or os.environ.get("FOODPIX_BENCH_HASH_METHOD", "pbkdf2:sha256:600000")
+    db = util_connect_db("restaurant_app.db")
+    db.clear_db()
+    db.create_db()
+    hasher = PasswordHasher(max_workers=max_workers, method=method)
+    sessions = SessionTokens()
+    users = [(f"user{i}", f"password{i}") for i in range(num_users)]
+    for username, password in users:
+        authentication.create_user(None, db, username, password, hasher=hasher)
+    logins = [random.choice(users) for _ in range(num_logins)]
+
+    # The previous behaviour: look the user up and check the hash on the request thread
+    def inline_login(login):
+        username, password = login
+        with db.connection() as conn:
+            cursor = conn.cursor(buffered=True)
+            cursor.execute('SELECT id, password FROM users WHERE username = %s', (username,))
+            user_id, password_hash = cursor.fetchone()
+            cursor.close()
+        return user_id if check_password_hash(password_hash, password) else None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        tokens = [sessions.issue(user_id) for user_id in executor.map(inline_login, logins)]
+    inline_rate = num_logins / (time.perf_counter() - start)
+
+    # The event loop stays responsive while the process pool hashes, measured as the worst tick delay
+    async def run_async():
+        semaphore = asyncio.Semaphore(concurrency)
+        lag = 0.0
+        done = False
+
+        async def ticker():
+            nonlocal lag
+            while not done:
+                tick = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lag = max(lag, time.perf_counter() - tick - 0.005)
+
+        async def login(username, password):
+            async with semaphore:
+                return await authentication.authenticate_user_async(db, username, password, hasher=hasher)
+
+        ticking = asyncio.ensure_future(ticker())
+        start = time.perf_counter()
+        await asyncio.gather(*(login(username, password) for username, password in logins))
+        elapsed = time.perf_counter() - start
+        done = True
+        await ticking
+        return num_logins / elapsed, lag
+
+    await_rate, lag = asyncio.run(run_async())
+
+    start = time.perf_counter()
+    for token in tokens:
+        authentication.authenticate_session(sessions, token)
+    token_rate = num_logins / (time.perf_counter() - start)
+
+    print(f"logins with {method}, {concurrency} concurrent, {hasher.max_workers} hash workers:")
+    print(f"  hash on request threads:   {inline_rate:.0f} logins/s")
+    print(f"  hash on process pool:      {await_rate:.0f} logins/s, worst event loop delay {lag * 1e3:.1f} ms")
+    print(f"  session token:             {token_rate:.0f} requests/s")
+    hasher.close()
+    db.close()
+
+def benchmark_dish_filters(num_dishes=1000000, num_tags=12, num_queries=200):
+    """_summary_
+    Measures combined dietary/star filter latency over the in-memory bitmaps against a scan of the same rows
+    """
+    rng = random.Random(42)
+    # Each dish carries each tag with 20% probability
+    rows = [(str(i), rng.randint(0, 5), sum(1 << tag for tag in range(num_tags) if rng.random() < 0.2))
+            for i in range(num_dishes)]
+    index = DishFilterIndex()
+    start = time.perf_counter()
+    index.load(rows)
+    print(f"Dish filter index load ({num_dishes} dishes): {time.perf_counter() - start:.2f} s")
+
+    bitmap_samples, scan_samples = [], []
+    for _ in range(num_queries):
+        required_mask = (1 << rng.randrange(num_tags)) | (1 << rng.randrange(num_tags))
+        start = time.perf_counter()
+        index.query(required_mask, min_stars=4)
+        bitmap_samples.append(time.perf_counter() - start)
+        if len(scan_samples) < 20:
+            start = time.perf_counter()
+            [dish_id for dish_id, stars, mask in rows if mask & required_mask == required_mask and stars >= 4]
+            scan_samples.append(time.perf_counter() - start)
+    p50, p99 = util_percentiles(bitmap_samples)
+    print(f"two tags AND stars >= 4, bitmaps: p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    p50, p99 = util_percentiles(scan_samples)
+    print(f"two tags AND stars >= 4, row scan: p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+    # Single-dish writes, the path of add_dish, update_dish and delete_dish
+    for label, write in (("update", lambda i: index.update(str(i), stars=rng.randint(0, 5))),
+                         ("remove + add", lambda i: (index.remove(str(i)), index.add(str(i), 5, 1)))):
+        samples = []
+        for _ in range(num_queries):
+            dish = rng.randrange(num_dishes)
+            start = time.perf_counter()
+            write(dish)
+            samples.append(time.perf_counter() - start)
+        p50, p99 = util_percentiles(samples)
+        print(f"single dish {label}: p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+
+def benchmark_search(num_dishes=1000000, num_queries=200):
+    """_summary_
+    Measures BM25 search latency over the in-process inverted index
+    """
+    rng = random.Random(42)
+    # Dish names drawn from a small vocabulary, so common terms have hundreds of thousands of postings
+    adjectives = ["spicy", "grilled", "crispy", "smoked", "vegan", "classic", "roasted", "sweet", "garlic", "lemon"]
+    proteins = ["chicken", "beef", "tofu", "salmon", "shrimp", "pork", "lamb", "mushroom", "paneer", "turkey"]
+    dishes = ["wrap", "burger", "curry", "salad", "tacos", "ramen", "pizza", "sandwich", "bowl", "noodles",
+              "soup", "skewers", "pasta", "burrito", "risotto"]
+    names = [f"{rng.choice(adjectives)} {rng.choice(proteins)} {rng.choice(dishes)} {i}" for i in range(num_dishes)]
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.load((('dishes', str(i)), name) for i, name in enumerate(names))
+    print(f"Search index load ({num_dishes} dishes): {time.perf_counter() - start:.2f} s")
+
+    for label, make_query in (("rare term", lambda: str(rng.randrange(num_dishes))),
+                              ("one common term", lambda: rng.choice(proteins)),
+                              ("three common terms", lambda: f"{rng.choice(adjectives)} {rng.choice(proteins)} {rng.choice(dishes)}")):
+        samples = []
+        for _ in range(num_queries):
+            query = make_query()
+            start = time.perf_counter()
+            index.search(query, limit=20)
+            samples.append(time.perf_counter() - start)
+        p50, p99 = util_percentiles(samples)
+        print(f"search ({label}, limit 20): p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+class LegacyDish:
+    # The dict-backed Dish the models used to be, kept here as the baseline for benchmark_models
+    def __init__(self, id=None, restaurant_id=None, dish_name=None, image_url=None, date=None, stars=None,
+                 dietary_restrictions=None):
+        self.id = id if id is not None else str(uuid.uuid4())
+        self.restaurant_id = restaurant_id
+        self.dish_name = dish_name
+        self.image_url = image_url
+        self.date = date
+        self.stars = int(stars) if stars is not None else None
+        self.dietary_restrictions = utility.listify(dietary_restrictions)
+
+def benchmark_models(num_dishes=300000):
+    """_summary_
+    Compares bytes per object and objects/sec of Dish.from_row over positional rows against the dict-backed class
+    built from dictionary rows
+    """
+    rng = random.Random(42)
+    restaurant_ids = [str(uuid.uuid4()) for _ in range(1000)]
+    rows = [(str(uuid.uuid4()), rng.choice(restaurant_ids), f"Dish {i}", f"https://example.com/{i}.jpg",
+             datetime.date(2023, 1, 1) + datetime.timedelta(days=i % 365), rng.randint(0, 5),
+             json.dumps(rng.sample(["vegan", "vegetarian", "gluten free", "halal"], rng.randint(0, 2))))
+            for i in range(num_dishes)]
+
+    def build_legacy():
+        # What the dictionary cursor and Dish(**row) did for every row
+        return [LegacyDish(**dict(zip(Dish.COLUMNS, row))) for row in rows]
+
+    for label, build in (("dict-backed Dish(**row)", build_legacy),
+                         ("Dish.from_row", lambda: [Dish.from_row(row) for row in rows]),
+                         ("Dish.from_row, lazy dietary", lambda: [Dish.from_row(row, True) for row in rows])):
+        start = time.perf_counter()
+        build()
+        rate = num_dishes / (time.perf_counter() - start)
+        tracemalloc.start()
+        objects = build()
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del objects
+        print(f"{label}: {rate:,.0f} objects/s, {memory / num_dishes:.0f} bytes per object (excluding row values)")
+
+def benchmark_serialization(num_dishes=200000):
+    """_summary_
+    Compares the old pretty-printed obj_to_json against compact obj_to_json and the streaming iter_json:
+    output size, throughput and peak memory
+    """
+    rng = random.Random(42)
+    dishes = [Dish(None, str(uuid.uuid4()), f"Dish {i}", f"https://example.com/{i}.jpg",
+                   datetime.date(2023, 1, 1) + datetime.timedelta(days=i % 365), rng.randint(0, 5),
+                   rng.sample(["vegan", "vegetarian", "gluten free", "halal"], rng.randint(0, 2)))
+              for i in range(num_dishes)]
+
+    def pretty():
+        # What obj_to_json used to do
+        return json.dumps([dish.to_dict() for dish in dishes], indent=4, default=str)
+
+    def stream():
+        # Measure the streamed output without keeping it
+        return sum(len(chunk) for chunk in utility.iter_json(iter(dishes)))
+
+    for label, serialize in (("json.dumps(indent=4)", pretty),
+                             ("obj_to_json (compact)", lambda: utility.obj_to_json(dishes)),
+                             ("iter_json", stream),
+                             ("iter_json, NDJSON", lambda: sum(len(chunk) for chunk in utility.iter_json(iter(dishes), ndjson=True)))):
+        start = time.perf_counter()
+        output = serialize()
+        elapsed = time.perf_counter() - start
+        # Peak memory is measured on a second run, tracemalloc would skew the timing
+        tracemalloc.start()
+        serialize()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        size = output if isinstance(output, int) else len(output)
+        print(f"{label}: {size / 2**20:.1f} MiB of JSON, {num_dishes / elapsed:,.0f} dishes/s, "
+              f"peak {peak / 2**20:.1f} MiB")
+
+def benchmark_backends(num_restaurants=1000, dishes_per_restaurant=50, num_queries=5000):
+    """_summary_
+    Compares the embedded SQLite backend against MySQL over loopback on bulk inserts, point reads and listings
+    """
+    for backend in ("sqlite", "mysql"):
+        try:
+            db = util_connect_db("restaurant_app.db", backend)
+        except Exception as e:
+            print(f"{backend}: skipped, cannot connect ({e})")
+            continue
+        db.clear_db()
+        db.create_db()
+        db.load_index()
+        restaurants = [Restaurant(None, f"Restaurant {i}", f"{i} Humber St", "American", 42.3, -83.1) for i in range(num_restaurants)]
+        dishes = [Dish(None, restaurant.id, f"Dish {j}", "image.jpg", "2023-07-14", j % 6, ["vegan"] if j % 3 else [])
+                  for restaurant in restaurants for j in range(dishes_per_restaurant)]
+
+        start = time.perf_counter()
+        db.add_restaurants(restaurants)
+        db.add_dishes(dishes)
+        insert_rate = len(dishes) / (time.perf_counter() - start)
+
+        dish_samples, listing_samples = [], []
+        for _ in range(num_queries):
+            start = time.perf_counter()
+            db.get_dish(random.choice(dishes).id)
+            dish_samples.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            db.get_dishes_from_restaurant(random.choice(restaurants).id)
+            listing_samples.append(time.perf_counter() - start)
+
+        print(f"{backend}: add_dishes {insert_rate:,.0f} dishes/s")
+        print(f"  get_dish: p50 {util_percentiles(dish_samples)[0]:.3f} ms, p99 {util_percentiles(dish_samples)[1]:.3f} ms")
+        print(f"  get_dishes_from_restaurant ({dishes_per_restaurant} dishes): "
+              f"p50 {util_percentiles(listing_samples)[0]:.3f} ms, p99 {util_percentiles(listing_samples)[1]:.3f} ms")
+        db.close()
+
+def benchmark_instrumentation(num_dishes=10000, num_calls=20000):
+    """_summary_
+    Measures the per-call cost of the instrumentation hooks, detached and attached, on get_dish
+    """
+    db = util_connect_db("restaurant_app.db")
+    db.clear_db()
+    db.create_db()
+    db.load_index()
+    restaurants, dishes = util_synthetic_dataset(num_dishes)
+    db.add_restaurants(restaurants)
+    db.add_dishes(dishes)
+    dish_ids = [random.choice(dishes).id for _ in range(num_calls)]
+    undecorated_get_dish = DB.get_dish.__wrapped__
+
+    def run(label, get_dish):
+        start = time.perf_counter()
+        for dish_id in dish_ids:
+            get_dish(dish_id)
+        elapsed = time.perf_counter() - start
+        print(f"get_dish, {label}: {elapsed / num_calls * 1e6:.2f} us per call")
+        return elapsed
+
+    baseline = run("without hooks", lambda dish_id: undecorated_get_dish(db, dish_id))
+    detached = run("instrumentation detached", db.get_dish)
+    db.instrumentation = Instrumentation(listeners=[lambda event: None], slow_query_threshold=0.1)
+    attached = run("instrumentation attached", db.get_dish)
+    print(f"  overhead detached: {(detached - baseline) / num_calls * 1e9:.0f} ns per call, "
+          f"attached: {(attached - baseline) / num_calls * 1e6:.2f} us per call")
+    db.close()
+
+def benchmark_bulk_updates(num_dishes=100000, num_updates=10000):
+    """_summary_
+    Compares re-rating and renaming dishes one update_dish call at a time with a single update_dishes call
+    """
+    db = util_connect_db("restaurant_app.db")
+    db.clear_db()
+    db.create_db()
+    db.load_index()
+    restaurants, dishes = util_synthetic_dataset(num_dishes)
+    db.add_restaurants(restaurants)
+    db.add_dishes(dishes)
+    rng = random.Random(42)
+    # Two column sets, so update_dishes runs two statements per chunk
+    updates = {dish.id: ({"stars": rng.randint(1, 5)} if i % 2 else {"stars": rng.randint(1, 5), "dish_name": f"{dish.dish_name} II"})
+               for i, dish in enumerate(rng.sample(dishes, num_updates))}
+
+    start = time.perf_counter()
+    for dish_id, fields in updates.items():
+        db.update_dish(dish_id, **fields)
+    one_by_one = time.perf_counter() - start
+    result = db.update_dishes(updates)
+    print(f"update_dish x {num_updates}: {one_by_one:.3f}s ({num_updates / one_by_one:.0f} rows/s)")
+    print(f"{result} ({one_by_one / result.elapsed:.1f}x)")
+    db.close()
+
+def util_server_cpu_seconds():
+    # CPU time used so far by a MySQL server running on this machine, read from /proc, or None if there is none
+    for pid in filter(str.isdigit, os.listdir("/proc") if os.path.isdir("/proc") else []):
+        try:
+            with open(f"/proc/{pid}/comm") as f:
+                if f.read().strip() not in ("mysqld", "mariadbd"):
+                    continue
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError):
+            continue
+    return None
+
+def benchmark_statement_cache(num_dishes=10000, num_calls=5000):
+    """_summary_
+    Compares latency and server CPU of the hot statements with the prepared-statement cache disabled and enabled
+    """
+    restaurants, dishes = util_synthetic_dataset(num_dishes)
+    rng = random.Random(42)
+    dish_ids = [rng.choice(dishes).id for _ in range(num_calls)]
+    restaurant_ids = [rng.choice(restaurants).id for _ in range(num_calls)]
+    workloads = [
+        ("get_dish", lambda db, i: db.get_dish(dish_ids[i])),
+        ("get_restaurant", lambda db, i: db.get_restaurant(restaurant_ids[i])),
+        ("get_dishes_from_restaurant", lambda db, i: db.get_dishes_from_restaurant(restaurant_ids[i])),
+        ("update_dish", lambda db, i: db.update_dish(dish_ids[i], stars=i % 5 + 1)),
+        ("custom_query", lambda db, i: db.custom_query('dishes', ["restaurant_id = %s", "stars >= %s"], parameters=(restaurant_ids[i], 4))),
+    ]
+    for statement_cache_size in (0, 32):
+        db = util_connect_db("restaurant_app.db", statement_cache_size=statement_cache_size)
+        if statement_cache_size == 0:
+            db.clear_db()
+            db.create_db()
+            db.load_index()
+            db.add_restaurants(restaurants)
+            db.add_dishes(dishes)
+        print(f"statement_cache_size={statement_cache_size} ({db.backend.name}):")
+        for name, call in workloads:
+            cpu_before = util_server_cpu_seconds()
+            samples = []
+            for i in range(num_calls):
+                start = time.perf_counter()
+                call(db, i)
+                samples.append(time.perf_counter() - start)
+            cpu_after = util_server_cpu_seconds()
+            p50, p99 = util_percentiles(samples)
+            server_cpu = (f", server CPU {(cpu_after - cpu_before) / num_calls * 1e6:.1f} us per call"
+                          if cpu_before is not None and cpu_after is not None else "")
+            print(f"  {name}: p50 {p50:.3f} ms, p99 {p99:.3f} ms{server_cpu}")
+        db.close()
+
+# Metro areas the synthetic restaurants are scattered around, as (latitude, longitude)
+SYNTHETIC_CITIES = [(42.33, -83.05), (41.50, -81.69), (40.71, -74.01), (41.88, -87.63),
+                    (34.05, -118.24), (37.77, -122.42), (47.61, -122.33), (29.76, -95.37)]
+SYNTHETIC_CUISINES = ["American", "Italian", "Mexican", "Chinese", "Japanese", "Thai", "Indian", "Mediterranean",
+                      "French", "Korean", "Vietnamese", "Greek"]
+SYNTHETIC_CUISINE_WEIGHTS = [20, 15, 14, 10, 8, 7, 7, 5, 4, 4, 3, 3]
+SYNTHETIC_DISH_WORDS = (["Spicy", "Grilled", "Crispy", "Roasted", "Smoked", "Fresh", "Classic", "House", "Garlic", "Honey"],
+                        ["Chicken", "Beef", "Tofu", "Shrimp", "Salmon", "Pork", "Mushroom", "Avocado", "Paneer", "Turkey"],
+                        ["Wrap", "Bowl", "Sandwich", "Burger", "Curry", "Tacos", "Salad", "Noodles", "Pizza", "Ramen"])
+# Probability of each dietary tag on a dish, drawn independently
+SYNTHETIC_DIETARY_TAGS = {"vegetarian": 0.3, "vegan": 0.12, "gluten free": 0.15, "dairy free": 0.12, "nut free": 0.1,
+                          "halal": 0.05, "kosher": 0.03, "keto": 0.05, "low carb": 0.06, "pescatarian": 0.05}
+
+def util_synthetic_dataset(num_dishes, dishes_per_restaurant=20, seed=42):
+    # Reproducible restaurants and dishes: the same arguments always produce the same rows, IDs included
+    rng = random.Random(seed)
+    first_day = datetime.date(2019, 1, 1).toordinal()
+    num_restaurants = max(1, num_dishes // dishes_per_restaurant)
+    restaurants = []
+    for i in range(num_restaurants):
+        lat, lon = rng.choice(SYNTHETIC_CITIES)
+        restaurants.append(Restaurant(str(uuid.UUID(int=rng.getrandbits(128), version=4)), f"Restaurant {i}",
+                                      f"{rng.randint(1, 9999)} Main St", rng.choices(SYNTHETIC_CUISINES, SYNTHETIC_CUISINE_WEIGHTS)[0],
+                                      round(rng.gauss(lat, 0.1), 6), round(rng.gauss(lon, 0.1), 6)))
+    dishes = []
+    for i in range(num_dishes):
+        dishes.append(Dish(str(uuid.UUID(int=rng.getrandbits(128), version=4)), restaurants[i % num_restaurants].id,
+                           " ".join(rng.choice(words) for words in SYNTHETIC_DISH_WORDS), f"images/{i}.jpg",
+                           datetime.date.fromordinal(first_day + rng.randrange(6 * 365)).isoformat(),
+                           rng.choices([None, 1, 2, 3, 4, 5], [2, 5, 10, 25, 33, 25])[0],
+                           [tag for tag, probability in SYNTHETIC_DIETARY_TAGS.items() if rng.random() < probability]))
+    return restaurants, dishes
+
+def util_time_calls(function, arguments, max_seconds=2.0):
+    # Call function(*args) for each tuple in 'arguments' until they run out or 'max_seconds' have passed
+    samples = []
+    started = time.perf_counter()
+    for args in arguments:
+        start = time.perf_counter()
+        function(*args)
+        samples.append(time.perf_counter() - start)
+        if start - started > max_seconds:
+            break
+    return util_latency_stats(samples)
+
+def util_latency_stats(samples):
+    # Run count and latency summary in milliseconds, the shape every entry of the suite's JSON output has
+    ordered = sorted(samples)
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+    return {"runs": len(samples), "mean_ms": statistics.fmean(samples) * 1000, "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95), "max_ms": ordered[-1] * 1000}
+
+def benchmark_suite(sizes=(1000, 10000, 100000, 1000000), dishes_per_restaurant=20, seed=42, max_runs=200,
+                    max_seconds=2.0, backend=None, output_path=None):
+    """_summary_
+    Times every public DB read and write method over seeded synthetic datasets of each size (in dishes), and
+    returns the results as a dict, also written as JSON to 'output_path' for util_compare_results
+    """
+    results = {
+        "meta": {
+            "commit": util_git_commit(),
+            "backend": backend or os.environ.get("FOODPIX_DB_BACKEND", "mysql"),
+            "seed": seed,
+            "dishes_per_restaurant": dishes_per_restaurant,
+            "python": sys.version.split()[0],
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": {},
+    }
+    for size in sizes:
+        db = util_connect_db("restaurant_app.db", backend)
+        db.clear_db()
+        db.create_db()
+        db.load_index()
+        restaurants, dishes = util_synthetic_dataset(size, dishes_per_restaurant, seed)
+        timings = results["results"][str(size)] = {}
+
+        # Seed the database through the bulk inserts, timing them as one run each
+        timings["add_restaurants"] = util_time_calls(db.add_restaurants, [(restaurants,)])
+        timings["add_dishes"] = util_time_calls(db.add_dishes, [(dishes,)])
+
+        rng = random.Random(seed)
+        def sample(items, n=max_runs):
+            return [rng.choice(items) for _ in range(n)]
+        def time_calls(function, arguments):
+            return util_time_calls(function, arguments, max_seconds)
+        lat, lon = SYNTHETIC_CITIES[0]
+
+        timings["get_dish"] = time_calls(db.get_dish, [(dish.id,) for dish in sample(dishes)])
+        timings["get_restaurant"] = time_calls(db.get_restaurant, [(restaurant.id,) for restaurant in sample(restaurants)])
+        timings["get_dishes_from_restaurant"] = time_calls(db.get_dishes_from_restaurant,
+                                                           [(restaurant.id,) for restaurant in sample(restaurants)])
+        timings["get_all_restaurants"] = time_calls(db.get_all_restaurants, [()] * max_runs)
+        timings["get_all_dishes"] = time_calls(db.get_all_dishes, [("date_desc",)] * max_runs)
+        timings["get_dishes_page"] = time_calls(db.get_dishes_page, [("stars_desc", 50)] * max_runs)
+        timings["custom_query"] = time_calls(db.custom_query, [("dishes", ["restaurant_id = %s", "stars >= %s"], None, (restaurant.id, 4))
+                                                               for restaurant in sample(restaurants)])
+        timings["get_dishes_between"] = time_calls(db.get_dishes_between, [("2023-07-01", "2023-07-31", None, 50, "date_desc")] * max_runs)
+        timings["get_dish_timeline"] = time_calls(db.get_dish_timeline, [("week", restaurant.id) for restaurant in sample(restaurants)])
+        timings["find_dishes"] = time_calls(db.find_dishes, [(sample(list(SYNTHETIC_DIETARY_TAGS), 2), 4)
+                                                             for _ in range(max_runs)])
+        timings["search"] = time_calls(db.search, [(" ".join(rng.choice(words) for words in SYNTHETIC_DISH_WORDS[1:]),)
+                                                   for _ in range(max_runs)])
+        timings["get_restaurant_stats"] = time_calls(db.get_restaurant_stats, [([restaurant.id for restaurant in sample(restaurants, 20)],)
+                                                                               for _ in range(max_runs)])
+        timings["nearest_restaurants"] = time_calls(db.nearest_restaurants, [(rng.gauss(lat, 0.1), rng.gauss(lon, 0.1))
+                                                                             for _ in range(max_runs)])
+        timings["top_dishes_near"] = time_calls(db.top_dishes_near, [(rng.gauss(lat, 0.05), rng.gauss(lon, 0.05), 10, 5)
+                                                                     for _ in range(max_runs)])
+        timings["restaurants_within"] = time_calls(db.restaurants_within, [(rng.gauss(lat, 0.1), rng.gauss(lon, 0.1), 2)
+                                                                           for _ in range(max_runs)])
+
+        # A second instance, caught up through the change feed on the writes below once they are done
+        follower = util_connect_db("restaurant_app.db", backend)
+
+        # Writes use rows of their own, so every size times the same amount of work
+        new_restaurants, new_dishes = util_synthetic_dataset(max_runs * dishes_per_restaurant, dishes_per_restaurant, seed + 1)
+        timings["add_restaurant"] = time_calls(db.add_restaurant, [(restaurant,) for restaurant in new_restaurants])
+        added_restaurants = [restaurant for restaurant in new_restaurants if db.util_restaurant_in_db(restaurant.id)]
+        new_dishes = [dish for dish in new_dishes if db.util_restaurant_in_db(dish.restaurant_id)]
+        timings["add_dish"] = time_calls(db.add_dish, [(dish,) for dish in new_dishes[:max_runs]])
+        added_dishes = [dish for dish in new_dishes if db.util_dish_in_db(dish.id)]
+        bulk_dishes = [dish for dish in new_dishes if not db.util_dish_in_db(dish.id)]
+        db.add_dishes(bulk_dishes)
+        timings["update_dish"] = time_calls(lambda dish_id, stars: db.update_dish(dish_id, stars=stars),
+                                            [(dish.id, rng.randint(1, 5)) for dish in sample(dishes)])
+        timings["update_restaurant"] = time_calls(lambda restaurant_id, cuisine: db.update_restaurant(restaurant_id, cuisine=cuisine),
+                                                  [(restaurant.id, rng.choice(SYNTHETIC_CUISINES)) for restaurant in sample(restaurants)])
+        timings["update_dishes"] = time_calls(db.update_dishes, [({dish.id: {"stars": rng.randint(1, 5)} for dish in sample(dishes, 100)},)
+                                                                 for _ in range(max_runs)])
+        timings["update_restaurants"] = time_calls(db.update_restaurants, [({restaurant.id: {"cuisine": rng.choice(SYNTHETIC_CUISINES)}
+                                                                             for restaurant in sample(restaurants, 100)},)
+                                                                           for _ in range(max_runs)])
+        timings["delete_dish"] = time_calls(db.delete_dish, [(dish.id,) for dish in added_dishes])
+        timings["delete_dishes"] = time_calls(db.delete_dishes, [([dish.id for dish in bulk_dishes[i:i + 100]],)
+                                                                 for i in range(0, len(bulk_dishes), 100)])
+        timings["delete_restaurant"] = time_calls(db.delete_restaurant, [(restaurant.id,) for restaurant in added_restaurants])
+        timings["poll_changes"] = time_calls(follower.poll_changes, [(100,)] * max_runs)
+        follower.close()
+        db.close()
+
+        print(f"{size} dishes:")
+        for method, stats in timings.items():
+            print(f"  {method}: p50 {stats['p50_ms']:.3f} ms, p95 {stats['p95_ms']:.3f} ms ({stats['runs']} runs)")
+
+    if output_path:
+        with open(output_path, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+def util_git_commit():
+    # The commit the suite ran on, recorded with its results so two runs can be told apart
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def util_compare_results(baseline, current, tolerance=0.2, min_delta_ms=0.05):
+    """_summary_
+    Compares two benchmark_suite results (dicts or JSON file paths) by p50 latency, printing every method that got
+    more than 'tolerance' slower or faster by at least 'min_delta_ms' (smaller changes are timer noise), and returns
+    the regressions as (size, method, baseline ms, current ms)
+    """
+    def load(results):
+        if isinstance(results, str):
+            with open(results) as f:
+                return json.load(f)
+        return results
+    baseline, current = load(baseline), load(current)
+    print(f"{baseline['meta']['commit']} -> {current['meta']['commit']} ({current['meta']['backend']})")
+    regressions = []
+    for size, timings in current["results"].items():
+        for method, stats in timings.items():
+            before = baseline["results"].get(size, {}).get(method)
+            if before is None or not before["p50_ms"]:
+                continue
+            ratio = stats["p50_ms"] / before["p50_ms"]
+            if abs(stats["p50_ms"] - before["p50_ms"]) < min_delta_ms:
+                continue
+            if ratio > 1 + tolerance:
+                regressions.append((size, method, before["p50_ms"], stats["p50_ms"]))
+                print(f"  REGRESSION {size} {method}: {before['p50_ms']:.3f} -> {stats['p50_ms']:.3f} ms ({ratio:.2f}x)")
+            elif ratio < 1 - tolerance:
+                print(f"  improved   {size} {method}: {before['p50_ms']:.3f} -> {stats['p50_ms']:.3f} ms ({ratio:.2f}x)")
+    return regressions
+
+def main():
+   benchmark_index_load()
+   benchmark_nearest_restaurants(100000)
+   benchmark_nearest_restaurants(1000000)
+   benchmark_radius_queries()
+   benchmark_dish_filters()
+   benchmark_search()
+   benchmark_models()
+   benchmark_serialization()
+   benchmark_backends()
+   benchmark_instrumentation()
+   benchmark_statement_cache()
+   benchmark_bulk_updates()
+   benchmark_restaurant_stats()
+   benchmark_top_dishes_near()
+   benchmark_date_queries()
+   benchmark_migrations()
+   benchmark_change_feed()
+   benchmark_logins()
+   results = benchmark_suite(output_path=os.environ.get("FOODPIX_BENCH_OUTPUT", "bench_results.json"))
+   if os.environ.get("FOODPIX_BENCH_BASELINE"):
+       util_compare_results(os.environ["FOODPIX_BENCH_BASELINE"], results)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,24 @@
 from models.restaurant import Restaurant
 from models.dish import Dish
 from database import DB
-import json, utils.utility as utility, unittest, sqlite3
+from async_database import AsyncDB
+from utils.instrumentation import Instrumentation
+from utils.password_hasher import PasswordHasher
+from utils.session_tokens import SessionTokens
+from utils.change_feed import ChangeFeedPosition
+import authentication
+import json, utils.utility as utility, unittest, sqlite3, os, datetime, asyncio
+
+def util_connect_db(db_name, backend=None, **kwargs):
+    # FOODPIX_DB_BACKEND=sqlite runs the tests on an embedded database file instead of a MySQL server, 'backend'
+    # overrides it and the keyword arguments go to DB(). The benchmarks connect through this too.
+    if (backend or os.environ.get("FOODPIX_DB_BACKEND", "mysql")) == "sqlite":
+        return DB(None, os.environ.get("FOODPIX_DB_NAME", db_name), backend="sqlite", **kwargs)
+    return DB(os.environ.get("FOODPIX_DB_HOST", "127.0.0.1"), os.environ.get("FOODPIX_DB_NAME", "foodpix_db"),
+              os.environ.get("FOODPIX_DB_USER", "test_user"), os.environ.get("FOODPIX_DB_PASSWORD", "test_password"), **kwargs)
             
 def util_create_clear(db_name):
-    db = DB(db_name)
+    db = util_connect_db(db_name)
     db.clear_db()
     db.create_db()
     return db
@@ -163,6 +177,44 @@ def test_update_dish():
     print("UPDATED DISH")
     print(db.get_dish(dish_id=dish.id))
 
+def test_update_dish_move():
+    db = util_create_clear("restaurant_app.db")
+    restaurants, dishes = util_restaurants_and_dishes(db)
+
+    # Moving a dish rewrites the dish_ids column of both restaurants, as update_dishes does
+    db.update_dish(dishes[0].id, restaurant_id=restaurants[1].id)
+    with db.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, dish_ids FROM restaurants")
+        dish_ids = {restaurant_id: set(filter(None, column.split(", "))) for restaurant_id, column in cursor.fetchall()}
+        cursor.close()
+    print(dish_ids)
+    assert dish_ids[restaurants[0].id] == db.index.dishes_of(restaurants[0].id)
+    assert dish_ids[restaurants[1].id] == db.index.dishes_of(restaurants[1].id)
+    assert dishes[0].id in dish_ids[restaurants[1].id]
+
+def test_update_dish_string_stars():
+    db = util_create_clear("restaurant_app.db")
+    restaurants, dishes = util_restaurants_and_dishes(db)
+
+    # Star ratings given as strings are stored and indexed as ints, so the star filters keep working
+    db.update_dish(dishes[0].id, stars="2")
+    print(db.update_dishes({dishes[1].id: {"stars": "1"}, dishes[2].id: {"stars": "many"}}))
+    print(db.get_dish(dishes[0].id).stars, len(db.find_dishes(min_stars=2)), len(db.find_dishes(max_stars=1)))
+
+def test_update_dish_clear_stars():
+    db = util_create_clear("restaurant_app.db")
+    restaurants, dishes = util_restaurants_and_dishes(db)
+
+    # Clearing a 5 star rating takes the dish out of the star filters too
+    db.update_dish(dishes[1].id, stars=None)
+    print(db.get_dish(dishes[1].id).stars, [dish.dish_name for dish in db.find_dishes(min_stars=4)])
+    assert dishes[1].id not in {dish.id for dish in db.find_dishes(min_stars=4)}
+
+    # Updating another field leaves the rating as it is
+    db.update_dish(dishes[5].id, dish_name="Fettuccine")
+    assert dishes[5].id in {dish.id for dish in db.find_dishes(min_stars=5)}
+
 def test_update_restaurant():
     # Create a new connection to the database, clear everything that is in it and start fresh
     db = util_create_clear("restaurant_app.db")
@@ -247,6 +299,331 @@ def test_get_dishes_with_dietary_restrictions():
     for dish in result:
         print(dish.dish_name, dish.dietary_restrictions, dish.stars)
     
+def test_bulk_adding():
+    # Create a new connection to the database, clear everything that is in it and start fresh
+    db = util_create_clear("restaurant_app.db")
+
+    # Add 100 restaurants with 10 dishes each through the bulk entry points
+    restaurants = [Restaurant(None, f"Restaurant {i}", f"{i} Humber St", "American", "42.3", "-83.1", "") for i in range(100)]
+    print(db.add_restaurants(restaurants, chunk_size=25))
+
+    dishes = [Dish(None, restaurants[i % 100].id, f"Dish {i}", "image_test.jpg", "14-07-2023", i % 6, ["vegetarian"]) for i in range(1000)]
+    result = db.add_dishes(dishes + [dishes[0]], chunk_size=250)
+    print(result)
+    print(result.failed)
+
+    print(utility.obj_to_json(db.get_dishes_from_restaurant(restaurants[0].id)))
+
+def test_bulk_deleting():
+    db = util_create_clear("restaurant_app.db")
+
+    # Instantiate restaurants with sample values
+    restaurants, dishes = util_restaurants_and_dishes(db)
+
+    # Delete three dishes from "Spencer's Sandwiches" in one call, plus an ID that doesn't exist
+    print(db.delete_dishes([dishes[0].id, dishes[2].id, dishes[4].id, "not-a-dish"]))
+    print(utility.obj_to_json(db.get_dishes_from_restaurant(restaurants[0].id)))
+
+    # Cascade-delete "Marni's Meatballs" and all of its dishes
+    db.delete_restaurant(restaurants[1].id)
+    print(utility.obj_to_json(db.get_all_restaurants()))
+
+def test_bulk_updating():
+    db = util_create_clear("restaurant_app.db")
+
+    # Instantiate restaurants with sample values
+    restaurants, dishes = util_restaurants_and_dishes(db)
+
+    # Re-rate every dish, move one to the other restaurant, and include an unknown ID and an unknown field
+    updates = {dish.id: {"stars": 1} for dish in dishes}
+    updates[dishes[0].id] = {"stars": 2, "restaurant_id": restaurants[1].id, "dietary_restrictions": ["vegan"]}
+    updates[dishes[1].id] = {"calories": 500}
+    updates["not-a-dish"] = {"stars": 3}
+    result = db.update_dishes(updates, chunk_size=4)
+    print(result)
+    print(result.failed)
+    print(utility.obj_to_json(db.get_dishes_from_restaurant(restaurants[1].id)))
+
+    # Clearing a rating in bulk takes the dish out of the star filters too, the dietary-only update keeps its stars
+    print(db.update_dishes({dishes[1].id: {"stars": None}, dishes[5].id: {"dietary_restrictions": ["vegan"]}}))
+    assert db.get_dish(dishes[1].id).stars is None
+    assert dishes[1].id not in {dish.id for dish in db.find_dishes(min_stars=4)}
+    assert dishes[5].id in {dish.id for dish in db.find_dishes(["vegan"], min_stars=1, max_stars=1)}
+
+    print(db.update_restaurants({restaurant.id: {"cuisine": "Diner", "latitude": 42.0} for restaurant in restaurants}))
+    print(utility.obj_to_json(db.get_all_restaurants()))
+
+def test_restaurants_near():
+    db = util_create_clear("restaurant_app.db")
+
+    # Three restaurants in Detroit and one in Cleveland
+    restaurants = [
+        Restaurant(None, "Spencer's Sandwiches", "26694 Humber St, Huntington Woods, MI", "American", 42.4807, -83.1669),
+        Restaurant(None, "Marni's Meatballs", "123 Huntington St, Cleveland, Ohio", "Italian", 41.4993, -81.6944),
+        Restaurant(None, "Corktown Pizza", "1500 Michigan Ave, Detroit, MI", "Italian", 42.3314, -83.0680),
+        Restaurant(None, "Midtown Thai", "4100 Woodward Ave, Detroit, MI", "Thai", 42.3510, -83.0610),
+    ]
+    db.add_restaurants(restaurants)
+
+    print("CLOSEST ITALIAN RESTAURANTS TO DOWNTOWN DETROIT")
+    for restaurant, distance in db.nearest_restaurants(42.3314, -83.0458, k=2, cuisine="Italian"):
+        print(restaurant.name, round(distance, 2))
+
+    print("RESTAURANTS WITHIN 5KM OF DOWNTOWN DETROIT")
+    for restaurant, distance in db.restaurants_within(42.3314, -83.0458, 5):
+        print(restaurant.name, round(distance, 2))
+
+    print("RESTAURANTS IN A VIEWPORT AROUND DETROIT")
+    print(utility.obj_to_json(db.restaurants_in_viewport(42.2, -83.3, 42.6, -82.9)))
+
+def test_top_dishes_near():
+    db = util_create_clear("restaurant_app.db")
+
+    # Two restaurants in Detroit and one in Cleveland, with dishes of different ratings and ages
+    restaurants = [
+        Restaurant(None, "Corktown Pizza", "1500 Michigan Ave, Detroit, MI", "Italian", 42.3314, -83.0680),
+        Restaurant(None, "Midtown Thai", "4100 Woodward Ave, Detroit, MI", "Thai", 42.3510, -83.0610),
+        Restaurant(None, "Marni's Meatballs", "123 Huntington St, Cleveland, Ohio", "Italian", 41.4993, -81.6944),
+    ]
+    db.add_restaurants(restaurants)
+    db.add_dishes([
+        Dish(None, restaurants[0].id, "Margherita Pizza", "image_test.jpg", "2023-07-14", 5, ["vegetarian"]),
+        Dish(None, restaurants[0].id, "Pepperoni Pizza", "image_test1.jpg", "2023-01-02", 4, []),
+        Dish(None, restaurants[1].id, "Pad Thai", "image_test2.jpg", "2023-07-10", 4, ["vegetarian", "vegan"]),
+        Dish(None, restaurants[1].id, "Green Curry", "image_test3.jpg", "2022-05-01", 5, ["gluten free"]),
+        Dish(None, restaurants[2].id, "Spaghetti and Meatballs", "image_test4.jpg", "2023-07-15", 5, []),
+    ])
+
+    print("BEST DISHES WITHIN 5KM OF DOWNTOWN DETROIT")
+    for dish, score, distance in db.top_dishes_near(42.3314, -83.0458, k=3, radius_km=5, today=datetime.date(2023, 7, 15)):
+        print(dish.dish_name, dish.stars, round(score, 3), round(distance, 2))
+
+    print("BEST VEGAN DISHES, FAVORING RECENT ONES")
+    for dish, score, distance in db.top_dishes_near(42.3314, -83.0458, k=3, radius_km=5, dietary=["vegan"],
+                                                    weights={"stars": 0.2, "recency": 0.7, "distance": 0.1},
+                                                    today=datetime.date(2023, 7, 15)):
+        print(dish.dish_name, dish.stars, round(score, 3), round(distance, 2))
+
+def test_date_queries():
+    db = util_create_clear("restaurant_app.db")
+
+    # Dates are stored as YYYY-MM-DD, which is what the range queries and rollups compare and bucket
+    restaurants = [
+        Restaurant(None, "Spencer's Sandwiches", "26694 Humber St, Huntington Woods, MI", "American", 42.4807, -83.1669),
+        Restaurant(None, "Marni's Meatballs", "123 Huntington St, Cleveland, Ohio", "Italian", 41.4993, -81.6944),
+    ]
+    db.add_restaurants(restaurants)
+    db.add_dishes([
+        Dish(None, restaurants[0].id, "Turkey Club Sandwich", "image_test.jpg", "2023-05-30", 4, []),
+        Dish(None, restaurants[0].id, "Patty Melt", "image_test1.jpg", "2023-06-05", 3, []),
+        Dish(None, restaurants[0].id, "Reuben", "image_test2.jpg", "2023-06-20", 5, []),
+        Dish(None, restaurants[0].id, "BLT Sandwich", "image_test3.jpg", "2023-06-21", None, []),
+        Dish(None, restaurants[1].id, "Lasagna", "image_test4.jpg", "2023-07-02", 4, ["vegetarian"]),
+    ])
+
+    print("DISHES ADDED IN JUNE 2023")
+    for dish in db.get_dishes_between("2023-06-01", datetime.date(2023, 6, 30)):
+        print(dish.date, dish.dish_name)
+
+    print("NEWEST DISH AT SPENCER'S SANDWICHES")
+    print(utility.obj_to_json(db.get_dishes_between(restaurant_id=restaurants[0].id, limit=1, order="date_desc")))
+
+    print(db.get_dish_timeline("month", start="2023-01-01"))
+    print(db.get_dish_timeline("week", restaurants[0].id, start="2023-01-01"))
+
+def test_paging_dishes():
+    db = util_create_clear("restaurant_app.db")
+
+    # Instantiate restaurants with sample values
+    restaurants, dishes = util_restaurants_and_dishes(db)
+
+    # Walk the dishes from best to worst rated, 4 per page
+    dishes_page, next_cursor = db.get_dishes_page("stars_desc", limit=4)
+    page_number = 1
+    while True:
+        print(f"PAGE {page_number}")
+        print(utility.obj_to_json(dishes_page))
+        if next_cursor is None:
+            break
+        dishes_page, next_cursor = db.get_dishes_page("stars_desc", limit=4, cursor=next_cursor)
+        page_number += 1
+
+    # Stream the vegetarian dishes instead of fetching them all at once
+    for dish in db.iter_query('dishes', ["dietary_restrictions LIKE %s"], parameters=("%vegetarian%",), batch_size=2):
+        print(dish.dish_name, dish.dietary_restrictions)
+
+def test_find_dishes():
+    db = util_create_clear("restaurant_app.db")
+
+    # Instantiate restaurants with sample values
+    restaurants, dishes = util_restaurants_and_dishes(db)
+
+    # Vegetarian dishes rated 4 stars or more, answered by the in-memory bitmaps
+    for dish in db.find_dishes(["Vegetarian"], min_stars=4):
+        print(dish.dish_name, dish.dietary_restrictions, dish.stars)
+
+    # The same filter as a bit test on the 'dietary_mask' column
+    mask = db.dietary_mask(["vegetarian"])
+    for dish in db.custom_query('dishes', ["(dietary_mask & %s) = %s", "stars >= %s"], parameters=(mask, mask, 4)):
+        print(dish.dish_name, dish.dietary_restrictions, dish.stars)
+
+def test_search():
+    db = util_create_clear("restaurant_app.db")
+
+    # Instantiate restaurants with sample values
+    restaurants, dishes = util_restaurants_and_dishes(db)
+
+    # Ranked matches across dish names and restaurant names, addresses and cuisines
+    for item, score in db.search("chicken sandwich", limit=5):
+        print(type(item).__name__, round(score, 3), utility.obj_to_json(item))
+
+    # Only dishes rated 4 stars or more
+    for dish, score in db.search("chicken", filters={"min_stars": 4}):
+        print(round(score, 3), dish.dish_name, dish.stars)
+
+def test_streaming_json():
+    db = util_create_clear("restaurant_app.db")
+
+    # Instantiate restaurants with sample values
+    restaurants, dishes = util_restaurants_and_dishes(db)
+
+    # Stream every dish as one compact JSON array, then as NDJSON, 4 dishes per chunk
+    for chunk in utility.iter_json(db.iter_dishes("date_asc"), batch_size=4):
+        print(chunk)
+    for chunk in utility.iter_json(db.iter_dishes("date_asc"), ndjson=True, batch_size=4):
+        print(chunk, end="")
+
+def test_async_streaming():
+    db = util_create_clear("restaurant_app.db")
+
+    # Instantiate restaurants with sample values
+    restaurants, dishes = util_restaurants_and_dishes(db)
+
+    async def run():
+        async_db = AsyncDB(db=db)
+        # Every dish, 2 per batch, while another stream runs alongside on a second worker thread
+        async def names(order):
+            return [dish.dish_name async for dish in async_db.iter_dishes(order, batch_size=2)]
+        by_date, by_stars = await asyncio.gather(names("date_asc"), names("stars_desc"))
+        print(by_date)
+        print(by_stars)
+
+        # Closing a stream early closes it on its worker thread and returns its connection to the pool
+        stream = async_db.iter_dishes("name_asc", batch_size=2)
+        async for dish in stream:
+            print(dish.dish_name)
+            break
+        await stream.aclose()
+        print(db.pool_stats())
+
+        try:
+            async for dish in async_db.iter_dishes("not_an_order"):
+                pass
+        except ValueError as e:
+            print("ValueError:", e)
+        await async_db.close()
+
+    asyncio.run(run())
+
+def test_instrumentation():
+    db = util_create_clear("restaurant_app.db")
+
+    # Instantiate restaurants with sample values
+    restaurants, dishes = util_restaurants_and_dishes(db)
+
+    # Print every call and statement, and keep statements slower than 1 ms in the slow-query log
+    db.instrumentation = Instrumentation(listeners=[lambda event: print(event.kind, event.method, getattr(event, "sql", ""), event.rows)],
+                                         slow_query_threshold=0.001)
+    db.get_restaurant(restaurants[0].id)
+    db.get_dishes_from_restaurant(restaurants[0].id)
+    db.custom_query('dishes', ["stars >= %s"], parameters=(4,))
+    print(db.instrumentation.summary())
+    print(db.instrumentation.prometheus_text())
+
+def test_restaurant_stats():
+    db = util_create_clear("restaurant_app.db")
+
+    # Instantiate restaurants with sample values
+    restaurants, dishes = util_restaurants_and_dishes(db)
+    print(db.get_restaurant_stats([restaurant.id for restaurant in restaurants]))
+
+    # Re-rate a dish, move one to the other restaurant and delete another, then check nothing drifted
+    db.update_dish(dishes[0].id, stars=1)
+    db.update_dish(dishes[2].id, restaurant_id=restaurants[1].id)
+    db.delete_dish(dishes[1].id)
+    print(db.get_restaurant_stats(restaurants[1].id))
+    print(db.verify_restaurant_stats())
+
+def test_authentication():
+    db = util_create_clear("restaurant_app.db")
+
+    # A cheap hash cost keeps the test fast, real deployments keep werkzeug's default
+    hasher = PasswordHasher(max_workers=2, method="pbkdf2:sha256:1000")
+    sessions = SessionTokens(ttl=60)
+    user_id = authentication.create_user(None, db, "spencer", "hunter2", hasher=hasher)
+    print(user_id)
+
+    # Log in once with the password, then authenticate with the session token alone
+    user_id, token = authentication.authenticate_user(None, db, "spencer", "hunter2", hasher=hasher, sessions=sessions)
+    print(user_id, token)
+    print(authentication.authenticate_user(None, db, "spencer", "wrong password", hasher=hasher))
+    print(authentication.authenticate_session(sessions, token))
+    print(authentication.authenticate_session(sessions, token[:-1] + "x"))
+    sessions.revoke_user(user_id)
+    print(authentication.authenticate_session(sessions, token))
+    hasher.close()
+
+def test_migrations():
+    db = util_create_clear("restaurant_app.db")
+
+    # create_db() applied every step to the empty database, with the time each took
+    for version, description, seconds in db.applied_migrations:
+        print(f"{version}: {description} ({seconds * 1000:.2f} ms)")
+    print(db.schema_version())
+
+    # A current schema has nothing left to apply
+    print(db.migrate())
+
+    # Forgetting the history re-runs every step against the existing schema, which each step tolerates
+    util_restaurants_and_dishes(db)
+    with db.connection() as conn:
+        conn.cursor().execute("DROP TABLE schema_version")
+    print([version for version, _, _ in db.migrate(target_version=3)], db.schema_version())
+    print([version for version, _, _ in db.migrate()], db.schema_version())
+    print(len(db.get_all_dishes()))
+
+def test_change_feed():
+    db = util_create_clear("restaurant_app.db")
+    # A second instance on the same database, as another worker process would have
+    other = util_connect_db("restaurant_app.db")
+
+    # Writes through one instance reach the other's indexes with its next poll, own writes are skipped
+    restaurants, dishes = util_restaurants_and_dishes(db)
+    print(db.poll_changes(), other.poll_changes())
+    print(other.index.stats(), other.get_restaurant_stats(restaurants[0].id))
+
+    db.update_dish(dishes[0].id, stars=1, dish_name="Turkey Melt", dietary_restrictions=["halal"])
+    db.update_dish(dishes[2].id, restaurant_id=restaurants[1].id)
+    db.update_restaurant(restaurants[1].id, cuisine="Italian")
+    db.delete_dish(dishes[1].id)
+    print(other.poll_changes())
+    print(other.index.restaurant_of(dishes[2].id) == restaurants[1].id, other.util_dish_in_db(dishes[1].id))
+    print([dish.dish_name for dish in other.find_dishes(["halal"])], other.search("melt"))
+    print(other.get_restaurant_stats(restaurants[1].id) == db.get_restaurant_stats(restaurants[1].id))
+
+    # Deleting a restaurant is one entry, which takes its dishes with it
+    db.delete_restaurant(restaurants[0].id)
+    print(other.poll_changes(), other.index.stats(), other.change_feed_stats())
+
+    # A number skipped by a rolled-back transaction holds the position until the gap times out
+    feed = ChangeFeedPosition(gap_timeout=5)
+    feed.reset(0)
+    feed.advance([1, 2, 4], now=0)
+    print(feed.position, feed.is_new(3), feed.is_new(4))
+    feed.advance([], now=6)
+    print(feed.position)
+    other.close()
+
 def main():
    #test_adding_restaurants()
    #test_adding_dishes()
@@ -256,10 +633,29 @@ def main():
    #test_get_all_dishes_stars_asc()
    #test_get_all_dishes_stars_desc()
    #test_update_dish()
+   #test_update_dish_move()
+   #test_update_dish_string_stars()
+   #test_update_dish_clear_stars()
    #test_update_restaurant()
    #test_delete_dish()
    test_delete_restaurant()
    #test_get_dishes_with_dietary_restrictions()
+   #test_bulk_adding()
+   #test_bulk_deleting()
+   #test_bulk_updating()
+   #test_restaurants_near()
+   #test_top_dishes_near()
+   #test_paging_dishes()
+   #test_date_queries()
+   #test_find_dishes()
+   #test_search()
+   #test_streaming_json()
+   #test_async_streaming()
+   #test_instrumentation()
+   #test_restaurant_stats()
+   #test_authentication()
+   #test_migrations()
+   #test_change_feed()
    
 if __name__ == "__main__":
     main()
\ No newline at end of file
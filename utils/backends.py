@@ -0,0 +1,277 @@
+import re, sqlite3, functools
+from utils.connection_pool import ConnectionPool, ThreadLocalPool
+try:
+    import mysql.connector
+except ImportError:  # Only the MySQL backend needs the driver
+    mysql = None
+
+# '%s' placeholders and '%%' escapes outside of quoted literals and identifiers
+_PLACEHOLDER = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|%%|%s")
+
+
+@functools.lru_cache(maxsize=1024)
+def translate_placeholders(query):
+    """Rewrite a query written with MySQL's '%s' placeholders to SQLite's '?' placeholders.
+
+    Quoted literals are left alone, so a condition like "dish_name LIKE '%salad%'" keeps its pattern.
+    Queries are memoized, the DB class sends the same few statements over and over.
+
+    Args:
+        query (str): A query using '%s' placeholders and '%%' for a literal percent sign.
+
+    Returns:
+        str: The same query using '?' placeholders.
+    """
+    def replace(match):
+        token = match.group()
+        if token == "%s":
+            return "?"
+        if token == "%%":
+            return "%"
+        return token
+    return _PLACEHOLDER.sub(replace, query)
+
+
+class MySQLBackend:
+    """Connects the DB class to a MySQL server through mysql.connector.
+
+    Args:
+        host (str): The server's host name or address.
+        name (str): The database to use.
+        user (str, optional): The user to connect as.
+        password (str, optional): The user's password.
+    """
+    name = "mysql"
+    supports_fulltext = True
+    # The DB class keeps its hot statements prepared on the server, see StatementCache
+    supports_prepared_statements = True
+    # Column definition of an increasing sequence number, e.g. the 'changes' table's 'seq'
+    sequence_key = "BIGINT AUTO_INCREMENT PRIMARY KEY"
+
+    def __init__(self, host, name, user=None, password=None):
+        if mysql is None:
+            raise ImportError("The MySQL backend requires mysql-connector-python")
+        self.host = host
+        self.database = name
+        self.user = user
+        self.password = password
+        self.Error = mysql.connector.Error
+        self.IntegrityError = mysql.connector.IntegrityError
+
+    def connect(self):
+        # Autocommit keeps pooled connections from holding a stale snapshot between checkouts,
+        # multi-statement writes open an explicit transaction with DB.transaction()
+        return mysql.connector.connect(host=self.host, user=self.user, password=self.password,
+                                       database=self.database, autocommit=True)
+
+    def create_pool(self, connect, size, max_overflow, idle_timeout, pre_ping, warm):
+        """Return a ConnectionPool opening its connections with 'connect', normally a wrapper around connect()."""
+        return ConnectionPool(connect, size=size, max_overflow=max_overflow,
+                              idle_timeout=idle_timeout, pre_ping=pre_ping, warm=warm)
+
+    def create_index(self, cursor, index_name, table_name, columns, index_type="", online=False):
+        # InnoDB builds a plain index in place while reads and writes carry on; asking for it explicitly makes
+        # MySQL fail fast rather than silently fall back to a table copy that blocks writes. FULLTEXT builds
+        # can't run with LOCK=NONE, so they only ever take the plain form.
+        if online and not index_type:
+            statement = f"ALTER TABLE {table_name} ADD INDEX {index_name} ({columns}), ALGORITHM=INPLACE, LOCK=NONE"
+        else:
+            statement = f"CREATE {index_type + ' ' if index_type else ''}INDEX {index_name} ON {table_name} ({columns})"
+        # MySQL has no CREATE INDEX IF NOT EXISTS, so ignore the "duplicate key name" error instead
+        try:
+            cursor.execute(statement)
+        except mysql.connector.Error as e:
+            if e.errno != 1061:
+                raise
+
+    def date_bucket(self, column, period):
+        """Return an SQL expression labelling a DATE column's values by "day", "week" (its Monday) or "month"."""
+        if period == "week":
+            return f"CAST(DATE_SUB({column}, INTERVAL WEEKDAY({column}) DAY) AS CHAR)"
+        return f"SUBSTR({column}, 1, {7 if period == 'month' else 10})"
+
+    def add_column(self, cursor, table_name, column, definition):
+        # MySQL has no ADD COLUMN IF NOT EXISTS, so ignore the "duplicate column name" error instead
+        try:
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {definition}")
+        except mysql.connector.Error as e:
+            if e.errno != 1060:
+                raise
+
+
+class SQLiteBackend:
+    """Runs the DB class on an embedded SQLite database file.
+
+    Every thread gets its own connection (see ThreadLocalPool). The database is switched to write-ahead
+    logging, so readers never block the writer or each other, and each connection is tuned with the
+    'synchronous', 'cache_size' and 'mmap_size' pragmas. Connections are wrapped so the DB class can keep
+    writing MySQL-style queries: '%s' placeholders are translated, cursors work as context managers and
+    'start_transaction()' is available.
+
+    Args:
+        path (str): The database file, created if it doesn't exist. ":memory:" is not supported, every
+            connection would see a different empty database.
+        journal_mode (str): Default is "WAL".
+        synchronous (str): "NORMAL" only syncs at WAL checkpoints, which is durable against application
+            crashes and keeps the database consistent on power loss. Use "FULL" to sync every commit.
+            Default is "NORMAL".
+        cache_size (int): Page cache per connection, in KiB if negative or pages if positive, as SQLite's
+            pragma takes it. Default is -65536 (64 MiB).
+        mmap_size (int): Bytes of the file read through memory mapping. Default is 268435456 (256 MiB).
+        busy_timeout (float): Seconds a connection waits for another connection's write lock. Default is 5.
+        foreign_keys (bool): Enforce the tables' foreign keys, as MySQL does. Default is True.
+        cached_statements (int): The number of compiled statements each connection keeps, reused whenever the
+            same SQL text runs again and evicted least recently used first. Default is 128.
+
+    Example:
+        db = DB(None, "restaurant_app.db", backend="sqlite", backend_options={"synchronous": "FULL"})
+    """
+    name = "sqlite"
+    supports_fulltext = False
+    # sqlite3 already keeps compiled statements per connection, sized by 'cached_statements'
+    supports_prepared_statements = False
+    # AUTOINCREMENT never hands out a number twice, even after the highest rows were deleted
+    sequence_key = "INTEGER PRIMARY KEY AUTOINCREMENT"
+    Error = sqlite3.Error
+    IntegrityError = sqlite3.IntegrityError
+
+    def __init__(self, path, journal_mode="WAL", synchronous="NORMAL", cache_size=-65536, mmap_size=268435456,
+                 busy_timeout=5, foreign_keys=True, cached_statements=128):
+        if path == ":memory:":
+            raise ValueError("The SQLite backend needs a database file, ':memory:' is private to each connection")
+        self.path = path
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = int(cache_size)
+        self.mmap_size = int(mmap_size)
+        self.busy_timeout = busy_timeout
+        self.foreign_keys = foreign_keys
+        self.cached_statements = cached_statements
+
+    def connect(self):
+        # isolation_level=None leaves the connection in autocommit mode like the MySQL connections,
+        # and the connection may be released on another thread than the one that opened it
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA cache_size = {self.cache_size}")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        conn.execute(f"PRAGMA foreign_keys = {'ON' if self.foreign_keys else 'OFF'}")
+        return SQLiteConnection(conn)
+
+    def create_pool(self, connect, size, max_overflow, idle_timeout, pre_ping, warm):
+        """Return a ThreadLocalPool. There is no handshake to amortize, so the idle and warm-up settings don't apply."""
+        return ThreadLocalPool(connect, size=size, max_overflow=max_overflow)
+
+    def create_index(self, cursor, index_name, table_name, columns, index_type="", online=False):
+        # SQLite has no online index builds, 'online' is accepted for parity: the build holds the write lock,
+        # while readers of a WAL database carry on against the last committed snapshot
+        if index_type.upper() == "FULLTEXT":
+            raise ValueError("SQLite has no FULLTEXT indexes")
+        cursor.execute(f"CREATE {index_type + ' ' if index_type else ''}INDEX IF NOT EXISTS {index_name} ON {table_name} ({columns})")
+
+    def date_bucket(self, column, period):
+        """Return an SQL expression labelling a date column's values by "day", "week" (its Monday) or "month"."""
+        if period == "week":
+            # 'weekday 0' moves to the next Sunday unless it already is one, six days earlier is that week's Monday
+            return f"date({column}, 'weekday 0', '-6 days')"
+        return f"substr({column}, 1, {7 if period == 'month' else 10})"
+
+    def add_column(self, cursor, table_name, column, definition):
+        # SQLite has no ADD COLUMN IF NOT EXISTS either, but the existing columns can be listed
+        cursor.execute(f"PRAGMA table_info({table_name})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column} {definition}")
+
+
+class SQLiteConnection:
+    """A sqlite3 connection with the parts of the mysql.connector connection interface the DB class uses."""
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, dictionary=False, **ignored):
+        """Return a cursor. 'buffered' and other mysql.connector options are accepted and ignored."""
+        cursor = self._conn.cursor()
+        if dictionary:
+            cursor.row_factory = lambda cur, row: {column[0]: value for column, value in zip(cur.description, row)}
+        return SQLiteCursor(cursor)
+
+    def start_transaction(self):
+        # Take the write lock up front: a deferred transaction that reads first and writes later can fail
+        # with SQLITE_BUSY instead of waiting when another connection commits in between
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def commit(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def rollback(self):
+        if self._conn.in_transaction:
+            self._conn.execute("ROLLBACK")
+
+    def is_connected(self):
+        try:
+            self._conn.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def ping(self, reconnect=False, **ignored):
+        if not self.is_connected():
+            raise sqlite3.ProgrammingError("Connection is closed")
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteCursor:
+    """A sqlite3 cursor taking '%s' placeholders, usable as a context manager like a mysql.connector cursor."""
+    __slots__ = ("_cursor",)
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, parameters=()):
+        self._cursor.execute(translate_placeholders(query), tuple(parameters) if parameters else ())
+
+    def executemany(self, query, seq_of_parameters):
+        self._cursor.executemany(translate_placeholders(query), (tuple(parameters) for parameters in seq_of_parameters))
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
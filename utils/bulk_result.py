@@ -0,0 +1,43 @@
+class BulkResult:
+    """Per-row outcomes of a bulk database operation.
+
+    Attributes:
+        operation (str): A short description of the operation, e.g. "add_dishes".
+        outcomes (dict): Record IDs as keys, in the order they were submitted. The value is None if the
+            row was written and the exception explaining why it was skipped otherwise. If the same ID is
+            submitted more than once, the outcome of its first occurrence is kept.
+        elapsed (float): Wall-clock seconds the operation took.
+
+    Example:
+        result = db.add_dishes(dishes)
+        print(result.rows_per_second)
+        for dish_id, error in result.failed.items():
+            print(dish_id, error)
+    """
+    def __init__(self, operation):
+        self.operation = operation
+        self.outcomes = {}
+        self.elapsed = 0.0
+
+    def record(self, record_id, error=None):
+        self.outcomes.setdefault(record_id, error)
+
+    @property
+    def succeeded(self):
+        """list[str]: The IDs of the rows that were written."""
+        return [record_id for record_id, error in self.outcomes.items() if error is None]
+
+    @property
+    def failed(self):
+        """dict: The IDs of the rows that were skipped, mapped to the exception explaining why."""
+        return {record_id: error for record_id, error in self.outcomes.items() if error is not None}
+
+    @property
+    def rows_per_second(self):
+        """float: Rows written per second of wall-clock time."""
+        written = len(self.succeeded)
+        return written / self.elapsed if self.elapsed > 0 else float(written)
+
+    def __str__(self):
+        return (f"{self.operation}: {len(self.succeeded)} succeeded, {len(self.failed)} failed "
+                f"in {self.elapsed:.3f}s ({self.rows_per_second:.0f} rows/s)")
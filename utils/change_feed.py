@@ -0,0 +1,85 @@
+import threading, time
+
+
+class ChangeFeedPosition:
+    """Tracks which entries of the 'changes' table a DB instance has applied.
+
+    Every write appends (seq, table_name, record_id, operation, origin) rows to 'changes' in its own
+    transaction, and other instances poll the rows past their position to bring their in-memory indexes up
+    to date. The sequence numbers are handed out when a transaction inserts its rows, not when it commits,
+    so on MySQL a higher number can become visible before a lower one, and a rolled-back transaction leaves
+    a number that never shows up at all.
+
+    The position is therefore the highest number at or below which every entry has been applied, or given
+    up on after 'gap_timeout' seconds. Entries above the position that were applied early are remembered,
+    so polling again from the position doesn't apply them twice.
+
+    Example:
+        feed = ChangeFeedPosition()
+        feed.reset(0)
+        rows = [row for row in fetched_rows if feed.is_new(row[0])]
+        ...  # apply rows
+        feed.advance(row[0] for row in rows)
+    """
+    def __init__(self, gap_timeout=5.0):
+        self.gap_timeout = gap_timeout
+        self.position = 0
+        self._applied = set()
+        self._gaps = {}
+        self._lock = threading.Lock()
+        self.polls = 0
+        self.changes_applied = 0
+        self.reloads = 0
+        self.last_poll = None
+
+    def reset(self, position, seqs=()):
+        """Start over from 'position', with the entries numbered 'seqs' above it already applied."""
+        with self._lock:
+            self.position = position
+            self._applied = set()
+            self._gaps = {}
+        self.advance(seqs)
+
+    def is_new(self, seq):
+        """Return True if the entry numbered 'seq' hasn't been applied yet."""
+        return seq > self.position and seq not in self._applied
+
+    def advance(self, seqs, now=None):
+        """Record that the entries numbered 'seqs' have been applied, and move the position past them.
+
+        Numbers skipped below the highest applied one are gaps: the position waits at a gap until its entry
+        is applied or 'gap_timeout' seconds have passed since the gap was first seen.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._applied.update(seq for seq in seqs if seq > self.position)
+            if not self._applied:
+                return
+            for seq in range(self.position + 1, max(self._applied)):
+                if seq not in self._applied:
+                    self._gaps.setdefault(seq, now)
+            for seq in self._applied.intersection(self._gaps):
+                del self._gaps[seq]
+            while True:
+                seq = self.position + 1
+                if seq in self._applied:
+                    self._applied.discard(seq)
+                elif seq in self._gaps and now - self._gaps[seq] >= self.gap_timeout:
+                    del self._gaps[seq]
+                else:
+                    break
+                self.position = seq
+
+    def record_poll(self, changes_applied, reloaded=False):
+        with self._lock:
+            self.polls += 1
+            self.changes_applied += changes_applied
+            self.reloads += reloaded
+            self.last_poll = time.time()
+
+    def stats(self):
+        """Return the position, open gaps, polls, changes applied and full reloads, and the time of the last poll."""
+        with self._lock:
+            return {"position": self.position, "gaps": len(self._gaps), "applied_ahead": len(self._applied),
+                    "polls": self.polls, "changes_applied": self.changes_applied, "reloads": self.reloads,
+                    "last_poll": self.last_poll}
@@ -0,0 +1,386 @@
+import threading, time
+from collections import deque
+from database_errors import PoolExhaustedError
+
+
+class ConnectionPool:
+    """A thread-safe pool of reusable database connections.
+
+    Connections are created through the 'connect' factory and handed out with 'acquire()'. Callers give them
+    back with 'release()', after which they are kept open for the next caller instead of being closed. Up to
+    'size' connections are kept idle in the pool; when all of them are busy, up to 'max_overflow' extra
+    connections are opened and closed again as soon as they are returned.
+
+    Args:
+        connect (callable): A function taking no arguments that opens and returns a new connection.
+        size (int): The number of connections kept open in the pool. Default is 5.
+        max_overflow (int): The number of extra connections allowed when the pool is exhausted. Default is 10.
+        idle_timeout (float, optional): Seconds after which an idle connection is closed instead of reused.
+            None keeps idle connections forever. Default is 300.
+        pre_ping (bool): Check that a connection is still alive before handing it out. Default is True.
+        warm (bool): Open 'size' connections immediately instead of on first use. Default is True.
+        timeout (float): Seconds 'acquire()' waits for a free connection before giving up. Default is 30.
+        ping (callable, optional): A function taking a connection and returning True if it is usable.
+            Defaults to calling the connection's 'is_connected()' method.
+
+    Example:
+        pool = ConnectionPool(lambda: mysql.connector.connect(host="127.0.0.1", database="foodpix_db"), size=5)
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+    """
+    def __init__(self, connect, size=5, max_overflow=10, idle_timeout=300, pre_ping=True, warm=True,
+                 timeout=30, ping=None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        if max_overflow < 0:
+            raise ValueError("Pool max_overflow cannot be negative")
+
+        self.size = size
+        self.max_overflow = max_overflow
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+        self._connect = connect
+        self._ping = ping if ping is not None else (lambda conn: conn.is_connected())
+
+        # Idle connections stored as (connection, time it was returned) pairs
+        self._idle = deque()
+        self._cond = threading.Condition()
+        self._open = 0
+        self._in_use = 0
+        self._closed = False
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "failed_pings": 0,
+            "expired": 0,
+            "peak_in_use": 0,
+        }
+
+        if warm:
+            self.warm()
+
+    def warm(self):
+        """Open connections until 'size' of them are idle in the pool."""
+        while True:
+            with self._cond:
+                if self._closed or self._open >= self.size:
+                    return
+                self._open += 1
+            conn = self._create()
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self):
+        """Check a connection out of the pool, opening a new one if none are idle.
+
+        Returns:
+            object: An open database connection. It must be given back with 'release()'.
+
+        Raises:
+            PoolExhaustedError: If no connection became available within the pool's timeout.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn = None
+            with self._cond:
+                if self._closed:
+                    raise PoolExhaustedError("acquire", "the pool has been closed")
+
+                # Wait for a connection to be returned when every allowed connection is in use
+                if not self._idle and self._open >= self.size + self.max_overflow:
+                    self._stats["waits"] += 1
+                    wait_start = time.monotonic()
+                    while not self._idle and self._open >= self.size + self.max_overflow:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or self._closed:
+                            self._stats["wait_time"] += time.monotonic() - wait_start
+                            self._stats["timeouts"] += 1
+                            raise PoolExhaustedError("acquire", f"no connection available after {self.timeout} seconds")
+                        self._cond.wait(remaining)
+                    self._stats["wait_time"] += time.monotonic() - wait_start
+
+                if self._idle:
+                    # Reuse the most recently returned connection, it is the least likely to have gone stale
+                    conn, returned_at = self._idle.pop()
+                else:
+                    # Reserve a slot for a new connection, it is opened outside the lock
+                    self._open += 1
+                    returned_at = None
+
+            if conn is None:
+                conn = self._create()
+            elif not self._usable(conn, returned_at):
+                continue
+
+            with self._cond:
+                self._in_use += 1
+                self._stats["checkouts"] += 1
+                self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._in_use)
+            return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool.
+
+        Args:
+            conn (object): A connection previously returned by 'acquire()'.
+            discard (bool): Close the connection instead of keeping it, e.g. after an error left it
+                in an unknown state. Default is False.
+        """
+        with self._cond:
+            self._in_use -= 1
+            keep = not discard and not self._closed and len(self._idle) < self.size
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    def connection(self):
+        """Context manager that acquires a connection and releases it when the block exits.
+
+        If the block raises an exception, any open transaction is rolled back before the connection
+        is returned, and the connection is discarded if it cannot be rolled back.
+        """
+        return _PooledConnection(self)
+
+    def stats(self):
+        """Return a snapshot of the pool's counters.
+
+        Returns:
+            dict: The configured size and overflow, the number of open, idle and in-use connections,
+            and running totals for connections created, closed, checked out, waits, time spent waiting,
+            timeouts, failed health checks and connections expired for sitting idle too long.
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+            })
+        return stats
+
+    def close(self):
+        """Close every idle connection and stop handing out new ones.
+
+        Connections that are checked out are closed when they are released.
+        """
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+    def _create(self):
+        try:
+            conn = self._connect()
+        except Exception:
+            # Give back the slot reserved for this connection
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        return conn
+
+    def _usable(self, conn, returned_at):
+        if self.idle_timeout is not None and time.monotonic() - returned_at > self.idle_timeout:
+            with self._cond:
+                self._stats["expired"] += 1
+            self._discard(conn)
+            return False
+        if self.pre_ping:
+            try:
+                alive = self._ping(conn)
+            except Exception:
+                alive = False
+            if not alive:
+                with self._cond:
+                    self._stats["failed_pings"] += 1
+                self._discard(conn)
+                return False
+        return True
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._stats["closed"] += 1
+            self._cond.notify()
+
+
+class _PooledConnection:
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = self.pool.acquire()
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        discard = False
+        if exc_type is not None:
+            try:
+                self.conn.rollback()
+            except Exception:
+                discard = True
+        self.pool.release(self.conn, discard=discard)
+        return False
+
+
+class ThreadLocalPool:
+    """Hands every thread its own long-lived connection, for embedded databases such as SQLite.
+
+    An embedded database has no handshake to amortize and allows any number of readers, so instead of a
+    bounded set of shared connections each thread keeps one connection open for as long as it is alive. It
+    exposes the same 'acquire()', 'release()', 'connection()', 'stats()' and 'close()' methods as
+    ConnectionPool, so the DB class can use either.
+
+    Args:
+        connect (callable): A function taking no arguments that opens and returns a new connection.
+        size (int): The number of threads expected to use the database at once. Connections are not capped,
+            this only sizes thread pools built around the pool, such as AsyncDB's. Default is 5.
+        max_overflow (int): Added to 'size' the same way. Default is 10.
+
+    Example:
+        pool = ThreadLocalPool(lambda: sqlite3.connect("restaurant_app.db", check_same_thread=False))
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+    """
+    def __init__(self, connect, size=5, max_overflow=10):
+        self.size = size
+        self.max_overflow = max_overflow
+        self._connect = connect
+        self._lock = threading.Lock()
+        # thread ident -> (thread, connection), and connection -> number of times it is checked out
+        self._threads = {}
+        self._checkouts = {}
+        self._closed = False
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "peak_in_use": 0,
+        }
+
+    def acquire(self):
+        """Return the calling thread's connection, opening it on the thread's first call.
+
+        Returns:
+            object: An open database connection. It must be given back with 'release()'.
+
+        Raises:
+            PoolExhaustedError: If the pool has been closed.
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            if self._closed:
+                raise PoolExhaustedError("acquire", "the pool has been closed")
+            entry = self._threads.get(ident)
+        if entry is None:
+            conn = self._connect()
+            with self._lock:
+                self._stats["created"] += 1
+                self._threads[ident] = (threading.current_thread(), conn)
+                stale = self._reap()
+            for stale_conn in stale:
+                self._close(stale_conn)
+        else:
+            conn = entry[1]
+
+        with self._lock:
+            self._checkouts[conn] = self._checkouts.get(conn, 0) + 1
+            self._stats["checkouts"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], len(self._checkouts))
+        return conn
+
+    def release(self, conn, discard=False):
+        """Give a connection back. It stays open for its thread unless 'discard' is set.
+
+        Args:
+            conn (object): A connection previously returned by 'acquire()'.
+            discard (bool): Close the connection once its thread no longer uses it, e.g. after an error left
+                it in an unknown state. The thread opens a new one on its next call. Default is False.
+        """
+        with self._lock:
+            checkouts = self._checkouts.get(conn, 0) - 1
+            if checkouts > 0:
+                self._checkouts[conn] = checkouts
+                return
+            self._checkouts.pop(conn, None)
+            if not discard and not self._closed:
+                return
+            # Forget the connection whichever thread owns it, the generator of a streaming query may be
+            # finished on another thread than the one that started it
+            for ident, (_, owned) in list(self._threads.items()):
+                if owned is conn:
+                    del self._threads[ident]
+        self._close(conn)
+
+    def connection(self):
+        """Context manager that acquires the thread's connection and releases it when the block exits.
+
+        If the block raises an exception, any open transaction is rolled back, and the connection is
+        discarded if it cannot be rolled back.
+        """
+        return _PooledConnection(self)
+
+    def stats(self):
+        """Return a snapshot of the pool's counters.
+
+        Returns:
+            dict: The configured size and overflow, the number of open connections (one per thread that used
+            the pool), how many are idle and in use, and running totals for connections created, closed and
+            checked out.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": len(self._threads),
+                "idle": len(self._threads) - len(self._checkouts),
+                "in_use": len(self._checkouts),
+            })
+        return stats
+
+    def close(self):
+        """Close every connection that is not in use and stop handing out new ones.
+
+        Connections that are checked out are closed when they are released.
+        """
+        with self._lock:
+            self._closed = True
+            idle = [conn for _, conn in self._threads.values() if conn not in self._checkouts]
+            self._threads = {ident: entry for ident, entry in self._threads.items() if entry[1] in self._checkouts}
+        for conn in idle:
+            self._close(conn)
+
+    def _reap(self):
+        # Drop the connections of threads that have exited, called with the lock held
+        stale = [ident for ident, (thread, conn) in self._threads.items()
+                 if not thread.is_alive() and conn not in self._checkouts]
+        return [self._threads.pop(ident)[1] for ident in stale]
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._stats["closed"] += 1
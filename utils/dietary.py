@@ -0,0 +1,343 @@
+import json, re, threading, functools
+import numpy as np
+import utils.utility as utility
+
+# dietary_mask is a signed BIGINT, so bit 63 is left unused
+MAX_TAGS = 63
+
+
+def normalize_tag(tag):
+    """Normalize a dietary tag so spelling variants share a bit, e.g. "Gluten-Free" -> "gluten free"."""
+    return re.sub(r"[\s_-]+", " ", str(tag)).strip().lower()
+
+
+def parse_dietary_restrictions(value):
+    """
+    Convert the stored form of a dish's dietary restrictions into a list.
+
+    Args:
+        value (str, list, tuple, None): A list, a JSON-encoded list as stored in the 'dietary_restrictions'
+            column, or a comma-separated string.
+
+    Returns:
+        list: The dietary restrictions as a list of strings.
+    """
+    if isinstance(value, str) and value.startswith("["):
+        try:
+            return list(_parse_json_list(value))
+        except ValueError:
+            pass
+    return utility.listify(value)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_json_list(text):
+    # Dishes share a small number of distinct restriction lists, so the decoded form is memoized
+    return tuple(str(item) for item in json.loads(text))
+
+
+class DietaryRegistry:
+    """Interns dietary tags into bit positions so a dish's tags can be stored and tested as one integer.
+
+    The mapping is persisted in the 'dietary_tags' table by the DB class; this object holds the in-memory copy.
+
+    Example:
+        registry = DietaryRegistry()
+        registry.load([(0, "vegan"), (1, "gluten free")])
+        registry.mask_of(["Vegan", "Gluten-Free"])  # 0b11
+    """
+    def __init__(self):
+        self._bits = {}
+        self._tags = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._bits)
+
+    def load(self, rows):
+        """Replace the registry with (bit, tag) rows."""
+        with self._lock:
+            self._bits = {normalize_tag(tag): int(bit) for bit, tag in rows}
+            self._tags = {bit: tag for tag, bit in self._bits.items()}
+
+    def bit_of(self, tag):
+        """Return the bit position of a tag, or None if it was never registered."""
+        return self._bits.get(normalize_tag(tag))
+
+    def unregistered(self, tags):
+        """Return the normalized tags from 'tags' that don't have a bit yet, without duplicates."""
+        new_tags = []
+        for tag in tags:
+            tag = normalize_tag(tag)
+            if tag and tag not in self._bits and tag not in new_tags:
+                new_tags.append(tag)
+        return new_tags
+
+    def next_bit(self):
+        with self._lock:
+            bit = len(self._bits)
+        if bit >= MAX_TAGS:
+            raise ValueError(f"Cannot register more than {MAX_TAGS} dietary tags")
+        return bit
+
+    def register(self, bit, tag):
+        with self._lock:
+            self._bits[normalize_tag(tag)] = bit
+            self._tags[bit] = normalize_tag(tag)
+
+    def mask_of(self, tags):
+        """Return the bitmask for a list of tags, or None if any of them was never registered."""
+        mask = 0
+        for tag in tags:
+            tag = normalize_tag(tag)
+            if not tag:
+                continue
+            bit = self._bits.get(tag)
+            if bit is None:
+                return None
+            mask |= 1 << bit
+        return mask
+
+    def covers(self, mask):
+        """Return True if every bit set in 'mask' belongs to a registered tag."""
+        mask = int(mask or 0)
+        while mask:
+            low = mask & -mask
+            if low.bit_length() - 1 not in self._tags:
+                return False
+            mask ^= low
+        return True
+
+    def tags_of(self, mask):
+        """Return the normalized tags set in a bitmask."""
+        return [tag for bit, tag in sorted(self._tags.items()) if mask >> bit & 1]
+
+
+# Stands for a field update() and update_many() leave as it is, so None can clear a star rating
+_KEEP = object()
+
+
+class DishFilterIndex:
+    """Per-tag and per-star-rating bitmaps over every dish, for answering combined filters without scanning rows.
+
+    Each dish is given a slot number. For every dietary tag bit and every star rating there is one bitmap (a
+    NumPy array of packed bits) with the bits of the matching slots set, so "vegan AND gluten free AND stars >= 4"
+    is two vectorized ANDs and an OR of the star bitmaps, regardless of how many dishes there are. The bitmaps
+    are updated in place: writing a dish sets or clears one byte in each bitmap it is in, so a single write
+    costs the same however many dishes are indexed.
+
+    Example:
+        index = DishFilterIndex()
+        index.load([(dish.id, dish.stars, dish_mask) for dish in dishes])
+        index.query(required_mask=registry.mask_of(["vegan"]), min_stars=4)
+    """
+    KEEP = _KEEP
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def __len__(self):
+        return len(self._slots)
+
+    def clear(self):
+        with self._lock:
+            self._ids = []
+            self._slots = {}
+            self._free = []
+            self._masks = []
+            self._stars = []
+            self._tag_bitmaps = {}
+            self._star_bitmaps = {}
+            self._all = np.zeros(0, dtype=np.uint8)
+
+    def load(self, rows):
+        """Replace the contents of the index.
+
+        Args:
+            rows (iterable[tuple]): (dish_id, stars, dietary_mask) tuples.
+        """
+        ids, stars_list, masks = [], [], []
+        for dish_id, stars, mask in rows:
+            ids.append(dish_id)
+            stars_list.append(stars)
+            masks.append(int(mask or 0))
+
+        # Build every bitmap column-wise with NumPy rather than setting bits one slot at a time
+        mask_array = np.fromiter(masks, dtype=np.int64, count=len(masks))
+        stars_array = np.fromiter((-1 if stars is None else stars for stars in stars_list), dtype=np.int64, count=len(stars_list))
+        size = _bitmap_size(len(ids))
+        tag_bitmaps = {}
+        for tag_bit in range(MAX_TAGS):
+            column = (mask_array >> tag_bit) & 1
+            if column.any():
+                tag_bitmaps[tag_bit] = _bitmap_of(column, size)
+        star_bitmaps = {}
+        for stars in np.unique(stars_array).tolist():
+            star_bitmaps[None if stars == -1 else stars] = _bitmap_of(stars_array == stars, size)
+
+        with self._lock:
+            self._ids = ids
+            self._slots = {dish_id: slot for slot, dish_id in enumerate(ids)}
+            self._free = []
+            self._masks = masks
+            self._stars = stars_list
+            self._tag_bitmaps = tag_bitmaps
+            self._star_bitmaps = star_bitmaps
+            self._all = _bitmap_of(np.ones(len(ids), dtype=np.uint8), size)
+
+    def add_many(self, rows):
+        """Insert or replace (dish_id, stars, dietary_mask) rows. A replaced dish keeps its slot."""
+        with self._lock:
+            for dish_id, stars, mask in rows:
+                mask = int(mask or 0)
+                slot = self._slots.get(dish_id)
+                if slot is not None:
+                    self._set_bits(slot, self._stars[slot], self._masks[slot], False)
+                else:
+                    slot = self._free.pop() if self._free else len(self._ids)
+                    if slot == len(self._ids):
+                        self._ids.append(dish_id)
+                        self._masks.append(mask)
+                        self._stars.append(stars)
+                    self._slots[dish_id] = slot
+                self._ids[slot] = dish_id
+                self._masks[slot] = mask
+                self._stars[slot] = stars
+                self._set_bits(slot, stars, mask, True)
+
+    def add(self, dish_id, stars, mask):
+        self.add_many([(dish_id, stars, mask)])
+
+    def update(self, dish_id, stars=_KEEP, mask=_KEEP, **ignored):
+        """Change a dish's star rating and/or dietary mask. Fields not given keep their value, stars=None clears the rating."""
+        self.update_many([(dish_id, stars, mask)])
+
+    def update_many(self, rows):
+        """Apply (dish_id, stars, dietary_mask) changes as one batch. KEEP keeps the current value, unknown dishes are skipped."""
+        with self._lock:
+            changed = {}
+            for dish_id, stars, mask in rows:
+                slot = self._slots.get(dish_id)
+                if slot is None:
+                    continue
+                current_stars, current_mask = changed.get(dish_id) or (self._stars[slot], self._masks[slot])
+                changed[dish_id] = (current_stars if stars is _KEEP else stars, current_mask if mask is _KEEP else mask)
+            if changed:
+                self.add_many([(dish_id, stars, mask) for dish_id, (stars, mask) in changed.items()])
+
+    def remove(self, dish_id):
+        with self._lock:
+            if dish_id in self._slots:
+                self._remove(dish_id)
+
+    def remove_many(self, dish_ids):
+        with self._lock:
+            for dish_id in dish_ids:
+                slot = self._slots.pop(dish_id, None)
+                if slot is None:
+                    continue
+                self._set_bits(slot, self._stars[slot], self._masks[slot], False)
+                self._ids[slot] = None
+                self._free.append(slot)
+
+    def _remove(self, dish_id):
+        self.remove_many([dish_id])
+
+    def _set_bits(self, slot, stars, mask, value):
+        # Set or clear a slot's bit in the bitmaps of its star rating and tags only, in place
+        index, bit = slot >> 3, 1 << (slot & 7)
+        if index >= len(self._all):
+            self._grow(index + 1)
+        bitmaps = [self._bitmap(self._star_bitmaps, stars, value)]
+        while mask:
+            low = mask & -mask
+            bitmaps.append(self._bitmap(self._tag_bitmaps, low.bit_length() - 1, value))
+            mask ^= low
+        self._all[index] = self._all[index] | bit if value else self._all[index] & (0xFF ^ bit)
+        for bitmap in bitmaps:
+            if bitmap is not None:
+                bitmap[index] = bitmap[index] | bit if value else bitmap[index] & (0xFF ^ bit)
+
+    def _bitmap(self, bitmaps, key, create):
+        # The bitmap of a star rating or tag, created empty when a bit is about to be set in it
+        bitmap = bitmaps.get(key)
+        if bitmap is None and create:
+            bitmap = bitmaps[key] = np.zeros(len(self._all), dtype=np.uint8)
+        return bitmap
+
+    def _grow(self, size):
+        # Double the bitmaps' capacity, so appending slots one at a time stays amortized O(1)
+        size = max(size, 128, 2 * len(self._all))
+        self._all = _resized(self._all, size)
+        for bitmaps in (self._tag_bitmaps, self._star_bitmaps):
+            for key, bitmap in bitmaps.items():
+                bitmaps[key] = _resized(bitmap, size)
+
+    def query(self, required_mask=0, min_stars=None, max_stars=None):
+        """Return the IDs of the dishes having every tag in 'required_mask' and a star rating in range.
+
+        Args:
+            required_mask (int): Bitmask of dietary tags every returned dish must have. Default is 0 (no filter).
+            min_stars (int, optional): Lowest star rating to include. Dishes without a rating are excluded.
+            max_stars (int, optional): Highest star rating to include. Dishes without a rating are excluded.
+
+        Returns:
+            list[str]: The matching dish IDs, in slot order.
+        """
+        with self._lock:
+            # Only the bytes covering slots in use, the rest is spare capacity
+            size = _bitmap_size(len(self._ids))
+            result = self._all[:size].copy()
+            while required_mask:
+                low = required_mask & -required_mask
+                bitmap = self._tag_bitmaps.get(low.bit_length() - 1)
+                if bitmap is None:
+                    return []
+                np.bitwise_and(result, bitmap[:size], out=result)
+                required_mask ^= low
+            if min_stars is not None or max_stars is not None:
+                stars_bitmap = np.zeros(size, dtype=np.uint8)
+                for stars, bitmap in self._star_bitmaps.items():
+                    if stars is None:
+                        continue
+                    if (min_stars is None or stars >= min_stars) and (max_stars is None or stars <= max_stars):
+                        np.bitwise_or(stars_bitmap, bitmap[:size], out=stars_bitmap)
+                np.bitwise_and(result, stars_bitmap, out=result)
+            ids = self._ids
+            return [ids[slot] for slot in np.flatnonzero(np.unpackbits(result, bitorder="little")).tolist()]
+
+    def matches(self, dish_id, required_mask=0, min_stars=None, max_stars=None):
+        """Return whether one dish passes the same filter as query(), without building a result list."""
+        slot = self._slots.get(dish_id)
+        if slot is None or self._masks[slot] & required_mask != required_mask:
+            return False
+        if min_stars is None and max_stars is None:
+            return True
+        stars = self._stars[slot]
+        return stars is not None and (min_stars is None or stars >= min_stars) and (max_stars is None or stars <= max_stars)
+
+    def mask_of(self, dish_id):
+        """Return the indexed dietary mask of a dish, or None if it is not indexed."""
+        slot = self._slots.get(dish_id)
+        return self._masks[slot] if slot is not None else None
+
+
+def _bitmap_size(slots):
+    # Bytes needed to hold one bit per slot
+    return (slots + 7) >> 3
+
+
+def _bitmap_of(flags, size):
+    # Pack a NumPy array of 0/1 (or bool) flags, one per slot, into a bitmap of 'size' bytes
+    bitmap = np.zeros(size, dtype=np.uint8)
+    packed = np.packbits(flags.astype(np.uint8), bitorder="little")
+    bitmap[:len(packed)] = packed
+    return bitmap
+
+
+def _resized(bitmap, size):
+    # A copy of 'bitmap' padded with zero bytes to 'size'
+    resized = np.zeros(size, dtype=np.uint8)
+    resized[:len(bitmap)] = bitmap
+    return resized
@@ -0,0 +1,114 @@
+import sys, threading, time
+from collections import OrderedDict
+
+# Marker stored for IDs known not to exist when negative caching is on
+MISSING = object()
+
+
+class EntityCache:
+    """Thread-safe in-process LRU cache with per-entry expiry and an approximate memory bound.
+
+    Entries are evicted least-recently-used first whenever the cache holds more than 'max_entries' entries or
+    more than 'max_bytes' bytes, and are treated as absent once they are older than 'ttl' seconds.
+
+    Args:
+        max_entries (int): The maximum number of entries kept. Default is 10000.
+        ttl (float, optional): Seconds an entry stays valid. None keeps entries until evicted. Default is 300.
+        max_bytes (int, optional): Approximate upper bound on the memory held by cached values, measured with
+            'sizeof'. None disables the bound. Default is None.
+        sizeof (callable, optional): Function estimating the size in bytes of a cached value.
+            Defaults to an estimate covering the object's attributes.
+
+    Example:
+        cache = EntityCache(max_entries=5000, ttl=60)
+        cache.put(dish.id, dish)
+        cache.get(dish.id)
+    """
+    def __init__(self, max_entries=10000, ttl=300, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof if sizeof is not None else estimate_size
+        # key -> (value, expires_at, size)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "negative_hits": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the cached value for 'key', or 'default' if it is absent or expired.
+
+        A key stored with 'MISSING' is returned as 'MISSING', meaning the record is known not to exist.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["negative_hits" if value is MISSING else "hits"] += 1
+            return value
+
+    def put(self, key, value):
+        """Store a value, evicting least-recently-used entries if the cache is over its bounds."""
+        size = self._sizeof(value) if value is not MISSING else 0
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, *keys):
+        """Drop the given keys from the cache, if present."""
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Return the hit, miss, negative-hit, eviction, expiration and invalidation counters and current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"entries": len(self._entries), "bytes": self._bytes})
+        return stats
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+
+def estimate_size(value):
+    """Approximate the memory held by a model object: the object, its attribute dict if any and the attribute values."""
+    size = sys.getsizeof(value)
+    attributes = getattr(value, "__dict__", None)
+    if attributes is not None:
+        size += sys.getsizeof(attributes)
+        values = attributes.values()
+    else:
+        # Slotted models keep their attributes inline in the object
+        values = [getattr(value, name, None) for name in getattr(type(value), "__slots__", ())]
+    for attribute in values:
+        size += sys.getsizeof(attribute)
+        if isinstance(attribute, (list, tuple, set)):
+            size += sum(sys.getsizeof(item) for item in attribute)
+    return size
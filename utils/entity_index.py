@@ -0,0 +1,129 @@
+import threading
+
+
+class EntityIndex:
+    """In-memory index of which restaurants and dishes exist in the database.
+
+    Answers "does this restaurant exist?", "does this dish exist?" and "which restaurant owns this dish?"
+    in O(1) without touching the database. It is bulk-loaded once at startup and kept current by every
+    write the DB class performs.
+
+    Attributes:
+        restaurant_dishes (dict): Restaurant IDs as keys and sets of their dish IDs as values. The keys
+            double as the set of known restaurant IDs.
+        dish_restaurant (dict): Dish IDs as keys and the ID of the restaurant they belong to as values.
+    """
+    def __init__(self):
+        self.restaurant_dishes = {}
+        self.dish_restaurant = {}
+        self._lock = threading.RLock()
+
+    def load(self, restaurant_ids, dish_rows):
+        """Replace the contents of the index in a single pass over the given rows.
+
+        Args:
+            restaurant_ids (iterable[str]): Every restaurant ID in the database.
+            dish_rows (iterable[tuple]): (dish_id, restaurant_id) pairs for every dish in the database.
+        """
+        restaurant_dishes = {}
+        # Every row carries its own copy of the restaurant ID string, share one copy per restaurant
+        # so a million dishes don't keep a million duplicate strings alive in dish_restaurant
+        canonical_ids = {}
+        for restaurant_id in restaurant_ids:
+            canonical_ids[restaurant_id] = restaurant_id
+            restaurant_dishes[restaurant_id] = set()
+
+        dish_restaurant = {}
+        for dish_id, restaurant_id in dish_rows:
+            restaurant_id = canonical_ids.setdefault(restaurant_id, restaurant_id)
+            dishes = restaurant_dishes.get(restaurant_id)
+            if dishes is None:
+                # A dish pointing at a restaurant that wasn't listed, keep it reachable anyway
+                dishes = restaurant_dishes[restaurant_id] = set()
+            dishes.add(dish_id)
+            dish_restaurant[dish_id] = restaurant_id
+
+        with self._lock:
+            # Mutate in place so references handed out earlier (e.g. DB.all_restaurants) stay valid
+            self.restaurant_dishes.clear()
+            self.restaurant_dishes.update(restaurant_dishes)
+            self.dish_restaurant.clear()
+            self.dish_restaurant.update(dish_restaurant)
+
+    def has_restaurant(self, restaurant_id) -> bool:
+        return restaurant_id in self.restaurant_dishes
+
+    def has_dish(self, dish_id) -> bool:
+        return dish_id in self.dish_restaurant
+
+    def restaurant_of(self, dish_id):
+        """Return the ID of the restaurant the dish belongs to, or None if the dish is unknown."""
+        return self.dish_restaurant.get(dish_id)
+
+    def dishes_of(self, restaurant_id):
+        """Return a copy of the set of dish IDs belonging to the restaurant (empty if it is unknown)."""
+        with self._lock:
+            return set(self.restaurant_dishes.get(restaurant_id, ()))
+
+    def add_restaurant(self, restaurant_id):
+        with self._lock:
+            self.restaurant_dishes.setdefault(restaurant_id, set())
+
+    def remove_restaurant(self, restaurant_id):
+        """Forget a restaurant and all of its dishes.
+
+        Returns:
+            set: The IDs of the dishes that were removed along with the restaurant.
+        """
+        with self._lock:
+            dish_ids = self.restaurant_dishes.pop(restaurant_id, set())
+            for dish_id in dish_ids:
+                self.dish_restaurant.pop(dish_id, None)
+            return dish_ids
+
+    def add_dish(self, dish_id, restaurant_id):
+        with self._lock:
+            self.restaurant_dishes.setdefault(restaurant_id, set()).add(dish_id)
+            self.dish_restaurant[dish_id] = restaurant_id
+
+    def add_dishes(self, dish_rows):
+        """Record many (dish_id, restaurant_id) pairs under a single lock acquisition."""
+        with self._lock:
+            for dish_id, restaurant_id in dish_rows:
+                self.restaurant_dishes.setdefault(restaurant_id, set()).add(dish_id)
+                self.dish_restaurant[dish_id] = restaurant_id
+
+    def remove_dish(self, dish_id):
+        """Forget a dish.
+
+        Returns:
+            str: The ID of the restaurant the dish belonged to, or None if the dish was unknown.
+        """
+        with self._lock:
+            restaurant_id = self.dish_restaurant.pop(dish_id, None)
+            if restaurant_id is not None:
+                self.restaurant_dishes.get(restaurant_id, set()).discard(dish_id)
+            return restaurant_id
+
+    def remove_dishes(self, dish_ids):
+        """Forget many dishes under a single lock acquisition."""
+        with self._lock:
+            for dish_id in dish_ids:
+                self.remove_dish(dish_id)
+
+    def move_dish(self, dish_id, restaurant_id):
+        """Record that a dish now belongs to a different restaurant."""
+        with self._lock:
+            self.remove_dish(dish_id)
+            self.add_dish(dish_id, restaurant_id)
+
+    def move_dishes(self, moves):
+        """Record many (dish_id, restaurant_id) moves under a single lock acquisition."""
+        with self._lock:
+            for dish_id, restaurant_id in moves:
+                self.remove_dish(dish_id)
+                self.add_dish(dish_id, restaurant_id)
+
+    def stats(self):
+        """Return the number of restaurants and dishes currently indexed."""
+        return {"restaurants": len(self.restaurant_dishes), "dishes": len(self.dish_restaurant)}
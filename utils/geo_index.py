@@ -0,0 +1,363 @@
+import threading, math
+import numpy as np
+from utils.utility import haversine_distance
+
+# Same Earth radius as utils.utility.haversine_distance, so both return identical distances
+EARTH_RADIUS_KM = 6371.0
+
+
+class LocationIndex:
+    """Restaurant coordinates kept in contiguous NumPy arrays for vectorized distance queries.
+
+    Every restaurant with a latitude and longitude occupies one slot in parallel arrays of latitudes,
+    longitudes (both in radians), cosines of the latitude and cuisine codes. Removing a restaurant moves
+    the last slot into the hole, so the live slots are always the first 'len(index)' entries and a query
+    is a handful of array operations over them.
+
+    Args:
+        capacity (int): The number of slots allocated up front. Arrays double in size when full. Default is 1024.
+        batch_size (int): The number of restaurants whose distances are computed per batch, which bounds the
+            size of the temporary arrays a query allocates. Default is 262144.
+
+    Example:
+        index = LocationIndex()
+        index.set('add3ac49-8b7a-4147-914f-3d3b9b103ed7', 42.33, -83.05, 'American')
+        index.nearest(42.3, -83.0, k=5, max_km=10)
+    """
+    def __init__(self, capacity=1024, batch_size=262144):
+        self.batch_size = batch_size
+        self._lat = np.empty(capacity, dtype=np.float64)
+        self._lon = np.empty(capacity, dtype=np.float64)
+        self._cos_lat = np.empty(capacity, dtype=np.float64)
+        self._cuisine = np.empty(capacity, dtype=np.int32)
+        self._ids = []
+        self._slots = {}
+        self._cuisine_codes = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, restaurant_id):
+        return restaurant_id in self._slots
+
+    def load(self, rows):
+        """Replace the contents of the index.
+
+        Args:
+            rows (iterable[tuple]): (restaurant_id, cuisine, latitude, longitude) tuples. Rows without
+                coordinates are skipped.
+        """
+        with self._lock:
+            self._ids = []
+            self._slots = {}
+            for restaurant_id, cuisine, latitude, longitude in rows:
+                self._set(restaurant_id, latitude, longitude, cuisine)
+
+    def set(self, restaurant_id, latitude, longitude, cuisine=None):
+        """Insert or replace a restaurant's location. A restaurant without coordinates is removed."""
+        with self._lock:
+            self._set(restaurant_id, latitude, longitude, cuisine)
+
+    def update(self, restaurant_id, **fields):
+        """Apply a partial update, e.g. update(restaurant_id, latitude=42.1, cuisine='Thai').
+
+        Only the 'latitude', 'longitude' and 'cuisine' fields are looked at, anything else is ignored.
+        Restaurants that were not indexed because they had no coordinates are left alone unless both
+        coordinates are provided.
+        """
+        if not {'latitude', 'longitude', 'cuisine'} & fields.keys():
+            return
+        with self._lock:
+            slot = self._slots.get(restaurant_id)
+            if slot is None:
+                if fields.get('latitude') is not None and fields.get('longitude') is not None:
+                    self._set(restaurant_id, fields['latitude'], fields['longitude'], fields.get('cuisine'))
+                return
+            latitude = fields['latitude'] if 'latitude' in fields else np.degrees(self._lat[slot])
+            longitude = fields['longitude'] if 'longitude' in fields else np.degrees(self._lon[slot])
+            if 'cuisine' in fields:
+                self._set(restaurant_id, latitude, longitude, fields['cuisine'])
+            else:
+                self._set(restaurant_id, latitude, longitude, None, keep_cuisine=True)
+
+    def remove(self, restaurant_id):
+        with self._lock:
+            slot = self._slots.pop(restaurant_id, None)
+            if slot is None:
+                return
+            last = len(self._ids) - 1
+            if slot != last:
+                # Move the last restaurant into the freed slot to keep the arrays contiguous
+                moved_id = self._ids[last]
+                for array in (self._lat, self._lon, self._cos_lat, self._cuisine):
+                    array[slot] = array[last]
+                self._ids[slot] = moved_id
+                self._slots[moved_id] = slot
+            self._ids.pop()
+
+    def nearest(self, latitude, longitude, k=10, max_km=None, cuisine=None):
+        """Find the k restaurants closest to a point.
+
+        Args:
+            latitude (float): Latitude of the point in degrees.
+            longitude (float): Longitude of the point in degrees.
+            k (int): The maximum number of restaurants to return. Default is 10.
+            max_km (float, optional): Ignore restaurants further away than this many kilometers.
+            cuisine (str, optional): Only consider restaurants with this cuisine (case-insensitive).
+
+        Returns:
+            list[tuple]: (restaurant_id, distance_km) pairs, closest first.
+        """
+        if k <= 0:
+            return []
+        lat1 = np.radians(float(latitude))
+        lon1 = np.radians(float(longitude))
+        cos_lat1 = np.cos(lat1)
+
+        with self._lock:
+            size = len(self._ids)
+            code = None
+            if cuisine is not None:
+                code = self._cuisine_codes.get(self._normalize_cuisine(cuisine))
+                if code is None:
+                    return []
+
+            # Rank by the haversine term 'a' rather than the distance, it is monotonic in distance
+            # and skips the square roots and arctangent for every restaurant that won't be returned
+            max_a = None
+            if max_km is not None:
+                max_a = np.sin(min(max_km / EARTH_RADIUS_KM, np.pi) / 2) ** 2
+
+            candidate_slots = []
+            candidate_a = []
+            for start in range(0, size, self.batch_size):
+                stop = min(start + self.batch_size, size)
+                a = self._haversine_a(lat1, lon1, cos_lat1, start, stop)
+                if code is not None:
+                    a[self._cuisine[start:stop] != code] = np.inf
+                if max_a is not None:
+                    a[a > max_a] = np.inf
+
+                # Keep only this batch's k best, so the final merge is over at most k * batches entries
+                if k < len(a):
+                    best = np.argpartition(a, k - 1)[:k]
+                else:
+                    best = np.arange(len(a))
+                best = best[np.isfinite(a[best])]
+                candidate_slots.append(best + start)
+                candidate_a.append(a[best])
+
+            if not candidate_slots:
+                return []
+            slots = np.concatenate(candidate_slots)
+            a = np.concatenate(candidate_a)
+            order = np.argsort(a, kind="stable")[:k]
+            distances = EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a[order]), np.sqrt(1 - a[order]))
+            return [(self._ids[slots[i]], float(distance)) for i, distance in zip(order, distances)]
+
+    def _haversine_a(self, lat1, lon1, cos_lat1, start, stop):
+        # The 'a' term of the haversine formula over a slice of the arrays, see utility.haversine_distance
+        delta_lat = self._lat[start:stop] - lat1
+        delta_lon = self._lon[start:stop] - lon1
+        a = np.sin(delta_lat / 2)
+        a *= a
+        half_lon = np.sin(delta_lon / 2)
+        half_lon *= half_lon
+        half_lon *= self._cos_lat[start:stop]
+        half_lon *= cos_lat1
+        a += half_lon
+        return a
+
+    def _set(self, restaurant_id, latitude, longitude, cuisine, keep_cuisine=False):
+        if latitude is None or longitude is None:
+            self.remove(restaurant_id)
+            return
+        slot = self._slots.get(restaurant_id)
+        if slot is None:
+            slot = len(self._ids)
+            if slot == len(self._lat):
+                self._grow()
+            self._ids.append(restaurant_id)
+            self._slots[restaurant_id] = slot
+        lat = np.radians(float(latitude))
+        self._lat[slot] = lat
+        self._lon[slot] = np.radians(float(longitude))
+        self._cos_lat[slot] = np.cos(lat)
+        if not keep_cuisine:
+            self._cuisine[slot] = self._cuisine_code(cuisine)
+
+    def _cuisine_code(self, cuisine):
+        if cuisine is None:
+            return -1
+        key = self._normalize_cuisine(cuisine)
+        return self._cuisine_codes.setdefault(key, len(self._cuisine_codes))
+
+    @staticmethod
+    def _normalize_cuisine(cuisine):
+        return str(cuisine).strip().lower()
+
+    def _grow(self):
+        capacity = max(1024, len(self._lat) * 2)
+        for name in ('_lat', '_lon', '_cos_lat', '_cuisine'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+
+class GridIndex:
+    """Restaurants bucketed into a fixed grid of latitude/longitude cells for radius and viewport queries.
+
+    A query only visits the cells overlapping its bounding box, then refines the restaurants found there
+    with the exact haversine distance, so its cost depends on how many restaurants are nearby rather than
+    on the total number of restaurants.
+
+    Args:
+        cell_size (float): The width and height of a grid cell in degrees. Default is 0.05 (about 5.5km).
+
+    Attributes:
+        ready (bool): False until the index has been loaded. Callers fall back to the database while cold.
+
+    Example:
+        grid = GridIndex()
+        grid.load(rows)
+        grid.within_radius(42.33, -83.05, radius_km=2)
+    """
+    # Kilometers per degree of latitude on a sphere with the haversine Earth radius
+    KM_PER_DEGREE = 2 * math.pi * EARTH_RADIUS_KM / 360
+
+    def __init__(self, cell_size=0.05):
+        self.cell_size = cell_size
+        self.ready = False
+        self._cells = {}
+        self._points = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._points)
+
+    def load(self, rows):
+        """Replace the contents of the index and mark it ready.
+
+        Args:
+            rows (iterable[tuple]): (restaurant_id, cuisine, latitude, longitude) tuples, the same rows
+                LocationIndex.load() takes. Rows without coordinates are skipped.
+        """
+        with self._lock:
+            self._cells = {}
+            self._points = {}
+            for restaurant_id, _, latitude, longitude in rows:
+                self._set(restaurant_id, latitude, longitude)
+            self.ready = True
+
+    def set(self, restaurant_id, latitude, longitude):
+        """Insert or move a restaurant. A restaurant without coordinates is removed."""
+        with self._lock:
+            self._set(restaurant_id, latitude, longitude)
+
+    def update(self, restaurant_id, **fields):
+        """Apply a partial update, only the 'latitude' and 'longitude' fields are looked at."""
+        if 'latitude' not in fields and 'longitude' not in fields:
+            return
+        with self._lock:
+            latitude, longitude = self._points.get(restaurant_id, (None, None))[:2]
+            self._set(restaurant_id, fields.get('latitude', latitude), fields.get('longitude', longitude))
+
+    def remove(self, restaurant_id):
+        with self._lock:
+            point = self._points.pop(restaurant_id, None)
+            if point is None:
+                return
+            cell = self._cells[point[2]]
+            cell.discard(restaurant_id)
+            if not cell:
+                del self._cells[point[2]]
+
+    def within_radius(self, latitude, longitude, radius_km):
+        """Find every restaurant within 'radius_km' kilometers of a point.
+
+        Returns:
+            list[tuple]: (restaurant_id, distance_km) pairs, closest first.
+        """
+        south, west, north, east = bounding_box(latitude, longitude, radius_km)
+        found = []
+        with self._lock:
+            for restaurant_id in self._candidates(south, west, north, east):
+                lat, lon, _ = self._points[restaurant_id]
+                distance = haversine_distance(latitude, longitude, lat, lon)
+                if distance <= radius_km:
+                    found.append((restaurant_id, distance))
+        found.sort(key=lambda pair: pair[1])
+        return found
+
+    def in_viewport(self, south, west, north, east):
+        """Find every restaurant inside a latitude/longitude rectangle.
+
+        A viewport crossing the antimeridian is given with 'west' greater than 'east'.
+
+        Returns:
+            list[str]: The IDs of the restaurants in the viewport.
+        """
+        with self._lock:
+            return [restaurant_id for restaurant_id in self._candidates(south, west, north, east)
+                    if _in_box(self._points[restaurant_id], south, west, north, east)]
+
+    def _candidates(self, south, west, north, east):
+        # Every restaurant in a cell overlapping the box, which may include some just outside it
+        if west > east:
+            yield from self._candidates(south, west, north, 180.0)
+            yield from self._candidates(south, -180.0, north, east)
+            return
+        row_range = range(self._cell_of(south), self._cell_of(north) + 1)
+        column_range = range(self._cell_of(west), self._cell_of(east) + 1)
+        if len(row_range) * len(column_range) > len(self._cells):
+            # The box covers more cells than are occupied, walk the occupied ones instead
+            for (row, column), restaurant_ids in self._cells.items():
+                if row in row_range and column in column_range:
+                    yield from restaurant_ids
+            return
+        for row in row_range:
+            for column in column_range:
+                yield from self._cells.get((row, column), ())
+
+    def _set(self, restaurant_id, latitude, longitude):
+        self.remove(restaurant_id)
+        if latitude is None or longitude is None:
+            return
+        latitude, longitude = float(latitude), float(longitude)
+        cell = (self._cell_of(latitude), self._cell_of(longitude))
+        self._points[restaurant_id] = (latitude, longitude, cell)
+        self._cells.setdefault(cell, set()).add(restaurant_id)
+
+    def _cell_of(self, degrees):
+        return math.floor(degrees / self.cell_size)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Return the (south, west, north, east) box in degrees that contains a circle on the Earth's surface.
+
+    Longitudes wrap, so 'west' is greater than 'east' when the box crosses the antimeridian. Near the
+    poles the box spans every longitude.
+    """
+    delta_lat = radius_km / GridIndex.KM_PER_DEGREE
+    south = max(-90.0, latitude - delta_lat)
+    north = min(90.0, latitude + delta_lat)
+    cos_lat = math.cos(math.radians(max(abs(south), abs(north))))
+    if north >= 90.0 or south <= -90.0 or cos_lat < 1e-9:
+        return south, -180.0, north, 180.0
+    delta_lon = delta_lat / cos_lat
+    if delta_lon >= 180.0:
+        return south, -180.0, north, 180.0
+    west = (longitude - delta_lon + 180.0) % 360.0 - 180.0
+    east = (longitude + delta_lon + 180.0) % 360.0 - 180.0
+    return south, west, north, east
+
+
+def _in_box(point, south, west, north, east):
+    latitude, longitude, _ = point
+    if not south <= latitude <= north:
+        return False
+    if west <= east:
+        return west <= longitude <= east
+    return longitude >= west or longitude <= east
@@ -0,0 +1,476 @@
+import re, time, bisect, logging, threading, functools, inspect
+from collections import deque
+from contextvars import ContextVar
+
+# The logical DB call running in the current thread or task, or None outside of one
+_current_call = ContextVar("foodpix_db_call", default=None)
+
+# Quoted literals, numbers and placeholders, the parts of a statement redact_sql() replaces with '?'
+_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|%s|\?|(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+", re.IGNORECASE)
+
+slow_query_logger = logging.getLogger("foodpix.db.slow_queries")
+
+
+@functools.lru_cache(maxsize=2048)
+def redact_sql(sql):
+    """Strip the values out of an SQL statement so it can be logged and grouped safely.
+
+    Literals, numbers and placeholders become '?', IN lists and multi-row VALUES lists collapse to one entry,
+    and whitespace is squeezed, so "... WHERE id IN (%s, %s, %s) LIMIT 51" becomes "... WHERE id IN (?) LIMIT ?".
+
+    Args:
+        sql (str): The statement as sent to the database.
+
+    Returns:
+        str: The redacted statement.
+    """
+    sql = _LITERAL.sub("?", " ".join(sql.split()))
+    sql = _IN_LIST.sub("IN (?)", sql)
+    return _VALUES_LIST.sub(r"VALUES \1", sql)
+
+
+class LatencyHistogram:
+    """Counts latencies into logarithmic buckets, 25% wide from 10 microseconds to about a minute.
+
+    Quantiles are interpolated within a bucket and clamped to the smallest and largest latency seen, so they
+    are accurate to a few percent at any count while the memory used stays constant.
+    """
+    BOUNDS = tuple(1e-5 * 1.25 ** i for i in range(71))
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Return the estimated q-quantile in seconds, e.g. quantile(0.99), or None if nothing was observed."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.BOUNDS[index - 1] if index > 0 else 0.0
+                upper = self.BOUNDS[index] if index < len(self.BOUNDS) else lower * 1.25
+                estimate = lower + (upper - lower) * (rank - seen) / count
+                return min(max(estimate, self.min), self.max)
+            seen += count
+        return self.max
+
+    def percentiles(self):
+        """Return the p50, p95 and p99 latencies in seconds as a dict."""
+        return {"p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99)}
+
+
+class CallEvent:
+    """One logical DB call, e.g. a get_dish(), as reported to listeners.
+
+    Attributes:
+        method (str): The DB method's name.
+        duration (float): Wall-clock seconds the call took. For iter_* methods, the time spent producing rows.
+        queries (int): The number of statements it executed.
+        rows (int): The number of rows its statements returned.
+        query_time (float): Seconds spent executing statements and fetching their rows.
+        acquire_time (float): Seconds spent waiting for pooled connections.
+        connections_opened (int): New database connections opened during the call.
+        error (str): The class name of the exception the call raised, or None.
+    """
+    __slots__ = ("method", "duration", "queries", "rows", "query_time", "acquire_time", "connections_opened", "error")
+    kind = "call"
+
+    def __init__(self, method):
+        self.method = method
+        self.duration = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.query_time = 0.0
+        self.acquire_time = 0.0
+        self.connections_opened = 0
+        self.error = None
+
+
+class QueryEvent:
+    """One executed statement, as reported to listeners.
+
+    Attributes:
+        method (str): The DB method that issued it, or None for statements run outside one, e.g. through
+            db.connection() directly.
+        sql (str): The statement with every value redacted, see redact_sql().
+        parameter_count (int): The number of bound parameters, or of parameter rows for executemany.
+        duration (float): Seconds spent executing it and fetching its rows.
+        rows (int): The number of rows fetched from it.
+    """
+    __slots__ = ("method", "sql", "parameter_count", "duration", "rows")
+    kind = "query"
+
+    def __init__(self, method, sql, parameter_count):
+        self.method = method
+        self.sql = sql
+        self.parameter_count = parameter_count
+        self.duration = 0.0
+        self.rows = 0
+
+
+class Instrumentation:
+    """Measures the calls a DB instance serves and the statements and connections behind them.
+
+    Attach one to a DB with DB(..., instrumentation=Instrumentation()) or by assigning 'db.instrumentation'.
+    Every public DB method then reports a CallEvent, and every statement it executes a QueryEvent, to each
+    listener. Call and statement latencies are kept in per-method histograms for summary() and
+    prometheus_text(), and statements slower than 'slow_query_threshold' are logged. A DB without
+    instrumentation pays one attribute check per call.
+
+    Args:
+        listeners (iterable[callable], optional): Functions called with every CallEvent and QueryEvent.
+            Exceptions raised by a listener are logged and otherwise ignored.
+        slow_query_threshold (float, optional): Seconds at or above which a statement is logged to the
+            'foodpix.db.slow_queries' logger and kept in 'slow_queries'. None disables the slow-query log.
+        slow_query_log_size (int): The number of recent slow statements kept in 'slow_queries'. Default is 100.
+
+    Attributes:
+        slow_queries (deque[QueryEvent]): The most recent slow statements, oldest first.
+
+    Example:
+        instrumentation = Instrumentation(listeners=[print], slow_query_threshold=0.1)
+        db = DB("127.0.0.1", "foodpix_db", "test_user", "test_password", instrumentation=instrumentation)
+        db.get_dish(dish_id)
+        print(instrumentation.prometheus_text())
+    """
+    def __init__(self, listeners=None, slow_query_threshold=None, slow_query_log_size=100):
+        self.listeners = list(listeners or [])
+        self.slow_query_threshold = slow_query_threshold
+        self.slow_queries = deque(maxlen=slow_query_log_size)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear every histogram, counter and the slow-query log."""
+        with self._lock:
+            self._call_latency = {}
+            self._query_latency = {}
+            self._acquire_latency = LatencyHistogram()
+            self._counters = {}
+            self.slow_queries.clear()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def call(self, method, function, args, kwargs):
+        # Run one logical call with its measurements collected in a CallEvent. Generators returned by the
+        # iter_* methods are measured while they produce rows rather than when they are created.
+        event = CallEvent(method)
+        token = _current_call.set(event)
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except BaseException as e:
+            event.error = type(e).__name__
+            raise
+        finally:
+            event.duration = time.perf_counter() - start
+            _current_call.reset(token)
+            if event.error is not None:
+                self._finish_call(event)
+        if inspect.isgenerator(result):
+            return self._measure_generator(event, result)
+        self._finish_call(event)
+        return result
+
+    def _measure_generator(self, event, generator):
+        try:
+            while True:
+                token = _current_call.set(event)
+                start = time.perf_counter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                except BaseException as e:
+                    event.error = type(e).__name__
+                    raise
+                finally:
+                    event.duration += time.perf_counter() - start
+                    _current_call.reset(token)
+                yield item
+        finally:
+            generator.close()
+            self._finish_call(event)
+
+    def connection_opened(self, seconds):
+        """Record that a new database connection was opened, taking 'seconds'."""
+        event = _current_call.get()
+        if event is not None:
+            event.connections_opened += 1
+        with self._lock:
+            self._count("connections_opened", None)
+            self._count("connect_seconds", None, seconds)
+
+    def connection_acquired(self, seconds):
+        """Record 'seconds' spent waiting for a pooled connection."""
+        event = _current_call.get()
+        if event is not None:
+            event.acquire_time += seconds
+        with self._lock:
+            self._acquire_latency.observe(seconds)
+
+    def wrap(self, conn):
+        """Wrap a connection so the statements run on it are measured."""
+        return InstrumentedConnection(conn, self)
+
+    def _finish_query(self, query, event):
+        if event is not None:
+            event.queries += 1
+            event.rows += query.rows
+            event.query_time += query.duration
+        with self._lock:
+            histogram = self._query_latency.get(query.method)
+            if histogram is None:
+                histogram = self._query_latency[query.method] = LatencyHistogram()
+            histogram.observe(query.duration)
+            self._count("rows", query.method, query.rows)
+            slow = self.slow_query_threshold is not None and query.duration >= self.slow_query_threshold
+            if slow:
+                self._count("slow_queries", query.method)
+                self.slow_queries.append(query)
+        if slow:
+            slow_query_logger.warning("Slow query in %s: %.1f ms, %d rows: %s", query.method or "-",
+                                      query.duration * 1000, query.rows, query.sql)
+        self._notify(query)
+
+    def _finish_call(self, event):
+        with self._lock:
+            histogram = self._call_latency.get(event.method)
+            if histogram is None:
+                histogram = self._call_latency[event.method] = LatencyHistogram()
+            histogram.observe(event.duration)
+            if event.error is not None:
+                self._count("errors", event.method)
+        self._notify(event)
+
+    def _count(self, name, method, amount=1):
+        # Called with the lock held
+        key = (name, method)
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def _notify(self, event):
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception:
+                logging.getLogger(__name__).exception("Instrumentation listener %r failed", listener)
+
+    def summary(self):
+        """Return the per-method figures collected so far.
+
+        Returns:
+            dict: Method names as keys. Each value holds the number of calls, their p50, p95 and p99 latency in
+            seconds, the statements they executed, the rows those returned, slow statements and errors.
+        """
+        with self._lock:
+            methods = {}
+            for method, histogram in self._call_latency.items():
+                methods[method] = {"calls": histogram.count, **histogram.percentiles(),
+                                   "queries": self._query_latency[method].count if method in self._query_latency else 0,
+                                   "rows": self._counters.get(("rows", method), 0),
+                                   "slow_queries": self._counters.get(("slow_queries", method), 0),
+                                   "errors": self._counters.get(("errors", method), 0)}
+            return methods
+
+    def prometheus_text(self, prefix="foodpix_db"):
+        """Render the histograms and counters in the Prometheus text exposition format.
+
+        Latencies are exported as summaries with the 0.5, 0.95 and 0.99 quantiles, labelled by DB method.
+
+        Args:
+            prefix (str): Prepended to every metric name. Default is "foodpix_db".
+
+        Returns:
+            str: The metrics, ready to be served from a /metrics endpoint.
+        """
+        lines = []
+        def summary(name, help_text, histograms):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} summary")
+            for labels, histogram in histograms:
+                label_text = ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels)
+                for q in (0.5, 0.95, 0.99):
+                    quantile = histogram.quantile(q)
+                    lines.append(f'{prefix}_{name}{{{label_text + "," if label_text else ""}quantile="{q}"}} '
+                                 f'{quantile if quantile is not None else "NaN"}')
+                suffix = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{prefix}_{name}_sum{suffix} {histogram.sum}")
+                lines.append(f"{prefix}_{name}_count{suffix} {histogram.count}")
+        def counter(name, help_text, counter_name, methods):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for method in methods:
+                value = self._counters.get((counter_name, method), 0)
+                lines.append(f'{prefix}_{name}{{method="{_escape_label(method or "")}"}} {value}')
+
+        with self._lock:
+            summary("call_duration_seconds", "Wall-clock time of DB method calls.",
+                    [((("method", method),), histogram) for method, histogram in sorted(self._call_latency.items())])
+            summary("query_duration_seconds", "Time spent executing statements and fetching their rows.",
+                    [((("method", method or ""),), histogram)
+                     for method, histogram in sorted(self._query_latency.items(), key=lambda item: item[0] or "")])
+            summary("connection_acquire_seconds", "Time spent waiting for a pooled connection.",
+                    [((), self._acquire_latency)])
+            query_methods = sorted(self._query_latency, key=lambda method: method or "")
+            counter("rows_total", "Rows returned by statements.", "rows", query_methods)
+            counter("slow_queries_total", "Statements at or above the slow-query threshold.", "slow_queries", query_methods)
+            counter("errors_total", "DB method calls that raised an exception.", "errors", sorted(self._call_latency))
+            lines.append(f"# HELP {prefix}_connections_opened_total New database connections opened.")
+            lines.append(f"# TYPE {prefix}_connections_opened_total counter")
+            lines.append(f"{prefix}_connections_opened_total {self._counters.get(('connections_opened', None), 0)}")
+            lines.append(f"# HELP {prefix}_connection_open_seconds_total Time spent opening new database connections.")
+            lines.append(f"# TYPE {prefix}_connection_open_seconds_total counter")
+            lines.append(f"{prefix}_connection_open_seconds_total {self._counters.get(('connect_seconds', None), 0)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def instrumented(method):
+    """Mark a DB method as one logical call for the instance's Instrumentation, if it has one.
+
+    Calls made from inside another instrumented call are counted as part of the outer one.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        instrumentation = self.instrumentation
+        if instrumentation is None or _current_call.get() is not None:
+            return method(self, *args, **kwargs)
+        return instrumentation.call(name, method, (self, *args), kwargs)
+    return wrapper
+
+
+class InstrumentedConnection:
+    """A connection whose cursors report every statement to an Instrumentation."""
+    def __init__(self, conn, instrumentation):
+        self.raw_connection = conn
+        self._instrumentation = instrumentation
+        self._cursors = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = InstrumentedCursor(self.raw_connection.cursor(*args, **kwargs), self._instrumentation)
+        self._cursors.append(cursor)
+        return cursor
+
+    def track(self, cursor):
+        """Wrap a cursor that was opened on the underlying connection, e.g. a cached prepared statement."""
+        cursor = InstrumentedCursor(cursor, self._instrumentation)
+        self._cursors.append(cursor)
+        return cursor
+
+    def finish(self):
+        """Report the statements still pending on this connection's cursors and return the wrapped connection."""
+        for cursor in self._cursors:
+            cursor._finish()
+        self._cursors = []
+        return self.raw_connection
+
+    def __getattr__(self, name):
+        return getattr(self.raw_connection, name)
+
+
+class InstrumentedCursor:
+    """A cursor that times each statement, counts the rows fetched from it and reports it once it is done."""
+    def __init__(self, cursor, instrumentation):
+        self._cursor = cursor
+        self._instrumentation = instrumentation
+        self._query = None
+        self._call = None
+
+    def execute(self, query, parameters=None):
+        self._start(query, len(parameters) if parameters else 0)
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(query, parameters) if parameters is not None else self._cursor.execute(query)
+        finally:
+            self._query.duration += time.perf_counter() - start
+
+    def executemany(self, query, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        self._start(query, len(seq_of_parameters))
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, seq_of_parameters)
+        finally:
+            self._query.duration += time.perf_counter() - start
+
+    def fetchone(self):
+        row = self._timed(self._cursor.fetchone)
+        if row is not None and self._query is not None:
+            self._query.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._timed(self._cursor.fetchmany, *args, **kwargs)
+        if self._query is not None:
+            self._query.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(self._cursor.fetchall)
+        if self._query is not None:
+            self._query.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self):
+        self._finish()
+        self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, function, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            if self._query is not None:
+                self._query.duration += time.perf_counter() - start
+
+    def _start(self, query, parameter_count):
+        self._finish()
+        self._call = _current_call.get()
+        self._query = QueryEvent(self._call.method if self._call is not None else None, redact_sql(query), parameter_count)
+
+    def _finish(self):
+        if self._query is not None:
+            query, self._query = self._query, None
+            self._instrumentation._finish_query(query, self._call)
@@ -1,4 +1,6 @@
 import mysql.connector
+from utils.backends import MySQLBackend
+from utils.migrations import migrate
 
 # Higher-privileged credentials for initial setup (sample root and root password for MySQL-- can be replaced with admin username and password)
 setup_user = "root"
@@ -37,40 +39,10 @@ setup_cursor.execute(f"GRANT ALL PRIVILEGES ON {database_name}.* TO '{app_user}'
 setup_cursor.execute(f"GRANT ALL PRIVILEGES ON {app_database}.* TO '{app_user}'@'127.0.0.1'")
 setup_cursor.execute("FLUSH PRIVILEGES")
 
-# Create the necessary tables
-setup_cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        id CHAR(36) PRIMARY KEY,
-        username VARCHAR(255) NOT NULL,
-        password VARCHAR(255) NOT NULL
-    )
-''')
-
-setup_cursor.execute('''
-    CREATE TABLE IF NOT EXISTS restaurants (
-        id CHAR(36) PRIMARY KEY,
-        restaurant_name VARCHAR(255) NOT NULL,
-        address VARCHAR(255) NOT NULL,
-        cuisine VARCHAR(255) NOT NULL,
-        latitude FLOAT,
-        longitude FLOAT,
-        user_id CHAR(36),
-        FOREIGN KEY (user_id) REFERENCES users (id)
-    )
-''')
-
-setup_cursor.execute('''
-    CREATE TABLE IF NOT EXISTS dishes (
-        id CHAR(36) PRIMARY KEY,
-        restaurant_id CHAR(36) NOT NULL,
-        dish_name VARCHAR(255) NOT NULL,
-        image_url VARCHAR(255),
-        date DATE,
-        stars INT,
-        dietary_restrictions TEXT,
-        FOREIGN KEY (restaurant_id) REFERENCES restaurants (id)
-    )
-''')
+# Create the necessary tables and indexes with the same migrations the DB class applies, so the two never
+# drift apart. Run this from the repository root as "python -m utils.manual_setup".
+for version, description, seconds in migrate(setup_cursor, MySQLBackend("127.0.0.1", app_database)):
+    print(f"Migration {version}: {description} ({seconds:.3f}s)")
 
 # Commit the changes and close the connection
 setup_conn.commit()
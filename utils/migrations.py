@@ -0,0 +1,174 @@
+import datetime, time
+
+
+class Migration:
+    """One schema change, identified by its version number.
+
+    Every step is idempotent: it creates tables, columns and indexes only if they are missing, so it is safe
+    to run against a database that was set up by hand, by an older release, or by another process racing
+    this one.
+    """
+    __slots__ = ("version", "description", "apply")
+
+    def __init__(self, version, description, apply):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+# Every migration, in the order they are applied
+MIGRATIONS = []
+
+
+def migration(version, description):
+    # Register the decorated function as the step bringing the schema to 'version'
+    def register(apply):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"Migration {version} is out of order")
+        MIGRATIONS.append(Migration(version, description, apply))
+        return apply
+    return register
+
+
+@migration(1, "Create the users, restaurants, dishes and dietary_tags tables")
+def _create_tables(cursor, backend):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id CHAR(36) PRIMARY KEY,
+            username VARCHAR(255) NOT NULL,
+            password VARCHAR(255) NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS restaurants (
+            id CHAR(36) PRIMARY KEY,
+            restaurant_name VARCHAR(255) NOT NULL,
+            address VARCHAR(255) NOT NULL,
+            cuisine VARCHAR(255) NOT NULL,
+            latitude FLOAT,
+            longitude FLOAT,
+            dish_ids TEXT,
+            user_id CHAR(36),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dishes (
+            id CHAR(36) PRIMARY KEY,
+            restaurant_id CHAR(36) NOT NULL,
+            dish_name VARCHAR(255) NOT NULL,
+            image_url VARCHAR(255),
+            date DATE,
+            stars INT,
+            dietary_restrictions TEXT,
+            dietary_mask BIGINT NOT NULL DEFAULT 0,
+            FOREIGN KEY (restaurant_id) REFERENCES restaurants (id)
+        )
+    ''')
+    # The registry of the bit assigned to each dietary tag
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dietary_tags (
+            bit INT PRIMARY KEY,
+            tag VARCHAR(64) NOT NULL UNIQUE
+        )
+    ''')
+
+
+@migration(2, "Add restaurants.dish_ids, maintained by every dish write")
+def _add_dish_ids(cursor, backend):
+    # Tables created before the column was part of the DDL lack it
+    backend.add_column(cursor, "restaurants", "dish_ids", "TEXT")
+
+
+@migration(3, "Add dishes.dietary_mask, the bitmask encoding of dietary_restrictions")
+def _add_dietary_mask(cursor, backend):
+    # DB.load_index() backfills the mask of rows written before the column existed
+    backend.add_column(cursor, "dishes", "dietary_mask", "BIGINT NOT NULL DEFAULT 0")
+
+
+# (index name, table, columns, why) of the secondary indexes built by migrations 4 and 5
+INDEXES = [
+    ("idx_dishes_restaurant_date", "dishes", "restaurant_id, date, id",
+     "dishes of a restaurant, in date order; the prefix also serves the foreign key"),
+    ("idx_dishes_date", "dishes", "date, id", "date ranges and the date orders of the dish listings"),
+    ("idx_restaurants_lat_lon", "restaurants", "latitude, longitude", "bounding-box prefilter of radius and viewport queries"),
+    ("idx_users_username", "users", "username", "the user lookup of every login"),
+    ("idx_dishes_stars", "dishes", "stars, id", "star filters and the star orders of the dish listings"),
+    ("idx_restaurants_cuisine", "restaurants", "cuisine", "cuisine filters"),
+    ("idx_restaurants_user_id", "restaurants", "user_id", "a user's restaurants; SQLite doesn't index foreign keys"),
+]
+
+
+@migration(4, "Index dishes by restaurant and date, restaurants by location and users by name")
+def _index_hot_lookups(cursor, backend):
+    for index_name, table_name, columns, _ in INDEXES[:4]:
+        backend.create_index(cursor, index_name, table_name, columns, online=True)
+
+
+@migration(5, "Index dishes by stars and restaurants by cuisine and user")
+def _index_filters(cursor, backend):
+    for index_name, table_name, columns, _ in INDEXES[4:]:
+        backend.create_index(cursor, index_name, table_name, columns, online=True)
+
+
+@migration(6, "Create the changes table, the feed other processes apply to their in-memory indexes")
+def _create_changes(cursor, backend):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS changes (
+            seq {backend.sequence_key},
+            table_name VARCHAR(16) NOT NULL,
+            record_id CHAR(36) NOT NULL,
+            operation VARCHAR(8) NOT NULL,
+            origin CHAR(36) NOT NULL
+        )
+    ''')
+
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def schema_version(cursor):
+    """Return the version the database's schema has been migrated to, 0 if it never was."""
+    cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INT PRIMARY KEY, description VARCHAR(255) NOT NULL, "
+                   "applied_at VARCHAR(32) NOT NULL, seconds FLOAT NOT NULL)")
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    row = cursor.fetchone()
+    return row[0] if row and row[0] is not None else 0
+
+
+def migrate(cursor, backend, target_version=None):
+    """Apply every migration newer than the database's schema version, up to 'target_version', in order.
+
+    Each applied step is recorded in the 'schema_version' table with the time it took. Index builds use the
+    backend's online DDL where it has one, so reads and writes carry on while a large table is indexed.
+
+    Args:
+        cursor: A cursor on an autocommit connection.
+        backend (MySQLBackend or SQLiteBackend): Handles the SQL dialect differences.
+        target_version (int, optional): The version to stop at. Default is None (the latest).
+
+    Returns:
+        list[tuple]: (version, description, seconds) of each step applied, empty if the schema was current.
+
+    Example:
+        with db.connection() as conn:
+            for version, description, seconds in migrate(conn.cursor(), db.backend):
+                print(version, description, f"{seconds:.3f}s")
+    """
+    target_version = LATEST_VERSION if target_version is None else target_version
+    current = schema_version(cursor)
+    applied = []
+    for step in MIGRATIONS:
+        if step.version <= current or step.version > target_version:
+            continue
+        start = time.perf_counter()
+        step.apply(cursor, backend)
+        seconds = time.perf_counter() - start
+        try:
+            cursor.execute("INSERT INTO schema_version (version, description, applied_at, seconds) VALUES (%s, %s, %s, %s)",
+                           (step.version, step.description, datetime.datetime.now().isoformat(timespec="seconds"), seconds))
+        except backend.IntegrityError:
+            # Another process applied the same step concurrently, which is harmless since steps are idempotent
+            pass
+        applied.append((step.version, step.description, seconds))
+    return applied
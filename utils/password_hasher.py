@@ -0,0 +1,71 @@
+import asyncio, os, threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+def _hash_password(password, method):
+    # Runs in a worker process, so it must be a picklable module-level function
+    if method is None:
+        return generate_password_hash(password)
+    return generate_password_hash(password, method=method)
+
+
+def _check_password(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a bounded pool of worker processes.
+
+    Password hashes are deliberately slow, so running them on the thread serving a request lets a burst of
+    logins or signups hold every worker thread. The hasher sends that work to at most 'max_workers'
+    processes instead, off the GIL and the event loop, and any further calls queue up for a free process.
+    The blocking methods suit threaded callers; the '_async' coroutines await the result without blocking
+    the event loop. The processes are started on first use.
+
+    Args:
+        max_workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        method (str, optional): The werkzeug hash method, which sets the hash cost of new hashes, e.g.
+            "pbkdf2:sha256:600000" or "scrypt:32768:8:1". Existing hashes are verified with the method they
+            were created with. Default is None (werkzeug's default).
+
+    Example:
+        hasher = PasswordHasher(max_workers=4)
+        password_hash = hasher.hash("hunter2")
+        ok = await hasher.verify_async(password_hash, "hunter2")
+        hasher.close()
+    """
+    def __init__(self, max_workers=None, method=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.method = method
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def hash(self, password):
+        """Return the hash of 'password', blocking until a worker process has computed it."""
+        return self._pool().submit(_hash_password, password, self.method).result()
+
+    def verify(self, password_hash, password):
+        """Return True if 'password' matches 'password_hash', blocking until a worker process has checked it."""
+        return self._pool().submit(_check_password, password_hash, password).result()
+
+    async def hash_async(self, password):
+        """Coroutine version of hash()."""
+        return await asyncio.wrap_future(self._pool().submit(_hash_password, password, self.method))
+
+    async def verify_async(self, password_hash, password):
+        """Coroutine version of verify()."""
+        return await asyncio.wrap_future(self._pool().submit(_check_password, password_hash, password))
+
+    def close(self):
+        """Stop the worker processes. They are started again if the hasher is used afterwards."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -0,0 +1,172 @@
+import threading
+
+
+class _Summary:
+    __slots__ = ("dish_count", "star_sum", "histogram", "latest_date")
+
+    def __init__(self):
+        self.dish_count = 0
+        self.star_sum = 0
+        self.histogram = {}
+        self.latest_date = None
+
+    def to_dict(self):
+        rated = sum(self.histogram.values())
+        return {
+            "dish_count": self.dish_count,
+            "rated_dishes": rated,
+            "average_stars": self.star_sum / rated if rated else None,
+            "star_histogram": dict(sorted(self.histogram.items())),
+            "latest_date": self.latest_date,
+        }
+
+
+class RestaurantStats:
+    """Per-restaurant dish count, star sum, star histogram and latest dish date, kept current incrementally.
+
+    Every dish write the DB class performs adds or removes the dish's contribution, so reading a restaurant's
+    stats is a dictionary lookup instead of a pass over its dishes. Dates are compared as strings, which
+    orders them correctly in the YYYY-MM-DD format the dishes table uses. Removing the dish holding the
+    latest date can't tell what the next latest date is, so remove() reports it and the caller looks it up
+    with set_latest_date().
+
+    Example:
+        stats = RestaurantStats()
+        stats.load(rows)  # (restaurant_id, stars, dish_count, latest_date), one row per restaurant and rating
+        stats.add(dish.restaurant_id, dish.stars, dish.date)
+        stats.get(dish.restaurant_id)["average_stars"]
+    """
+    def __init__(self):
+        self._summaries = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._summaries)
+
+    def load(self, rows):
+        """Replace the contents of the index.
+
+        Args:
+            rows (iterable[tuple]): (restaurant_id, stars, dish_count, latest_date) rows, as returned by
+                "SELECT restaurant_id, stars, COUNT(*), MAX(date) FROM dishes GROUP BY restaurant_id, stars".
+        """
+        summaries = self._build(rows)
+        with self._lock:
+            self._summaries = summaries
+
+    def replace(self, restaurant_ids, rows):
+        """Replace the stats of some restaurants, e.g. after another process changed their dishes.
+
+        Args:
+            restaurant_ids (iterable[str]): The restaurants to replace. Those without rows are dropped.
+            rows (iterable[tuple]): Their rows, in the format load() takes.
+        """
+        summaries = self._build(rows)
+        with self._lock:
+            for restaurant_id in restaurant_ids:
+                summary = summaries.get(restaurant_id)
+                if summary is None:
+                    self._summaries.pop(restaurant_id, None)
+                else:
+                    self._summaries[restaurant_id] = summary
+
+    @staticmethod
+    def _build(rows):
+        summaries = {}
+        for restaurant_id, stars, dish_count, latest_date in rows:
+            summary = summaries.get(restaurant_id)
+            if summary is None:
+                summary = summaries[restaurant_id] = _Summary()
+            summary.dish_count += dish_count
+            if stars is not None:
+                summary.star_sum += stars * dish_count
+                summary.histogram[stars] = summary.histogram.get(stars, 0) + dish_count
+            if latest_date is not None and (summary.latest_date is None or latest_date > summary.latest_date):
+                summary.latest_date = latest_date
+        return summaries
+
+    def add(self, restaurant_id, stars, date):
+        """Count a new dish."""
+        with self._lock:
+            summary = self._summaries.get(restaurant_id)
+            if summary is None:
+                summary = self._summaries[restaurant_id] = _Summary()
+            summary.dish_count += 1
+            if stars is not None:
+                stars = int(stars)
+                summary.star_sum += stars
+                summary.histogram[stars] = summary.histogram.get(stars, 0) + 1
+            if date is not None and (summary.latest_date is None or date > summary.latest_date):
+                summary.latest_date = date
+
+    def remove(self, restaurant_id, stars, date):
+        """Stop counting a dish.
+
+        Returns:
+            bool: True if the dish held the restaurant's latest date, which then has to be looked up again.
+        """
+        with self._lock:
+            summary = self._summaries.get(restaurant_id)
+            if summary is None:
+                return False
+            summary.dish_count -= 1
+            if stars is not None:
+                stars = int(stars)
+                summary.star_sum -= stars
+                remaining = summary.histogram.get(stars, 0) - 1
+                if remaining > 0:
+                    summary.histogram[stars] = remaining
+                else:
+                    summary.histogram.pop(stars, None)
+            if summary.dish_count <= 0:
+                del self._summaries[restaurant_id]
+                return False
+            return date is not None and date == summary.latest_date
+
+    def set_latest_date(self, restaurant_id, date):
+        with self._lock:
+            summary = self._summaries.get(restaurant_id)
+            if summary is not None:
+                summary.latest_date = date
+
+    def remove_restaurant(self, restaurant_id):
+        with self._lock:
+            self._summaries.pop(restaurant_id, None)
+
+    def bounds(self, restaurant_id):
+        """Return (highest star rating, latest date) over the restaurant's dishes, or None without dishes.
+
+        Either value is None when no dish has one. Used to skip restaurants none of whose dishes can rank.
+        """
+        with self._lock:
+            summary = self._summaries.get(restaurant_id)
+            if summary is None:
+                return None
+            return max(summary.histogram) if summary.histogram else None, summary.latest_date
+
+    def get(self, restaurant_id):
+        """Return the restaurant's stats as a dict, all zero for a restaurant without dishes.
+
+        The keys are 'dish_count', 'rated_dishes' (dishes with a star rating), 'average_stars' (None without
+        ratings), 'star_histogram' (stars -> number of dishes) and 'latest_date' (None without dated dishes).
+        """
+        with self._lock:
+            summary = self._summaries.get(restaurant_id)
+            return summary.to_dict() if summary is not None else _Summary().to_dict()
+
+    def diff(self, rows):
+        """Compare the index against freshly aggregated rows, in the format load() takes.
+
+        Returns:
+            dict: Restaurant IDs whose stats differ, mapped to (indexed stats, actual stats).
+        """
+        actual = self._build(rows)
+        with self._lock:
+            restaurant_ids = self._summaries.keys() | actual.keys()
+            drift = {}
+            for restaurant_id in restaurant_ids:
+                indexed_stats = self.get(restaurant_id)
+                actual_stats = actual[restaurant_id].to_dict() if restaurant_id in actual else _Summary().to_dict()
+                if indexed_stats != actual_stats:
+                    drift[restaurant_id] = (indexed_stats, actual_stats)
+            return drift
@@ -0,0 +1,283 @@
+import re, math, threading, unicodedata
+from array import array
+import numpy as np
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Split text into lowercase, accent-folded word tokens, e.g. "Crème Brûlée" -> ["creme", "brulee"]."""
+    if not text:
+        return []
+    text = str(text).lower()
+    if not text.isascii():
+        text = "".join(char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char))
+    return _TOKEN.findall(text)
+
+
+class SearchIndex:
+    """In-process inverted index ranked with Okapi BM25.
+
+    Each document is identified by a hashable key, e.g. ('dishes', dish_id), and given a document number.
+    Every term keeps its postings as two compact arrays, document numbers and term frequencies, so a query
+    scores all the postings of its terms with a few NumPy operations. Removing or replacing a document only
+    marks its number dead; dead postings are skipped when scoring and dropped by compact(), which runs
+    automatically once more than half of the document numbers are dead.
+
+    Args:
+        k1 (float): BM25 term-frequency saturation. Default is 1.2.
+        b (float): BM25 document-length normalization. Default is 0.75.
+
+    Example:
+        index = SearchIndex()
+        index.add(('dishes', dish.id), dish.dish_name)
+        index.search("chicken wrap", limit=10)
+    """
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.clear()
+
+    def __len__(self):
+        return len(self._docnos)
+
+    def __contains__(self, key):
+        return key in self._docnos
+
+    def clear(self):
+        with self._lock:
+            # term -> (array of document numbers, array of term frequencies), or (document number, term frequency)
+            # for a term found in a single document, which saves two array objects for each of the many rare terms
+            self._postings = {}
+            self._docnos = {}
+            self._keys = []
+            self._kinds = {}
+            self._kind_codes = array('B')
+            self._lengths = array('I')
+            self._alive = bytearray()
+            self._total_length = 0
+
+    def load(self, documents):
+        """Replace the contents of the index.
+
+        Postings are collected for every document first and then grouped by term with NumPy, which is much
+        faster than adding the documents one at a time.
+
+        Args:
+            documents (iterable[tuple]): (key, text) pairs. If the key is a tuple, its first item is the
+                document's kind, which search() can filter on. If a key repeats, the last text wins.
+        """
+        keys, lengths, kind_codes, kinds = [], array('I'), array('B'), {}
+        term_ids, posting_terms = {}, array('I')
+        for key, text in documents:
+            terms = tokenize(text)
+            keys.append(key)
+            lengths.append(len(terms))
+            kind_codes.append(kinds.setdefault(key[0] if isinstance(key, tuple) else None, len(kinds)))
+            posting_terms.extend([term_ids.setdefault(term, len(term_ids)) for term in terms])
+
+        # Terms were appended in document order, so each posting's document number follows from the lengths
+        posting_docs = np.repeat(np.arange(len(keys), dtype=np.int64), np.frombuffer(lengths, dtype=np.uint32))
+        combined, frequencies = np.unique(np.frombuffer(posting_terms, dtype=np.uint32).astype(np.int64) * max(len(keys), 1)
+                                          + posting_docs, return_counts=True)
+        terms_sorted = combined // max(len(keys), 1)
+        docs_sorted = (combined % max(len(keys), 1)).astype(np.uint32)
+        frequencies = np.minimum(frequencies, 65535).astype(np.uint16)
+        boundaries = np.flatnonzero(np.diff(terms_sorted)) + 1
+        starts = np.concatenate(([0], boundaries)).tolist()
+        ends = np.concatenate((boundaries, [len(combined)])).tolist()
+        term_list = list(term_ids)
+        postings = {}
+        if len(combined):
+            docs_list, frequencies_list = docs_sorted.tolist(), frequencies.tolist()
+            for term_id, start, end in zip(terms_sorted[starts].tolist(), starts, ends):
+                if end - start == 1:
+                    postings[term_list[term_id]] = (docs_list[start], frequencies_list[start])
+                else:
+                    postings[term_list[term_id]] = (array('I', docs_sorted[start:end].tobytes()),
+                                                    array('H', frequencies[start:end].tobytes()))
+
+        docnos = {key: docno for docno, key in enumerate(keys)}
+        alive = bytearray(b"\x01" * len(keys))
+        if len(docnos) < len(keys):
+            # Only the last occurrence of a repeated key stays live
+            for docno, key in enumerate(keys):
+                if docnos[key] != docno:
+                    alive[docno] = 0
+
+        with self._lock:
+            self._postings = postings
+            self._docnos = docnos
+            self._keys = keys
+            self._kinds = kinds
+            self._kind_codes = kind_codes
+            self._lengths = lengths
+            self._alive = alive
+            self._total_length = sum(lengths[docno] for docno in docnos.values())
+
+    def add(self, key, text):
+        """Insert a document, replacing any document with the same key."""
+        with self._lock:
+            self._add(key, text)
+            self._maybe_compact()
+
+    def add_many(self, documents):
+        with self._lock:
+            for key, text in documents:
+                self._add(key, text)
+            self._maybe_compact()
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+            self._maybe_compact()
+
+    def remove_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+            self._maybe_compact()
+
+    def _add(self, key, text):
+        self._remove(key)
+        terms = tokenize(text)
+        docno = len(self._keys)
+        kind = key[0] if isinstance(key, tuple) else None
+        self._keys.append(key)
+        self._kind_codes.append(self._kinds.setdefault(kind, len(self._kinds)))
+        self._lengths.append(len(terms))
+        self._alive.append(1)
+        self._docnos[key] = docno
+        self._total_length += len(terms)
+
+        frequencies = {}
+        for term in terms:
+            frequencies[term] = frequencies.get(term, 0) + 1
+        for term, frequency in frequencies.items():
+            frequency = min(frequency, 65535)
+            postings = self._postings.get(term)
+            if postings is None:
+                self._postings[term] = (docno, frequency)
+                continue
+            if isinstance(postings[0], int):
+                postings = self._postings[term] = (array('I', [postings[0]]), array('H', [postings[1]]))
+            postings[0].append(docno)
+            postings[1].append(frequency)
+
+    def _remove(self, key):
+        docno = self._docnos.pop(key, None)
+        if docno is not None:
+            self._alive[docno] = 0
+            self._total_length -= self._lengths[docno]
+
+    def _maybe_compact(self):
+        if len(self._keys) > 1024 and len(self._docnos) < len(self._keys) // 2:
+            self.compact()
+
+    def compact(self):
+        """Drop dead documents and renumber the live ones, shrinking every postings array."""
+        with self._lock:
+            alive = np.frombuffer(bytes(self._alive), dtype=np.uint8).astype(bool)
+            renumber = np.cumsum(alive, dtype=np.int64) - 1
+            postings = {}
+            for term, (docnos, frequencies) in self._postings.items():
+                if isinstance(docnos, int):
+                    if alive[docnos]:
+                        postings[term] = (int(renumber[docnos]), frequencies)
+                    continue
+                docnos = np.frombuffer(docnos, dtype=np.uint32)
+                keep = alive[docnos]
+                if keep.any():
+                    postings[term] = (array('I', renumber[docnos[keep]].astype(np.uint32).tobytes()),
+                                      array('H', np.frombuffer(frequencies, dtype=np.uint16)[keep].tobytes()))
+            self._postings = postings
+            self._keys = [key for key, live in zip(self._keys, self._alive) if live]
+            self._kind_codes = array('B', np.frombuffer(self._kind_codes, dtype=np.uint8)[alive].tobytes())
+            self._lengths = array('I', np.frombuffer(self._lengths, dtype=np.uint32)[alive].tobytes())
+            self._alive = bytearray(b"\x01" * len(self._keys))
+            self._docnos = {key: docno for docno, key in enumerate(self._keys)}
+
+    def search(self, text, limit=20, kind=None, accept=None):
+        """Rank the documents matching any term of 'text' by BM25.
+
+        Args:
+            text (str): The query.
+            limit (int): The maximum number of results. Default is 20.
+            kind (str, optional): Only return documents whose key starts with this kind, e.g. 'dishes'.
+            accept (callable, optional): Predicate called with a document key, in descending score order,
+                until 'limit' documents have been accepted.
+
+        Returns:
+            list[tuple]: (key, score) pairs, best first.
+        """
+        terms = list(dict.fromkeys(tokenize(text)))
+        if not terms or limit <= 0:
+            return []
+
+        # The whole query runs under the lock, the NumPy views below share memory with arrays that writers append to
+        with self._lock:
+            live_documents = len(self._docnos)
+            if not live_documents:
+                return []
+            alive = np.frombuffer(self._alive, dtype=np.uint8)
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+            average_length = max(self._total_length / live_documents, 1e-9)
+            kind_code = self._kinds.get(kind) if kind is not None else None
+            if kind is not None and kind_code is None:
+                return []
+
+            matched_docnos, matched_scores = [], []
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                if isinstance(postings[0], int):
+                    docnos = np.array([postings[0]], dtype=np.uint32)
+                    frequencies = np.array([postings[1]], dtype=np.float64)
+                else:
+                    docnos = np.frombuffer(postings[0], dtype=np.uint32)
+                    frequencies = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float64)
+                live = alive[docnos].astype(bool)
+                if kind_code is not None:
+                    live &= np.frombuffer(self._kind_codes, dtype=np.uint8)[docnos] == kind_code
+                docnos, frequencies = docnos[live], frequencies[live]
+                document_frequency = int(live.sum())
+                if not document_frequency:
+                    continue
+                idf = math.log(1 + (live_documents - document_frequency + 0.5) / (document_frequency + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * lengths[docnos] / average_length)
+                matched_docnos.append(docnos)
+                matched_scores.append(idf * frequencies * (self.k1 + 1) / (frequencies + norm))
+
+            if not matched_docnos:
+                return []
+            if len(matched_docnos) == 1:
+                docnos, scores = matched_docnos[0], matched_scores[0]
+            else:
+                # Sum the per-term scores of every matched document
+                totals = np.bincount(np.concatenate(matched_docnos), weights=np.concatenate(matched_scores))
+                if accept is None and len(totals) > limit:
+                    # Select straight from the dense totals, unmatched documents score 0 and are dropped below
+                    docnos, scores = np.arange(len(totals)), totals
+                else:
+                    docnos = np.flatnonzero(totals)
+                    scores = totals[docnos]
+
+            if accept is None and len(scores) > limit:
+                top = np.argpartition(-scores, limit - 1)[:limit]
+                order = top[np.argsort(-scores[top], kind="stable")]
+            else:
+                order = np.argsort(-scores, kind="stable")
+
+            results = []
+            for position in order.tolist():
+                if scores[position] <= 0:
+                    break
+                key = self._keys[docnos[position]]
+                if accept is not None and not accept(key):
+                    continue
+                results.append((key, float(scores[position])))
+                if len(results) >= limit:
+                    break
+            return results
@@ -0,0 +1,64 @@
+import base64, hashlib, hmac, os, time
+
+
+class SessionTokens:
+    """Issues and checks HMAC-signed session tokens for users who have already logged in.
+
+    A token carries the user's ID and the time it was issued, signed with a server-side secret, so a request
+    presenting one is authenticated with a single HMAC instead of a password hash and a database lookup.
+    Tokens expire 'ttl' seconds after they are issued, and revoke_user() invalidates every token issued to a
+    user so far, e.g. when their password changes.
+
+    Revocation is process-local: it is kept in memory by the instance revoke_user() was called on, and is
+    not shared with other processes, or other instances, verifying tokens with the same secret. They keep
+    accepting a revoked token until it expires. Keep 'ttl' short where that window matters.
+
+    Args:
+        secret (bytes, optional): The signing key. Every process verifying the same tokens needs the same
+            secret. Defaults to a random key, so tokens are only valid within this process.
+        ttl (float): Seconds a token stays valid, and so how long a revoked token can still be accepted by
+            another process. Default is 3600.
+
+    Example:
+        sessions = SessionTokens(secret=os.environ["FOODPIX_SESSION_SECRET"].encode())
+        token = sessions.issue(user_id)
+        sessions.verify(token)  # user_id, or None once expired or revoked
+    """
+    def __init__(self, secret=None, ttl=3600):
+        self._secret = secret if secret is not None else os.urandom(32)
+        self.ttl = ttl
+        # user ID -> tokens issued at or before this time (in microseconds) are revoked
+        self._revoked = {}
+
+    def _sign(self, payload):
+        digest = hmac.new(self._secret, payload.encode(), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+    def issue(self, user_id):
+        """Return a new token for 'user_id'."""
+        payload = f"{user_id}.{time.time_ns() // 1000}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token):
+        """Return the user ID the token was issued to, or None if it is malformed, forged, expired or revoked in this process."""
+        try:
+            payload, signature = token.rsplit(".", 1)
+            user_id, issued = payload.rsplit(".", 1)
+            issued = int(issued)
+        except (AttributeError, ValueError):
+            return None
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        if issued + self.ttl * 1e6 < time.time_ns() // 1000:
+            return None
+        if issued <= self._revoked.get(user_id, -1):
+            return None
+        return user_id
+
+    def revoke_user(self, user_id):
+        """Invalidate every token issued to 'user_id' until now, in this process only.
+
+        Other processes sharing the secret keep accepting the tokens until they expire, 'ttl' seconds after
+        they were issued.
+        """
+        self._revoked[user_id] = time.time_ns() // 1000
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+
+
+class StatementCache:
+    """Server-side prepared statements kept open on one connection, keyed by SQL text, least recently used evicted first.
+
+    mysql.connector's prepared cursor prepares its statement the first time it is executed and skips the
+    prepare on later executions only when it is given the very same query string object again. Each entry
+    therefore keeps the cursor together with the string it was prepared from, and cursor() hands both back.
+
+    A connection is only used by one thread at a time, so the cache needs no lock. Every open statement counts
+    against the server's 'max_prepared_stmt_count', which is shared by all connections.
+
+    Args:
+        size (int): The maximum number of statements kept prepared on the connection.
+
+    Example:
+        cache = StatementCache(32)
+        cursor, query = cache.cursor(conn, "SELECT dish_name FROM dishes WHERE id = %s")
+        cursor.execute(query, (dish_id,))
+        rows = cursor.fetchall()
+    """
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cursor(self, conn, query):
+        """Return the prepared cursor for 'query' on 'conn', and the query string to execute it with.
+
+        The caller must read every row of a result set before the connection runs another statement, and
+        must not close the cursor.
+        """
+        entry = self._entries.get(query)
+        if entry is not None:
+            self._entries.move_to_end(query)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = self._entries[query] = (conn.cursor(prepared=True), query)
+        if len(self._entries) > self.size:
+            # Closing the cursor deallocates its statement on the server
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.evictions += 1
+            try:
+                evicted.close()
+            except Exception:
+                pass
+        return entry
+
+    def clear(self):
+        """Close every cached statement."""
+        entries, self._entries = self._entries, OrderedDict()
+        for cursor, _ in entries.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
@@ -1,4 +1,11 @@
-import json, math
+import json, math, datetime
+from itertools import islice
+
+# orjson is several times faster than the standard library encoder, use it when it is installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 def listify(input):
     """
@@ -39,14 +46,15 @@ def stringify(input):
         return ''
 
     
-def obj_to_json(obj_or_list):
+def obj_to_json(obj_or_list, indent=None):
     """
     Convert an object or a list of objects into a JSON formatted string.
 
     Args:
-        obj_or_list (object or list): An object or a list of objects with a 'to_dict()' method that returns
+        obj_or_list (object or iterable): An object or an iterable of objects with a 'to_dict()' method that returns
             a dictionary representation of the object's attributes. If a single object
             is provided instead of a list, it will be converted to JSON directly.
+        indent (int, optional): Pretty-print with this indentation. Default is None, which emits compact JSON.
 
     Returns:
         str: A JSON formatted string representing the object or the list of objects.
@@ -54,13 +62,83 @@ def obj_to_json(obj_or_list):
     Note:
         The objects in the provided list must implement a 'to_dict()' method to
         allow conversion to dictionary format for JSON serialization.
+        For large listings, iter_json() streams the same output without holding it all in memory.
     """
-    if isinstance(obj_or_list, list):
-        obj_dicts = [obj.to_dict() for obj in obj_or_list]
-    else:
+    if hasattr(obj_or_list, "to_dict"):
         obj_dicts = obj_or_list.to_dict()
+    else:
+        obj_dicts = [obj.to_dict() for obj in obj_or_list]
+
+    return dumps(obj_dicts, indent=indent)
+
+
+def dumps(data, indent=None):
+    """
+    Encode data as JSON, compact unless 'indent' is given, using orjson when it is installed.
+
+    Dates and datetimes are encoded in ISO 8601 format and objects with a 'to_dict()' method as that dictionary.
+
+    Args:
+        data (object): The data to encode.
+        indent (int, optional): Pretty-print with this indentation. Default is None.
 
-    return json.dumps(obj_dicts, indent=4)
+    Returns:
+        str: The JSON text.
+    """
+    if orjson is not None and indent is None:
+        return orjson.dumps(data, default=_json_default).decode()
+    separators = (",", ":") if indent is None else None
+    return json.dumps(data, indent=indent, separators=separators, ensure_ascii=False, default=_json_default)
+
+
+def _json_default(value):
+    # Encode the values the standard encoders don't know about
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def iter_json(objects, ndjson=False, batch_size=500):
+    """
+    Stream an iterable of objects as JSON text, a chunk at a time.
+
+    Objects are pulled from 'objects' and encoded 'batch_size' at a time, so only one batch is ever held in
+    memory. Paired with the DB iterators (iter_dishes, iter_query) a listing of any size streams in constant
+    memory and the first chunk is ready as soon as the first batch has been read.
+
+    Args:
+        objects (iterable): Objects with a 'to_dict()' method, e.g. Dish or Restaurant.
+        ndjson (bool, optional): Emit newline-delimited JSON, one object per line, instead of a single JSON array.
+            Default is False.
+        batch_size (int, optional): The number of objects encoded per chunk. Default is 500.
+
+    Yields:
+        str: Consecutive pieces of compact JSON text, which concatenated form the whole document.
+
+    Example:
+        # Stream every dish to a file (or a chunked HTTP response) without building the whole list
+        with open("dishes.json", "w") as f:
+            f.writelines(iter_json(db.iter_dishes()))
+    """
+    iterator = iter(objects)
+    first = True
+    if not ndjson:
+        yield "["
+    while True:
+        batch = [obj.to_dict() for obj in islice(iterator, batch_size)]
+        if not batch:
+            break
+        if ndjson:
+            yield "\n".join(dumps(item) for item in batch) + "\n"
+        else:
+            # Encode the batch as one array and splice its items into the stream
+            chunk = dumps(batch)[1:-1]
+            yield chunk if first else "," + chunk
+        first = False
+    if not ndjson:
+        yield "]"
 
 import math
 